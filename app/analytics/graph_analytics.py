@@ -0,0 +1,306 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable, Tuple
+import threading
+import numpy as np
+
+from app.utils.timestamps import to_epoch_us
+from app.utils.memory import estimate_size
+
+
+def is_valid_at(valid_from: datetime, valid_to: Optional[datetime],
+                timestamp: Optional[datetime]) -> bool:
+    """Check whether a validity interval [valid_from, valid_to) contains timestamp.
+
+    Naive datetimes are taken as UTC, so naive and aware values can be mixed.
+    """
+    if timestamp is None:
+        return True
+    if timestamp.tzinfo is None and valid_from.tzinfo is None and (valid_to is None or valid_to.tzinfo is None):
+        return valid_from <= timestamp and (valid_to is None or valid_to > timestamp)
+    ts = to_epoch_us(timestamp)[0]
+    end = to_epoch_us(valid_to)[0]
+    return to_epoch_us(valid_from)[0] <= ts and (end is None or end > ts)
+
+
+class CSRGraph:
+    """Directed graph in compressed sparse row form.
+
+    Nodes are addressed by dense integer indices; ``node_ids`` and ``labels``
+    map them back to store ids and node labels. Edges are kept sorted by source so that the out-neighbours
+    of node ``i`` are ``indices[indptr[i]:indptr[i + 1]]``.
+    """
+
+    def __init__(self, node_ids: List[str], src: np.ndarray, dst: np.ndarray,
+                 labels: Optional[List[str]] = None):
+        self.node_ids = node_ids
+        self.labels = labels
+        self.index: Dict[str, int] = {node_id: i for i, node_id in enumerate(node_ids)}
+        order = np.argsort(src, kind="stable")
+        self.src = src[order]
+        self.dst = dst[order]
+        self.indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=len(node_ids)), out=self.indptr[1:])
+        self._undirected: Optional["CSRGraph"] = None
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self.dst
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.src.size)
+
+    def undirected(self) -> "CSRGraph":
+        """Symmetric view of this graph (every edge in both directions)"""
+        if self._undirected is None:
+            self._undirected = CSRGraph(
+                self.node_ids,
+                np.concatenate([self.src, self.dst]),
+                np.concatenate([self.dst, self.src]),
+                self.labels
+            )
+        return self._undirected
+
+
+def build_csr(store, timestamp: Optional[datetime] = None,
+              rel_type: Optional[str] = None) -> CSRGraph:
+    """Export the store's adjacency as CSR, optionally as of a time or for one relationship type"""
+    node_ids: List[str] = []
+    labels: List[str] = []
+    for node in store.iter_nodes():
+        if is_valid_at(node.valid_from, node.valid_to, timestamp):
+            node_ids.append(node.id)
+            labels.append(node.labels[0])
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    src: List[int] = []
+    dst: List[int] = []
+    for rel in store.iter_relationships():
+        if rel_type and rel["type"] != rel_type:
+            continue
+        if not is_valid_at(rel["valid_from"], rel["valid_to"], timestamp):
+            continue
+        s = index.get(rel["source_id"])
+        t = index.get(rel["target_id"])
+        if s is None or t is None:
+            continue
+        src.append(s)
+        dst.append(t)
+    return CSRGraph(
+        node_ids,
+        np.asarray(src, dtype=np.int64),
+        np.asarray(dst, dtype=np.int64),
+        labels
+    )
+
+
+def pagerank(graph: CSRGraph, damping: float = 0.85, tol: float = 1e-6,
+             max_iter: int = 100) -> np.ndarray:
+    """Power-iteration PageRank; rank of dangling nodes is spread uniformly"""
+    if not 0 < damping < 1:
+        raise ValueError("damping must be between 0 and 1 (exclusive)")
+    n = graph.num_nodes
+    if n == 0:
+        return np.zeros(0)
+    out_degree = np.diff(graph.indptr).astype(np.float64)
+    dangling = out_degree == 0
+    inv_degree = np.zeros(n)
+    np.divide(1.0, out_degree, out=inv_degree, where=~dangling)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        contrib = (rank * inv_degree)[graph.src]
+        new_rank = np.bincount(graph.dst, weights=contrib, minlength=n)
+        new_rank = damping * (new_rank + rank[dangling].sum() / n) + (1.0 - damping) / n
+        err = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if err < n * tol:
+            break
+    return rank
+
+
+def connected_components(graph: CSRGraph) -> np.ndarray:
+    """Weakly connected components via min-label propagation with pointer jumping.
+
+    Returns a component number per node, numbered from 0 in order of each
+    component's smallest node index.
+    """
+    n = graph.num_nodes
+    labels = np.arange(n, dtype=np.int64)
+    if n == 0 or graph.num_edges == 0:
+        return labels
+    src, dst = graph.src, graph.dst
+    while True:
+        lowest = np.minimum(labels[src], labels[dst])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, src, lowest)
+        np.minimum.at(new_labels, dst, lowest)
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    _, components = np.unique(labels, return_inverse=True)
+    return components
+
+
+def degree_statistics(graph: CSRGraph) -> Dict[str, Dict[str, float]]:
+    """Summary statistics of in-, out- and total degree"""
+    n = graph.num_nodes
+    out_degree = np.diff(graph.indptr)
+    in_degree = np.bincount(graph.dst, minlength=n)
+    stats = {}
+    for name, degree in (("in", in_degree), ("out", out_degree), ("total", in_degree + out_degree)):
+        if n == 0:
+            stats[name] = {"min": 0, "max": 0, "mean": 0.0, "median": 0.0, "p99": 0.0}
+            continue
+        stats[name] = {
+            "min": int(degree.min()),
+            "max": int(degree.max()),
+            "mean": float(degree.mean()),
+            "median": float(np.median(degree)),
+            "p99": float(np.percentile(degree, 99))
+        }
+    return stats
+
+
+def bfs(graph: CSRGraph, source: int, target: Optional[int] = None,
+        max_depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Level-synchronous BFS from source.
+
+    Returns ``(distance, parent)`` arrays; unreachable nodes have distance -1.
+    Stops early once ``target`` is reached.
+    """
+    n = graph.num_nodes
+    distance = np.full(n, -1, dtype=np.int64)
+    parent = np.full(n, -1, dtype=np.int64)
+    distance[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        if target is not None and distance[target] >= 0:
+            break
+        if max_depth is not None and depth >= max_depth:
+            break
+        starts = graph.indptr[frontier]
+        counts = graph.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            break
+        # Expand every frontier node's neighbour slice in one gather
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        neighbours = graph.indices[np.repeat(starts, counts) + offsets]
+        owners = np.repeat(frontier, counts)
+        unseen = distance[neighbours] < 0
+        neighbours, first = np.unique(neighbours[unseen], return_index=True)
+        depth += 1
+        distance[neighbours] = depth
+        parent[neighbours] = owners[unseen][first]
+        frontier = neighbours
+    return distance, parent
+
+
+class GraphAnalytics:
+    """Graph analytics over a store, cached until the store's next write"""
+
+    def __init__(self, store, max_cached: int = 64):
+        self.store = store
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        generation = self.store.generation
+        with self._lock:
+            if self._generation is None or generation > self._generation:
+                self._cache.clear()
+                self._generation = generation
+            if generation == self._generation and key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        # Computed outside the lock; concurrent misses for one key may both compute
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._cache[key] = value
+                if len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return value
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of the cached graphs and results"""
+        with self._lock:
+            cached = list(self._cache.values())
+        return {"cache": estimate_size(cached, sample=sample)}
+
+    def csr(self, timestamp: Optional[datetime] = None,
+            rel_type: Optional[str] = None) -> CSRGraph:
+        return self._cached(("csr", timestamp, rel_type),
+                            lambda: build_csr(self.store, timestamp, rel_type))
+
+    def pagerank(self, timestamp: Optional[datetime] = None, rel_type: Optional[str] = None,
+                 damping: float = 0.85, limit: int = 20) -> List[Dict[str, Any]]:
+        def compute():
+            graph = self.csr(timestamp, rel_type)
+            ranks = pagerank(graph, damping=damping)
+            top = np.argsort(-ranks, kind="stable")[:limit]
+            return [{"node_id": graph.node_ids[i], "score": float(ranks[i])} for i in top]
+        return self._cached(("pagerank", timestamp, rel_type, damping, limit), compute)
+
+    def components(self, timestamp: Optional[datetime] = None, rel_type: Optional[str] = None,
+                   limit: int = 20) -> Dict[str, Any]:
+        def compute():
+            graph = self.csr(timestamp, rel_type)
+            labels = connected_components(graph)
+            sizes = np.bincount(labels) if labels.size else np.zeros(0, dtype=np.int64)
+            largest = np.argsort(-sizes, kind="stable")[:limit]
+            return {
+                "count": int(sizes.size),
+                "components": [
+                    {
+                        "size": int(sizes[c]),
+                        "node_ids": [graph.node_ids[i] for i in np.flatnonzero(labels == c)]
+                    }
+                    for c in largest
+                ]
+            }
+        return self._cached(("components", timestamp, rel_type, limit), compute)
+
+    def degrees(self, timestamp: Optional[datetime] = None,
+                rel_type: Optional[str] = None) -> Dict[str, Any]:
+        def compute():
+            graph = self.csr(timestamp, rel_type)
+            return {
+                "nodes": graph.num_nodes,
+                "edges": graph.num_edges,
+                "degree": degree_statistics(graph)
+            }
+        return self._cached(("degrees", timestamp, rel_type), compute)
+
+    def shortest_path(self, source_id: str, target_id: str,
+                      timestamp: Optional[datetime] = None, rel_type: Optional[str] = None,
+                      directed: bool = False) -> Optional[List[str]]:
+        """Unweighted shortest path as a list of node ids, or None if unreachable"""
+        def compute():
+            graph = self.csr(timestamp, rel_type)
+            if source_id not in graph.index or target_id not in graph.index:
+                return None
+            if not directed:
+                graph = graph.undirected()
+            source, target = graph.index[source_id], graph.index[target_id]
+            distance, parent = bfs(graph, source, target=target)
+            if distance[target] < 0:
+                return None
+            path = [target]
+            while path[-1] != source:
+                path.append(int(parent[path[-1]]))
+            return [graph.node_ids[i] for i in reversed(path)]
+        return self._cached(("shortest_path", source_id, target_id, timestamp, rel_type, directed),
+                            compute)
@@ -0,0 +1,297 @@
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Set, Tuple
+import threading
+import numpy as np
+
+from app.utils.memory import estimate_size
+
+
+class IncrementalLayout:
+    """Force-directed 2D layout of the whole store, maintained incrementally.
+
+    Positions are kept in one array and only nodes added since the last sync
+    are placed: each starts at the centroid of its already-placed neighbours
+    and is then relaxed with a few Fruchterman-Reingold iterations while the
+    rest of the layout stays fixed. Repulsion is estimated against a random
+    sample of nodes, shrunk so that one iteration costs at most
+    ``repulsion_budget`` pair evaluations however many nodes are moved.
+    """
+
+    def __init__(self, store, iterations: int = 50, repulsion_sample: int = 256,
+                 repulsion_budget: int = 1_000_000, chunk_size: int = 4096, seed: int = 42):
+        self.store = store
+        self.iterations = iterations
+        self.repulsion_sample = repulsion_sample
+        self.repulsion_budget = repulsion_budget
+        self.chunk_size = chunk_size
+        self.node_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.coords = np.zeros((0, 2))
+        self._rng = np.random.default_rng(seed)
+        self._generation: Optional[int] = None
+        # Ids of nodes written and of nodes archived since the last sync
+        self._written: deque = deque()
+        self._forgotten: deque = deque()
+        # Guards the position arrays; views hold it while they read positions
+        self._lock = threading.RLock()
+        store.add_listener(self._on_write)
+
+    def _on_write(self, kind: str, data: Dict):
+        # Runs under the store's write lock, so only record the ids here
+        if kind == "node":
+            self._written.append(data["id"])
+        elif kind == "archived":
+            self._forgotten.extend(data["node_ids"])
+
+    def sync(self):
+        """Place any nodes written since the last sync"""
+        with self._lock:
+            generation = self.store.generation
+            if generation == self._generation and not self._written and not self._forgotten:
+                return
+            # Drained one at a time as writers append concurrently; archived ids first, so a node
+            # archived after this point is still queued for the next sync if it gets placed now
+            forgotten = {self._forgotten.popleft() for _ in range(len(self._forgotten))}
+            written = [self._written.popleft() for _ in range(len(self._written))]
+            if forgotten:
+                self._forget(forgotten)
+            if self._generation is None:
+                # First sync: nodes written before the listener was registered
+                written = [node.id for node in self.store.iter_nodes()]
+            # Rewritten versions keep their position; archived nodes are not placed
+            new_ids = [node_id for node_id in dict.fromkeys(written)
+                       if node_id not in self.index and node_id not in forgotten]
+            if new_ids:
+                self._place(new_ids)
+            self._generation = generation
+
+    def _forget(self, node_ids: Set[str]):
+        keep = [i for i, node_id in enumerate(self.node_ids) if node_id not in node_ids]
+        self.node_ids = [self.node_ids[i] for i in keep]
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.coords = self.coords[keep]
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        return {
+            "positions": estimate_size(self.coords),
+            "index": estimate_size(self.node_ids, depth=0) + estimate_size(self.index, depth=1, sample=sample)
+        }
+
+    def position(self, node_id: str) -> Optional[Tuple[float, float]]:
+        i = self.index.get(node_id)
+        if i is None:
+            return None
+        return float(self.coords[i, 0]), float(self.coords[i, 1])
+
+    def _incident_edges(self, new_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Index pairs of all edges touching at least one of new_ids"""
+        if len(new_ids) * 2 > len(self.node_ids):
+            rels = self.store.iter_relationships()
+        else:
+            rels = [rel for node_id in new_ids for rel in self.store.get_relationships(node_id)]
+        src, dst = [], []
+        for rel in rels:
+            s = self.index.get(rel["source_id"])
+            t = self.index.get(rel["target_id"])
+            if s is not None and t is not None and s != t:
+                src.append(s)
+                dst.append(t)
+        return np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+
+    def _place(self, new_ids: List[str]):
+        start = len(self.node_ids)
+        for node_id in new_ids:
+            self.index[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+        n = len(self.node_ids)
+        k = 1.0 / np.sqrt(n)
+        src, dst = self._incident_edges(new_ids)
+
+        # Seed new nodes at the centroid of their already-placed neighbours
+        initial = self._rng.random((n - start, 2))
+        old_coords = self.coords
+        self.coords = np.vstack([old_coords, initial])
+        if start and src.size:
+            anchored_src = (src >= start) & (dst < start)
+            anchored_dst = (dst >= start) & (src < start)
+            movable = np.concatenate([src[anchored_src], dst[anchored_dst]]) - start
+            anchors = np.concatenate([dst[anchored_src], src[anchored_dst]])
+            sums = np.zeros((n - start, 2))
+            counts = np.bincount(movable, minlength=n - start)
+            np.add.at(sums, movable, old_coords[anchors])
+            has_anchor = counts > 0
+            jitter = (self._rng.random((int(has_anchor.sum()), 2)) - 0.5) * k
+            self.coords[start:][has_anchor] = sums[has_anchor] / counts[has_anchor, None] + jitter
+
+        self._relax(np.arange(start, n), src, dst, k)
+
+    def _relax(self, movable: np.ndarray, src: np.ndarray, dst: np.ndarray, k: float):
+        """Move only the movable nodes; src/dst are their incident edges, whose other ends stay fixed"""
+        n = len(self.node_ids)
+        m = movable.size
+        # Position of each edge end within movable, for the ends that are movable
+        order = np.argsort(movable, kind="stable")
+        sorted_movable = movable[order]
+
+        def local(ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            pos = np.minimum(np.searchsorted(sorted_movable, ends), m - 1)
+            hit = sorted_movable[pos] == ends
+            return order[pos[hit]], hit
+
+        src_local, src_moves = local(src)
+        dst_local, dst_moves = local(dst)
+        temperature = 0.1
+        cooling = temperature / (self.iterations + 1)
+        sample_size = min(n, self.repulsion_sample,
+                          max(16, self.repulsion_budget // max(m, 1)))
+        for _ in range(self.iterations):
+            disp = np.zeros((m, 2))
+            sample = self._rng.choice(n, size=sample_size, replace=False)
+            scale = n / sample.size
+            for lo in range(0, m, self.chunk_size):
+                chunk = movable[lo:lo + self.chunk_size]
+                delta = self.coords[chunk][:, None, :] - self.coords[sample][None, :, :]
+                dist2 = np.maximum((delta ** 2).sum(axis=2), 1e-9)
+                disp[lo:lo + chunk.size] += scale * (delta * (k * k / dist2)[:, :, None]).sum(axis=1)
+            if src.size:
+                delta = self.coords[src] - self.coords[dst]
+                dist = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+                force = delta * (dist / k)[:, None]
+                np.add.at(disp, src_local, -force[src_moves])
+                np.add.at(disp, dst_local, force[dst_moves])
+            length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+            self.coords[movable] += disp * (np.minimum(length, temperature) / length)[:, None]
+            temperature -= cooling
+
+    def _node_summary(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """Label, name and position of a node, or None if it was archived or is not placed yet"""
+        node = self.store.get_node(node_id)
+        position = self.position(node_id)
+        if node is None or position is None:
+            return None
+        x, y = position
+        return {
+            "id": node_id,
+            "label": node.labels[0],
+            "name": node.properties.get("name", ""),
+            "x": x,
+            "y": y
+        }
+
+    @staticmethod
+    def _rel_summary(rel: Dict) -> Dict[str, Any]:
+        return {"source_id": rel["source_id"], "target_id": rel["target_id"], "type": rel["type"]}
+
+    def neighbourhood(self, node_id: str, depth: int = 1, limit: int = 500,
+                      timestamp: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Laid-out subgraph within depth hops of node_id, capped at limit nodes"""
+        with self._lock:
+            self.sync()
+            if self.store.get_node(node_id, timestamp) is None:
+                return None
+            seen = self._within(node_id, depth, limit, timestamp)
+            relationships = []
+            for current in seen:
+                for rel in self.store.get_relationships(current, direction="out", timestamp=timestamp):
+                    if rel["target_id"] in seen:
+                        relationships.append(self._rel_summary(rel))
+            nodes = (self._node_summary(n) for n in seen)
+            return {
+                "nodes": [node for node in nodes if node is not None],
+                "relationships": relationships
+            }
+
+    def _within(self, node_id: str, depth: int, limit: int, timestamp: Optional[datetime]) -> Set[str]:
+        """Ids of up to limit nodes within depth hops of node_id, breadth first"""
+        seen = {node_id}
+        frontier = [node_id]
+        for _ in range(depth):
+            next_frontier = []
+            for current in frontier:
+                for rel in self.store.get_relationships(current, timestamp=timestamp):
+                    other = rel["target_id"] if rel["source_id"] == current else rel["source_id"]
+                    if other in seen or self.store.get_node(other, timestamp) is None:
+                        continue
+                    if len(seen) >= limit:
+                        return seen
+                    seen.add(other)
+                    next_frontier.append(other)
+            frontier = next_frontier
+        return seen
+
+    def sample(self, csr, max_nodes: int = 500) -> Dict[str, Any]:
+        """Level-of-detail view: the max_nodes highest-degree nodes and the edges among them"""
+        with self._lock:
+            self.sync()
+            degree = np.diff(csr.indptr) + np.bincount(csr.dst, minlength=csr.num_nodes)
+            keep = np.argsort(-degree, kind="stable")[:max_nodes]
+            kept = np.zeros(csr.num_nodes, dtype=bool)
+            kept[keep] = True
+            induced = kept[csr.src] & kept[csr.dst]
+            nodes = (self._node_summary(csr.node_ids[i]) for i in keep)
+            return {
+                "total_nodes": csr.num_nodes,
+                "total_relationships": csr.num_edges,
+                "nodes": [node for node in nodes if node is not None],
+                "relationships": [
+                    {"source_id": csr.node_ids[s], "target_id": csr.node_ids[t]}
+                    for s, t in zip(csr.src[induced], csr.dst[induced])
+                ]
+            }
+
+    def aggregate(self, csr, resolution: int = 20) -> Dict[str, Any]:
+        """Level-of-detail view: nodes binned into a resolution x resolution grid over the layout"""
+        with self._lock:
+            self.sync()
+            # Nodes archived since csr was built have no position any more
+            positions = np.fromiter((self.index.get(node_id, -1) for node_id in csr.node_ids),
+                                    dtype=np.int64, count=csr.num_nodes)
+            placed = positions >= 0
+            if not placed.any():
+                return {"total_nodes": csr.num_nodes, "total_relationships": csr.num_edges,
+                        "nodes": [], "relationships": []}
+            coords = self.coords[positions[placed]]
+            node_labels = [label for label, is_placed in zip(csr.labels, placed) if is_placed]
+            renumber = np.cumsum(placed) - 1
+            edges = placed[csr.src] & placed[csr.dst]
+            src, dst = renumber[csr.src[edges]], renumber[csr.dst[edges]]
+            lo = coords.min(axis=0)
+            span = np.maximum(coords.max(axis=0) - lo, 1e-9)
+            cells = np.minimum((coords - lo) / span * resolution, resolution - 1).astype(np.int64)
+            cell_ids = cells[:, 0] * resolution + cells[:, 1]
+            occupied, cell_of = np.unique(cell_ids, return_inverse=True)
+            counts = np.bincount(cell_of)
+            centroids = np.stack([
+                np.bincount(cell_of, weights=coords[:, 0]),
+                np.bincount(cell_of, weights=coords[:, 1])
+            ], axis=1) / counts[:, None]
+            labels: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+            for i, label in enumerate(node_labels):
+                labels[int(cell_of[i])][label] += 1
+            edge_cells = cell_of[src] * occupied.size + cell_of[dst]
+            pairs, weights = np.unique(edge_cells, return_counts=True)
+            return {
+                "total_nodes": csr.num_nodes,
+                "total_relationships": csr.num_edges,
+                "nodes": [
+                    {
+                        "id": f"cell_{int(cell)}",
+                        "label": max(labels[c], key=labels[c].get),
+                        "name": f"{int(counts[c])} nodes",
+                        "count": int(counts[c]),
+                        "labels": dict(labels[c]),
+                        "x": float(centroids[c, 0]),
+                        "y": float(centroids[c, 1])
+                    }
+                    for c, cell in enumerate(occupied)
+                ],
+                "relationships": [
+                    {
+                        "source_id": f"cell_{int(occupied[p // occupied.size])}",
+                        "target_id": f"cell_{int(occupied[p % occupied.size])}",
+                        "count": int(w)
+                    }
+                    for p, w in zip(pairs, weights) if p // occupied.size != p % occupied.size
+                ]
+            }
@@ -0,0 +1,146 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable, Tuple
+import json
+import threading
+import time
+
+from app.utils.timestamps import to_epoch_us, from_epoch_us
+
+# Closed validity intervals by length, in seconds
+DURATION_BUCKETS = (
+    ("under_1h", 3600),
+    ("under_1d", 86400),
+    ("under_7d", 7 * 86400),
+    ("under_30d", 30 * 86400),
+    ("under_365d", 365 * 86400),
+    ("365d_or_more", None)
+)
+
+# Distinct values are counted per context key up to this many
+MAX_DISTINCT_VALUES = 10_000
+
+_US_PER_DAY = 86_400 * 10 ** 6
+
+
+class _ValidityDistribution:
+    def __init__(self, now_us: int):
+        self.now_us = now_us
+        self.open_ended = 0
+        self.valid_now = 0
+        self.first: Optional[int] = None
+        self.last: Optional[int] = None
+        self.by_day: Counter = Counter()
+        self.durations: Counter = Counter()
+
+    def add(self, valid_from: Optional[datetime], valid_to: Optional[datetime]):
+        start, end = to_epoch_us(valid_from)[0], to_epoch_us(valid_to)[0]
+        if end is None:
+            self.open_ended += 1
+        else:
+            seconds = (end - (start or end)) / 1e6
+            for name, limit in DURATION_BUCKETS:
+                if limit is None or seconds < limit:
+                    self.durations[name] += 1
+                    break
+        if (start is None or start <= self.now_us) and (end is None or end > self.now_us):
+            self.valid_now += 1
+        if start is not None:
+            self.first = start if self.first is None else min(self.first, start)
+            self.last = start if self.last is None else max(self.last, start)
+            self.by_day[start // _US_PER_DAY] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        by_year: Counter = Counter()
+        for day, count in self.by_day.items():
+            by_year[from_epoch_us(day * _US_PER_DAY, None).year] += count
+        return {
+            "open_ended": self.open_ended,
+            "valid_now": self.valid_now,
+            "valid_from": {
+                "min": from_epoch_us(self.first, None),
+                "max": from_epoch_us(self.last, None),
+                "by_year": {str(year): count for year, count in sorted(by_year.items())}
+            },
+            "closed_durations": {name: self.durations[name] for name, _ in DURATION_BUCKETS}
+        }
+
+
+class _ContextKeys:
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.values: Dict[str, set] = {}
+
+    def add(self, context: Dict[str, Any]):
+        for key, value in context.items():
+            self.counts[key] += 1
+            values = self.values.setdefault(key, set())
+            if len(values) < MAX_DISTINCT_VALUES:
+                values.add(value if isinstance(value, (str, int, float, bool, type(None)))
+                           else json.dumps(value, sort_keys=True, default=str))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {"count": count, "distinct_values": len(self.values[key]),
+                  "distinct_values_capped": len(self.values[key]) >= MAX_DISTINCT_VALUES}
+            for key, count in self.counts.most_common()
+        }
+
+
+def _scan(records: Iterable[Tuple[str, Optional[datetime], Optional[datetime], Dict[str, Any]]],
+          now_us: int) -> Dict[str, Any]:
+    kinds: Counter = Counter()
+    validity = _ValidityDistribution(now_us)
+    contexts = _ContextKeys()
+    for kind, valid_from, valid_to, context in records:
+        kinds[kind] += 1
+        validity.add(valid_from, valid_to)
+        contexts.add(context or {})
+    return {"total": sum(kinds.values()), "kinds": dict(kinds.most_common()),
+            "validity": validity.summary(), "context_keys": contexts.summary()}
+
+
+class GraphStatistics:
+    """Cardinalities and validity distributions of a store, from one full scan.
+
+    The result is kept until the store's next write or until it is
+    ``max_age`` seconds old (what is valid now changes without any write).
+    """
+
+    def __init__(self, store, max_age: float = 60.0):
+        self.store = store
+        self.max_age = max_age
+        self._result: Optional[Dict[str, Any]] = None
+        self._generation: Optional[int] = None
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def collect(self) -> Dict[str, Any]:
+        with self._lock:
+            generation = self.store.generation
+            fresh = time.monotonic() - self._computed_at < self.max_age
+            if self._result is not None and generation == self._generation and fresh:
+                return self._result
+            started = time.perf_counter()
+            now_us = to_epoch_us(datetime.now(timezone.utc))[0]
+            nodes = _scan(((node.labels[0], node.valid_from, node.valid_to, node.context)
+                           for node in self.store.iter_nodes()), now_us)
+            rels = _scan(((rel["type"], rel["valid_from"], rel["valid_to"], rel["context"])
+                          for rel in self.store.iter_relationships()), now_us)
+            self._result = {
+                "computed_at": datetime.now(timezone.utc),
+                "generation": generation,
+                "scan_seconds": time.perf_counter() - started,
+                "cardinalities": {
+                    "nodes": nodes["total"],
+                    "relationships": rels["total"],
+                    "labels": nodes["kinds"],
+                    "relationship_types": rels["kinds"],
+                    "node_context_keys": nodes["context_keys"],
+                    "relationship_context_keys": rels["context_keys"]
+                },
+                "validity": {"nodes": nodes["validity"], "relationships": rels["validity"]}
+            }
+            self._generation = generation
+            self._computed_at = time.monotonic()
+            return self._result
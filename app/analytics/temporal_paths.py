@@ -0,0 +1,347 @@
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+import threading
+
+from app.utils.timestamps import to_epoch_us, from_epoch_us
+from app.utils.memory import estimate_size
+
+# Open-ended bounds, in microseconds since the epoch
+_MIN_TIME = -(2 ** 63)
+_MAX_TIME = 2 ** 63 - 1
+
+# (valid_from, valid_to, other endpoint, type, relationship), valid_to exclusive
+_Entry = Tuple[int, int, str, str, Dict[str, Any]]
+_Lists = Dict[str, Tuple[List[int], List[_Entry]]]
+
+
+def _start(entry: _Entry) -> int:
+    return entry[0]
+
+
+def _epoch(value: Optional[datetime], default: int) -> int:
+    us = to_epoch_us(value)[0]
+    return default if us is None else us
+
+
+def _datetime(us: int, like: Optional[datetime]) -> datetime:
+    """Datetime for us, in the offset of like if that is timezone-aware"""
+    offset = None
+    if like is not None and like.tzinfo is not None:
+        offset = int(like.utcoffset().total_seconds())
+    return from_epoch_us(us, offset)
+
+
+class TemporalPaths:
+    """Time-respecting path queries over relationship validity intervals.
+
+    A relationship can be traversed at any instant in [valid_from, valid_to),
+    traversal takes no time and a path may wait at intermediate nodes, so a
+    path is valid when its traversal times never decrease. Every node keeps
+    its outgoing and incoming relationships sorted by ``valid_from``, and
+    searches bisect them to skip relationships that start too late. A write
+    only appends to the node's backlog; the first search to visit the node
+    afterwards merges the backlog in (under the lock) and publishes new lists,
+    so building up a hub costs O(1) per relationship and searches otherwise
+    never lock.
+
+    Archived relationships are dropped from the lists, so paths only use
+    the hot store. The lists are built on first use, or by ``load`` as a
+    warm-up step. Searches run level by level, one hop per round, keeping
+    the best time seen per node, which bounds the depth exactly and needs no
+    priority queue.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._out: _Lists = {}
+        self._in: _Lists = {}
+        # Entries written since the node's lists were last merged, in write order
+        self._out_added: Dict[str, List[_Entry]] = {}
+        self._in_added: Dict[str, List[_Entry]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        store.add_listener(self._on_write)
+
+    def load(self):
+        """Build the per-node lists from the store, unless already built"""
+        if self._loaded:
+            return
+        # Started outside the lock: a replicated store may apply writes (and call
+        # _on_write) while this call syncs it
+        rels = self.store.iter_relationships()
+        with self._lock:
+            if not self._loaded:
+                self._load(rels)
+                self._loaded = True
+
+    def _load(self, rels: Iterable[Dict[str, Any]]):
+        out: Dict[str, List[_Entry]] = {}
+        in_: Dict[str, List[_Entry]] = {}
+        for rel in rels:
+            valid_from = _epoch(rel["valid_from"], _MIN_TIME)
+            valid_to = _epoch(rel["valid_to"], _MAX_TIME)
+            out.setdefault(rel["source_id"], []).append(
+                (valid_from, valid_to, rel["target_id"], rel["type"], rel))
+            in_.setdefault(rel["target_id"], []).append(
+                (valid_from, valid_to, rel["source_id"], rel["type"], rel))
+        for grouped, lists in ((out, self._out), (in_, self._in)):
+            for node_id, entries in grouped.items():
+                entries.sort(key=_start)
+                lists[node_id] = ([entry[0] for entry in entries], entries)
+
+    def _on_write(self, kind: str, data: Dict):
+        if kind == "relationship":
+            self._add(data)
+        elif kind == "archived":
+            self._remove(data["relationships"])
+
+    def _add(self, rel: Dict[str, Any]):
+        valid_from = _epoch(rel["valid_from"], _MIN_TIME)
+        valid_to = _epoch(rel["valid_to"], _MAX_TIME)
+        with self._lock:
+            if not self._loaded:
+                # Picked up by the build; writes during the build wait for it on the lock
+                return
+            self._out_added.setdefault(rel["source_id"], []).append(
+                (valid_from, valid_to, rel["target_id"], rel["type"], rel))
+            self._in_added.setdefault(rel["target_id"], []).append(
+                (valid_from, valid_to, rel["source_id"], rel["type"], rel))
+
+    def _remove(self, rels: List[Dict[str, Any]]):
+        with self._lock:
+            if not self._loaded:
+                return
+            for lists, added, end, other in ((self._out, self._out_added, "source_id", "target_id"),
+                                             (self._in, self._in_added, "target_id", "source_id")):
+                removed: Dict[str, Dict[Tuple, List[Dict[str, Any]]]] = {}
+                for rel in rels:
+                    signature = (_epoch(rel["valid_from"], _MIN_TIME), _epoch(rel["valid_to"], _MAX_TIME),
+                                 rel[other], rel["type"])
+                    removed.setdefault(rel[end], {}).setdefault(signature, []).append(rel)
+                for node_id, by_signature in removed.items():
+                    _, entries = self._merged(lists, added, node_id)
+                    kept = [entry for entry in entries if not self._take(by_signature.get(entry[:4]), entry[4])]
+                    if kept:
+                        lists[node_id] = ([entry[0] for entry in kept], kept)
+                    else:
+                        lists.pop(node_id, None)
+
+    @staticmethod
+    def _take(candidates: Optional[List[Dict[str, Any]]], rel: Dict[str, Any]) -> bool:
+        """Consume the archived relationship that rel is, if any, so each one removes a single entry.
+
+        Matched by identity where the store hands out the objects it holds,
+        and by value otherwise (e.g. rows read back from SQLite).
+        """
+        if not candidates:
+            return False
+        for i, candidate in enumerate(candidates):
+            if candidate is rel:
+                del candidates[i]
+                return True
+        for i, candidate in enumerate(candidates):
+            if candidate == rel:
+                del candidates[i]
+                return True
+        return False
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of the per-node lists; the relationships they point at belong to the store"""
+        # Entries are counted shallowly: their ids and relationship dicts are shared
+        return {
+            "outgoing": estimate_size(self._out, depth=3, sample=sample),
+            "incoming": estimate_size(self._in, depth=3, sample=sample),
+            "backlog": estimate_size(self._out_added, depth=2, sample=sample)
+                       + estimate_size(self._in_added, depth=2, sample=sample)
+        }
+
+    @staticmethod
+    def _merged(lists: _Lists, added: Dict[str, List[_Entry]],
+                node_id: str) -> Tuple[List[int], List[_Entry]]:
+        """The node's lists with its backlog merged in; the caller holds the lock"""
+        backlog = added.pop(node_id, None)
+        keys, entries = lists.get(node_id, ([], []))
+        if backlog:
+            # Replaced rather than mutated so concurrent searches keep a consistent list; the sort
+            # is stable, so entries with equal valid_from stay in write order
+            entries = sorted(entries + backlog, key=_start)
+            keys = [entry[0] for entry in entries]
+            lists[node_id] = (keys, entries)
+        return keys, entries
+
+    def _entries(self, lists: _Lists, added: Dict[str, List[_Entry]], node_id: str):
+        if node_id in added:
+            with self._lock:
+                return self._merged(lists, added, node_id)
+        return lists.get(node_id, ((), ()))
+
+    def _sweep(self, origin: str, origin_time: int, forward: bool, bound: int,
+               max_depth: Optional[int], rel_types: Optional[Iterable[str]],
+               target: Optional[str] = None) -> Tuple[Dict[str, int], Dict[str, int], List[Dict]]:
+        """Best time per node reachable from origin, with the round each was set and per-round parents.
+
+        Forward sweeps compute earliest arrivals starting at origin_time and
+        never traverse after bound; backward sweeps compute latest departures
+        that still reach origin by origin_time, never traversing before bound.
+        """
+        lists, added = (self._out, self._out_added) if forward else (self._in, self._in_added)
+        types = set(rel_types) if rel_types else None
+        best = {origin: origin_time}
+        found_in = {origin: 0}
+        parents: List[Dict[str, Tuple[str, _Entry, int]]] = [{}]
+        frontier = {origin: origin_time}
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            improved: Dict[str, int] = {}
+            round_parents: Dict[str, Tuple[str, _Entry, int]] = {}
+            for node, time in frontier.items():
+                keys, entries = self._entries(lists, added, node)
+                # Only relationships starting by the time limit can be traversed
+                stop = bisect_right(keys, bound if forward else time)
+                for entry in entries[:stop]:
+                    valid_from, valid_to, other, rel_type, _ = entry
+                    if types is not None and rel_type not in types:
+                        continue
+                    if forward:
+                        at = max(time, valid_from)
+                        if at >= valid_to:
+                            continue
+                        if at >= best.get(other, _MAX_TIME) or at >= improved.get(other, _MAX_TIME):
+                            continue
+                    else:
+                        at = min(time, valid_to - 1)
+                        if at < bound or at < valid_from:
+                            continue
+                        if at <= best.get(other, _MIN_TIME) or at <= improved.get(other, _MIN_TIME):
+                            continue
+                    improved[other] = at
+                    round_parents[other] = (node, entry, at)
+            if target is not None and target in best:
+                # Nodes reached no better than the target cannot lead to a better target time
+                limit = best[target]
+                improved = {node: at for node, at in improved.items()
+                            if node == target or (at < limit if forward else at > limit)}
+            best.update(improved)
+            for node in improved:
+                found_in[node] = depth
+            parents.append(round_parents)
+            frontier = improved
+        return best, found_in, parents
+
+    @staticmethod
+    def _steps(end: str, found_in: Dict[str, int], parents: List[Dict]) -> List[Tuple[_Entry, int]]:
+        """Relationships and traversal times on the path to end, walking back from the round it was found in"""
+        steps = []
+        node, depth = end, found_in[end]
+        while depth > 0:
+            node, entry, at = parents[depth][node]
+            steps.append((entry, at))
+            depth -= 1
+        return steps
+
+    def _result(self, source_id: str, target_id: str, steps: Optional[List[Tuple[_Entry, int]]],
+                like: Optional[datetime]) -> Dict[str, Any]:
+        if steps is None:
+            return {
+                "source_id": source_id,
+                "target_id": target_id,
+                "reachable": False,
+                "departure": None,
+                "arrival": None,
+                "duration_seconds": None,
+                "hops": None,
+                "path": []
+            }
+        path = [dict(entry[4], traversed_at=_datetime(at, like)) for entry, at in steps]
+        departure = steps[0][1] if steps else None
+        arrival = steps[-1][1] if steps else None
+        return {
+            "source_id": source_id,
+            "target_id": target_id,
+            "reachable": True,
+            "departure": _datetime(departure, like) if steps else like,
+            "arrival": _datetime(arrival, like) if steps else like,
+            "duration_seconds": (arrival - departure) / 1e6 if steps else 0.0,
+            "hops": len(steps),
+            "path": path
+        }
+
+    def earliest_arrival(self, source_id: str, target_id: str, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None, max_depth: Optional[int] = None,
+                         rel_types: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Time-respecting path from source to target, departing at or after start, that arrives first"""
+        steps = self._earliest_steps(source_id, target_id, _epoch(start, _MIN_TIME),
+                                     _epoch(end, _MAX_TIME), max_depth, rel_types)
+        return self._result(source_id, target_id, steps, start or end)
+
+    def _earliest_steps(self, source_id, target_id, start, end, max_depth, rel_types):
+        if source_id == target_id:
+            return []
+        self.load()
+        best, found_in, parents = self._sweep(source_id, start, True, end, max_depth, rel_types, target_id)
+        if target_id not in best:
+            return None
+        return self._steps(target_id, found_in, parents)[::-1]
+
+    def latest_departure(self, source_id: str, target_id: str, end: Optional[datetime] = None,
+                         start: Optional[datetime] = None, max_depth: Optional[int] = None,
+                         rel_types: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Time-respecting path from source to target, arriving by end (default now), that leaves source last"""
+        end = end or datetime.now(timezone.utc)
+        steps = self._latest_steps(source_id, target_id, _epoch(end, _MAX_TIME),
+                                   _epoch(start, _MIN_TIME), max_depth, rel_types)
+        return self._result(source_id, target_id, steps, end or start)
+
+    def _latest_steps(self, source_id, target_id, end, start, max_depth, rel_types):
+        if source_id == target_id:
+            return []
+        self.load()
+        best, found_in, parents = self._sweep(target_id, end, False, start, max_depth, rel_types, source_id)
+        if source_id not in best:
+            return None
+        # Walking back from the source follows the path in travel order
+        return self._steps(source_id, found_in, parents)
+
+    def fastest(self, source_id: str, target_id: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, max_depth: Optional[int] = None,
+                rel_types: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Time-respecting path from source to target with the shortest departure-to-arrival span.
+
+        Alternates the two searches: the earliest arrival A for departures
+        from d, then the latest departure L that still arrives by A. Every
+        departure in [d, L] arrives at A too, so the next candidate is just
+        after L, and each distinct arrival time is visited once.
+        """
+        if source_id == target_id:
+            return self._result(source_id, target_id, [], start or end)
+        start_us, end_us = _epoch(start, _MIN_TIME), _epoch(end, _MAX_TIME)
+        best_steps = None
+        departure = start_us
+        while departure <= end_us:
+            steps = self._earliest_steps(source_id, target_id, departure, end_us, max_depth, rel_types)
+            if steps is None:
+                break
+            steps = self._latest_steps(source_id, target_id, steps[-1][1], departure, max_depth, rel_types)
+            duration = steps[-1][1] - steps[0][1]
+            if best_steps is None or duration < best_steps[-1][1] - best_steps[0][1]:
+                best_steps = steps
+            if duration == 0:
+                break
+            departure = steps[0][1] + 1
+        return self._result(source_id, target_id, best_steps, start or end)
+
+    def reachable(self, source_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  max_depth: Optional[int] = None, rel_types: Optional[Iterable[str]] = None,
+                  limit: int = 1000) -> List[Dict[str, Any]]:
+        """Nodes reachable from source by time-respecting paths, in order of earliest arrival"""
+        self.load()
+        best, found_in, _ = self._sweep(source_id, _epoch(start, _MIN_TIME), True,
+                                        _epoch(end, _MAX_TIME), max_depth, rel_types)
+        best.pop(source_id)
+        ordered = sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit]
+        return [
+            {"node_id": node_id, "arrival": _datetime(at, start or end), "hops": found_in[node_id]}
+            for node_id, at in ordered
+        ]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.analytics.graph_analytics import GraphAnalytics, build_csr, is_valid_at, pagerank
+from app.db.mock_db import MockNeo4j
+
+PLUS_TWO = timezone(timedelta(hours=2))
+
+
+def test_is_valid_at_mixes_naive_and_aware_values():
+    start, end = datetime(2024, 1, 1, 12), datetime(2024, 1, 2)
+    assert is_valid_at(start, end, datetime(2024, 1, 1, 14, tzinfo=PLUS_TWO))
+    assert not is_valid_at(start, end, datetime(2024, 1, 1, 13, tzinfo=PLUS_TWO))
+    assert is_valid_at(datetime(2024, 1, 1, 12, tzinfo=PLUS_TWO), None, datetime(2024, 1, 1, 10))
+    assert not is_valid_at(datetime(2024, 1, 1, 12, tzinfo=PLUS_TWO), None, datetime(2024, 1, 1, 9))
+    assert is_valid_at(start, None, None)
+
+
+def test_analytics_as_of_an_aware_timestamp():
+    store = MockNeo4j()
+    a = store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    b = store.create_node("Person", {}, datetime(2024, 1, 1, tzinfo=timezone.utc), None, {})
+    store.create_relationship(a, b, "KNOWS", {}, datetime(2024, 1, 1), None, {})
+    graph = build_csr(store, datetime(2024, 1, 1, 1, tzinfo=PLUS_TWO))
+    assert graph.num_nodes == 0
+    graph = build_csr(store, datetime(2024, 1, 1, 3, tzinfo=PLUS_TWO))
+    assert (graph.num_nodes, graph.num_edges) == (2, 1)
+    ranks = GraphAnalytics(store).pagerank(datetime(2024, 6, 1, tzinfo=timezone.utc))
+    assert ranks[0]["node_id"] == b
+
+
+@pytest.mark.parametrize("damping", [0.0, 1.0, 5.0, -0.5])
+def test_pagerank_rejects_damping_outside_open_interval(damping):
+    store = MockNeo4j()
+    store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    with pytest.raises(ValueError):
+        pagerank(build_csr(store), damping=damping)
+
+
+def test_pagerank_sums_to_one():
+    store = MockNeo4j()
+    ids = [store.create_node("Person", {}, datetime(2024, 1, 1), None, {}) for _ in range(4)]
+    for source, target in zip(ids, ids[1:]):
+        store.create_relationship(source, target, "NEXT", {}, datetime(2024, 1, 1), None, {})
+    assert np.isclose(pagerank(build_csr(store)).sum(), 1.0)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+from app.analytics.statistics import GraphStatistics
+from app.db.mock_db import MockNeo4j
+
+DAY = datetime(2024, 1, 1)
+
+
+def _store():
+    store = MockNeo4j()
+    store.create_node("Person", {}, DAY, None, {"team": "a"}, node_id="p1")
+    store.create_node("Person", {}, DAY, DAY + timedelta(hours=2), {"team": "b"}, node_id="p2")
+    store.create_node("Project", {}, DAY, None, {}, node_id="x")
+    store.create_relationship("p1", "x", "WORKS_ON", {}, DAY, DAY + timedelta(days=3), {})
+    return store
+
+
+def test_cardinalities_and_validity():
+    result = GraphStatistics(_store()).collect()
+    cardinalities = result["cardinalities"]
+    assert (cardinalities["nodes"], cardinalities["relationships"]) == (3, 1)
+    assert cardinalities["labels"] == {"Person": 2, "Project": 1}
+    assert cardinalities["node_context_keys"] == {
+        "team": {"count": 2, "distinct_values": 2, "distinct_values_capped": False}
+    }
+    nodes = result["validity"]["nodes"]
+    assert (nodes["open_ended"], nodes["valid_now"]) == (2, 2)
+    assert nodes["closed_durations"]["under_1d"] == 1
+    assert result["validity"]["relationships"]["closed_durations"]["under_7d"] == 1
+    assert result["computed_at"].tzinfo is timezone.utc
+
+
+def test_result_is_reused_until_the_next_write():
+    store = _store()
+    statistics = GraphStatistics(store)
+    first = statistics.collect()
+    assert statistics.collect() is first
+    store.create_node("Person", {}, DAY, None, {}, node_id="p3")
+    second = statistics.collect()
+    assert second is not first
+    assert second["cardinalities"]["labels"]["Person"] == 3
+    assert statistics.collect() is second
+
+
+def test_result_expires_after_max_age():
+    statistics = GraphStatistics(_store(), max_age=0.0)
+    first = statistics.collect()
+    assert statistics.collect() is not first
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.analytics.temporal_paths import TemporalPaths
+from app.db.mock_db import MockNeo4j
+from app.db.sqlite_store import SQLiteGraph
+
+DAY = datetime(2024, 1, 1)
+US = timedelta(microseconds=1)
+
+
+def at(hour: float) -> datetime:
+    return DAY + timedelta(hours=hour)
+
+
+def _graph(store):
+    """
+    A -FLIGHT [1,3)-> B -FLIGHT [4,5)-> C -FLIGHT [8,9)-> D
+    A -BUS [6,7)-> C,  C -FLIGHT [2,3)-> D (over before anyone reaches C)
+    """
+    for node_id in "ABCD":
+        store.create_node("Place", {}, DAY, None, {}, node_id=node_id)
+    for source, target, rel_type, start, end in (
+        ("A", "B", "FLIGHT", 1, 3),
+        ("B", "C", "FLIGHT", 4, 5),
+        ("A", "C", "BUS", 6, 7),
+        ("C", "D", "FLIGHT", 2, 3),
+        ("C", "D", "FLIGHT", 8, 9),
+    ):
+        store.create_relationship(source, target, rel_type, {}, at(start), at(end), {})
+    return store
+
+
+@pytest.fixture
+def paths():
+    return TemporalPaths(_graph(MockNeo4j()))
+
+
+def _hops(result):
+    return [(rel["source_id"], rel["target_id"], rel["traversed_at"]) for rel in result["path"]]
+
+
+def test_earliest_arrival(paths):
+    result = paths.earliest_arrival("A", "C", start=at(0))
+    assert result["arrival"] == at(4)
+    assert _hops(result) == [("A", "B", at(1)), ("B", "C", at(4))]
+    # Leaving too late for the first flight leaves only the bus
+    assert paths.earliest_arrival("A", "C", start=at(3))["arrival"] == at(6)
+    assert paths.earliest_arrival("A", "D", start=at(0))["arrival"] == at(8)
+    assert paths.earliest_arrival("A", "D", start=at(0), end=at(7))["reachable"] is False
+    # The early C -> D flight is over before C can be reached
+    assert paths.earliest_arrival("B", "D", start=at(0))["hops"] == 2
+    assert paths.earliest_arrival("D", "A", start=at(0))["reachable"] is False
+
+
+def test_depth_bound(paths):
+    assert paths.earliest_arrival("A", "C", start=at(0), max_depth=1)["arrival"] == at(6)
+    two = paths.earliest_arrival("A", "D", start=at(0), max_depth=2)
+    assert _hops(two) == [("A", "C", at(6)), ("C", "D", at(8))]
+    assert paths.earliest_arrival("A", "D", start=at(0), max_depth=1)["reachable"] is False
+    assert {hit["node_id"]: hit["hops"] for hit in paths.reachable("A", start=at(0), max_depth=2)} == \
+        {"B": 1, "C": 2, "D": 2}
+
+
+def test_type_filter(paths):
+    assert paths.earliest_arrival("A", "C", start=at(0), rel_types=["BUS"])["arrival"] == at(6)
+    assert paths.earliest_arrival("A", "B", start=at(0), rel_types=["BUS"])["reachable"] is False
+    assert [hit["node_id"] for hit in paths.reachable("A", start=at(0), rel_types=["FLIGHT"])] == ["B", "C", "D"]
+
+
+def test_latest_departure(paths):
+    # The bus can be caught until the last instant of its interval
+    result = paths.latest_departure("A", "C", end=at(10))
+    assert result["departure"] == at(7) - US
+    assert result["hops"] == 1
+    flights = paths.latest_departure("A", "C", end=at(10), rel_types=["FLIGHT"])
+    assert _hops(flights) == [("A", "B", at(3) - US), ("B", "C", at(5) - US)]
+    assert paths.latest_departure("A", "C", end=at(4))["departure"] == at(3) - US
+    assert paths.latest_departure("A", "C", end=at(0.5))["reachable"] is False
+
+
+def test_latest_departure_defaults_to_now_in_utc(paths):
+    result = paths.latest_departure("A", "C")
+    assert result["departure"] == (at(7) - US).replace(tzinfo=timezone.utc)
+
+
+def test_fastest(paths):
+    # The direct bus takes no time at all
+    assert paths.fastest("A", "C", start=at(0))["duration_seconds"] == 0.0
+    flights = paths.fastest("A", "C", start=at(0), rel_types=["FLIGHT"])
+    assert flights["departure"] == at(3) - US and flights["arrival"] == at(4)
+    assert flights["duration_seconds"] == 3600.000001
+    # Waiting for the last bus beats the earlier flights, which then wait at C for the 8:00 flight
+    via_bus = paths.fastest("A", "D", start=at(0))
+    assert _hops(via_bus) == [("A", "C", at(7) - US), ("C", "D", at(8))]
+
+
+def test_hub_writes_after_load_are_searchable(paths):
+    paths.load()
+    store = paths.store
+    store.create_node("Place", {}, DAY, None, {}, node_id="H")
+    for i in range(2000):
+        store.create_node("Place", {}, DAY, None, {}, node_id=f"s{i}")
+        store.create_relationship("H", f"s{i}", "FLIGHT", {}, at(10 + (i % 100) / 10), None, {})
+        if i == 1000:
+            assert len(paths.reachable("H", start=at(0), limit=5000)) == 1001
+    reached = paths.reachable("H", start=at(0), limit=5000)
+    assert len(reached) == 2000
+    assert [hit["arrival"] for hit in reached] == sorted(hit["arrival"] for hit in reached)
+
+
+@pytest.mark.parametrize("backend", ["mock", "sqlite"])
+def test_archiving_removes_only_the_archived_relationship(backend, tmp_path):
+    store = MockNeo4j() if backend == "mock" else SQLiteGraph(str(tmp_path / "paths.db"))
+    try:
+        for node_id in "XY":
+            store.create_node("Place", {}, DAY, None, {}, node_id=node_id)
+        # Two distinct relationships with identical fields
+        for _ in range(2):
+            store.create_relationship("X", "Y", "FLIGHT", {}, at(1), at(2), {})
+        paths = TemporalPaths(store)
+        paths.load()
+        _, rels, _ = store.expired_versions(at(3), limit=1)
+        store.remove_versions([], rels)
+        assert paths.earliest_arrival("X", "Y", start=at(0))["arrival"] == at(1)
+        _, rels, _ = store.expired_versions(at(3), limit=1)
+        store.remove_versions([], rels)
+        assert paths.earliest_arrival("X", "Y", start=at(0))["reachable"] is False
+    finally:
+        if backend == "sqlite":
+            store.close()
@@ -0,0 +1,123 @@
+"""Startup-time benchmark: how long a fresh worker takes to import, become ready and serve.
+
+Each run is a new interpreter, as a freshly scaled-up worker would be:
+
+    python -m app.benchmark_startup --runs 5
+    python -m app.benchmark_startup --seed 200000 --env CGTDB_PROPERTY_INDEXES=Person.age=sorted
+    python -m app.benchmark_startup --env CGTDB_EMBEDDING_MODEL=/models/all-MiniLM-L6-v2
+
+Every scenario ("lazy": CGTDB_WARMUP=none, "warm": all warm-up steps) reports
+the median import time, time until /ready answers 200, wall time of the whole
+child process (interpreter start to exit), and the latency of the first
+context search, index-backed query and temporal path query, which pay for
+whatever the warm-up skipped.
+"""
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Dict, List
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = {
+    "lazy": {"CGTDB_WARMUP": "none"},
+    "warm": {}
+}
+
+FIRST_REQUESTS = {
+    "first_search": ("POST", "/contexts/search/", {"query_text": "technical project deadline"}),
+    "first_query": ("POST", "/query", {"query": "MATCH (p:Person) WHERE p.age = 42 RETURN p.name LIMIT 10"}),
+    "first_temporal": ("GET", "/temporal/reachable/none", None)
+}
+
+
+def child():
+    """Measure one worker start in this (fresh) process and print the timings as JSON"""
+    started = time.perf_counter()
+    import app.main as main
+    from fastapi.testclient import TestClient
+    imported = time.perf_counter()
+    timings = {"import": imported - started}
+    with TestClient(main.app) as client:
+        while client.get("/ready").status_code != 200:
+            status = main.startup.status()
+            if any(step["status"] == "failed" for step in status["steps"]):
+                raise SystemExit(json.dumps(status, default=str))
+            time.sleep(0.005)
+        timings["ready"] = time.perf_counter() - started
+        for name, (method, path, body) in FIRST_REQUESTS.items():
+            request_started = time.perf_counter()
+            response = client.request(method, path, json=body)
+            timings[name] = time.perf_counter() - request_started
+            response.raise_for_status()
+    timings["steps"] = {step["name"]: step.get("seconds") for step in main.startup.status()["steps"]}
+    print(json.dumps(timings))
+
+
+def seed(path: str, nodes: int):
+    """Create a SQLite store with nodes Person nodes and twice as many relationships"""
+    from app.db.sqlite_store import SQLiteGraph
+    graph = SQLiteGraph(path)
+    rng = random.Random(42)
+    ids = []
+    for i in range(nodes):
+        valid_from = datetime(2023, 1, 1) + timedelta(hours=rng.randint(0, 8760))
+        ids.append(graph.create_node("Person", {"age": rng.randint(18, 80), "name": f"person {i}"},
+                                     valid_from, None, {"team": f"t{i % 20}"}))
+    for _ in range(2 * nodes):
+        valid_from = datetime(2023, 1, 1) + timedelta(hours=rng.randint(0, 8760))
+        graph.create_relationship(rng.choice(ids), rng.choice(ids), "KNOWS", {}, valid_from,
+                                  valid_from + timedelta(days=30), {})
+    graph.close()
+
+
+def run(scenario_env: Dict[str, str], runs: int) -> List[Dict]:
+    results = []
+    for _ in range(runs):
+        env = dict(os.environ, **scenario_env)
+        spawned = time.perf_counter()
+        out = subprocess.run([sys.executable, "-m", "app.benchmark_startup", "--child"], env=env,
+                             capture_output=True, text=True, check=True)
+        timings = json.loads(out.stdout.strip().splitlines()[-1])
+        timings["process"] = time.perf_counter() - spawned
+        results.append(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for every scenario, e.g. CGTDB_EMBEDDING_MODEL=/models/minilm")
+    parser.add_argument("--seed", type=int, default=0, metavar="N",
+                        help="start from a SQLite store with N nodes and 2N relationships")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenarios to run (default: all)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+    common = dict(item.split("=", 1) for item in args.env)
+    with tempfile.TemporaryDirectory(prefix="cgtdb-startup-") as tmp:
+        if args.seed:
+            common.update(CGTDB_STORAGE="sqlite", CGTDB_SQLITE_PATH=os.path.join(tmp, "seed.sqlite3"))
+            seed(common["CGTDB_SQLITE_PATH"], args.seed)
+        columns = ["import", "ready", "process", *FIRST_REQUESTS]
+        print(f"{'scenario':<10}" + "".join(f"{column:>16}" for column in columns))
+        for name in args.scenario or SCENARIOS:
+            results = run(dict(common, **SCENARIOS[name]), args.runs)
+            print(f"{name:<10}" + "".join(
+                f"{median(r[column] for r in results) * 1000:>14.1f}ms" for column in columns
+            ))
+            steps = results[-1]["steps"]
+            print(" " * 10 + "  ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in steps.items()))
+
+
+if __name__ == "__main__":
+    main()
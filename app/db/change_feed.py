@@ -0,0 +1,187 @@
+from collections import deque
+from datetime import datetime, date
+from typing import Optional, Dict, List, Any, AsyncIterator, Set, Tuple
+import asyncio
+import json
+import threading
+import uuid
+
+from app.utils.memory import estimate_size
+
+
+class ChangeFeedGap(Exception):
+    """Raised when a consumer asks for events that have already been dropped from the log"""
+
+
+class ChangeFeedFull(Exception):
+    """Raised when the maximum number of streaming subscribers is reached"""
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ChangeFeed:
+    """Monotonically sequenced, bounded log of store mutations.
+
+    Every event gets the next sequence number and is serialized once when it
+    is appended, so fanning it out to many consumers costs no re-encoding.
+    Consumers read from the shared log at their own pace using the last
+    sequence number they saw; there are no per-subscriber buffers, so memory
+    is bounded by ``retention`` however slow a consumer is. A consumer that
+    falls further behind than ``retention`` events gets ``ChangeFeedGap`` and
+    must resynchronize from a full dump.
+
+    Sequence numbers restart with the process, so every feed also has an
+    ``epoch``: a position is only meaningful together with the epoch it was
+    read in, and one from another epoch (or beyond the head) is a gap too.
+    Processes that see the same events in the same order (replicas of a
+    shared log) pass the same ``epoch``; otherwise a random one is used.
+    """
+
+    def __init__(self, retention: int = 100_000, max_subscribers: int = 256, epoch: Optional[str] = None):
+        self.retention = retention
+        self.max_subscribers = max_subscribers
+        self._events: deque = deque(maxlen=retention)
+        self.epoch = epoch or uuid.uuid4().hex[:16]
+        self._seq = 0
+        self._subscribers = 0
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def first_seq(self) -> int:
+        """Oldest sequence number still held in the log"""
+        with self._lock:
+            return self._events[0]["seq"] if self._events else self._seq + 1
+
+    def append(self, kind: str, data: Dict[str, Any]) -> int:
+        """Record a mutation and wake waiting subscribers; returns its sequence number"""
+        with self._lock:
+            self._seq += 1
+            event = {
+                "seq": self._seq,
+                "kind": kind,
+                "timestamp": datetime.now().isoformat(),
+                "data": json.dumps(data, default=_json_default)
+            }
+            self._events.append(event)
+            waiters = list(self._waiters)
+            seq = self._seq
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The subscriber's loop has already closed
+                pass
+        return seq
+
+    def since(self, seq: int, limit: int = 1000, epoch: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Events with a sequence number greater than seq, oldest first.
+
+        epoch, if given, is the epoch seq was read in.
+        """
+        if epoch is not None and epoch != self.epoch:
+            raise ChangeFeedGap(f"Sequence numbers from epoch {epoch} do not apply to epoch {self.epoch}")
+        with self._lock:
+            if seq > self._seq:
+                raise ChangeFeedGap(f"Sequence number {seq} is ahead of the head {self._seq}; "
+                                    f"the feed has restarted")
+            if not self._events or seq == self._seq:
+                return []
+            first = self._events[0]["seq"]
+            if seq < first - 1:
+                raise ChangeFeedGap(f"Events after {seq} are no longer retained; oldest is {first}")
+            start = seq - first + 1
+            return [self._events[i] for i in range(start, min(start + limit, len(self._events)))]
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of the retained events"""
+        return {"events": estimate_size(self._events, sample=sample)}
+
+    def page_json(self, since: int, limit: int = 1000, epoch: Optional[str] = None) -> str:
+        """JSON page of events after since, built from the pre-serialized payloads"""
+        events = self.since(since, limit=limit, epoch=epoch)
+        body = ",".join(
+            f"{{\"seq\": {event['seq']}, \"kind\": \"{event['kind']}\", "
+            f"\"timestamp\": \"{event['timestamp']}\", \"data\": {event['data']}}}"
+            for event in events
+        )
+        last_seq = events[-1]["seq"] if events else max(since, 0)
+        return (f"{{\"epoch\": \"{self.epoch}\", \"events\": [{body}], "
+                f"\"last_seq\": {last_seq}, \"head_seq\": {self._seq}}}")
+
+    async def wait_for(self, seq: int, timeout: float) -> bool:
+        """Wait until an event newer than seq exists; False on timeout"""
+        if self._seq > seq:
+            return True
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._seq > seq:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def full(self) -> bool:
+        return self._subscribers >= self.max_subscribers
+
+    def acquire_subscriber(self):
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                raise ChangeFeedFull("Too many change feed subscribers")
+            self._subscribers += 1
+
+    def release_subscriber(self):
+        with self._lock:
+            self._subscribers -= 1
+
+    async def stream_sse(self, since: int, epoch: Optional[str] = None, batch_size: int = 500,
+                         keepalive: float = 15.0) -> AsyncIterator[str]:
+        """Server-sent events for every change after since, until the client disconnects.
+
+        A subscriber slot is held while the generator runs, so one is only
+        taken once the response actually starts; with none free the stream
+        is a single ``error`` event. Event ids are ``<epoch>-<seq>``. The
+        generator only advances when the transport has sent the previous
+        chunk, which is what applies backpressure per consumer.
+        """
+        try:
+            self.acquire_subscriber()
+        except ChangeFeedFull as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        try:
+            cursor = since
+            while True:
+                try:
+                    events = self.since(cursor, limit=batch_size, epoch=epoch)
+                except ChangeFeedGap as e:
+                    reset = {"detail": str(e), "epoch": self.epoch, "last_seq": self._seq}
+                    yield f"event: reset\ndata: {json.dumps(reset)}\n\n"
+                    return
+                if not events:
+                    if not await self.wait_for(cursor, keepalive):
+                        yield ": keepalive\n\n"
+                    continue
+                yield "".join(
+                    f"id: {self.epoch}-{event['seq']}\nevent: {event['kind']}\n"
+                    f"data: {{\"seq\": {event['seq']}, \"timestamp\": \"{event['timestamp']}\", "
+                    f"\"data\": {event['data']}}}\n\n"
+                    for event in events
+                )
+                cursor = events[-1]["seq"]
+        finally:
+            self.release_subscriber()
@@ -0,0 +1,350 @@
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Optional, Dict, List, Any, BinaryIO, Callable, Iterator, Tuple
+import json
+import mmap
+import struct
+import numpy as np
+
+from app.db.change_feed import _json_default
+from app.db.mock_db import MockNode
+from app.utils.timestamps import to_epoch_us, from_epoch_us
+
+MAGIC = b"CGTDBCOL"
+VERSION = 1
+ALIGNMENT = 64
+
+# Sentinels of the validity columns: an open valid_to, a missing valid_from, a naive datetime
+OPEN_END = np.iinfo(np.int64).max
+NO_START = np.iinfo(np.int64).min
+NAIVE = np.iinfo(np.int32).min
+
+# Trailer: footer length and magic, so the footer can be written after the data
+_TRAILER = struct.Struct("<Q8s")
+
+
+def _valid_at(valid_from: Optional[datetime], valid_to: Optional[datetime], ts: int) -> bool:
+    start, end = to_epoch_us(valid_from)[0], to_epoch_us(valid_to)[0]
+    return (start is None or start <= ts) and (end is None or end > ts)
+
+
+class _Validity:
+    """Epoch-microsecond columns and UTC offsets of one kind of entity, filled row by row"""
+
+    def __init__(self):
+        self.valid_from: List[int] = []
+        self.valid_from_tz: List[int] = []
+        self.valid_to: List[int] = []
+        self.valid_to_tz: List[int] = []
+
+    def append(self, valid_from: Optional[datetime], valid_to: Optional[datetime]):
+        for value, default, times, offsets in ((valid_from, NO_START, self.valid_from, self.valid_from_tz),
+                                               (valid_to, OPEN_END, self.valid_to, self.valid_to_tz)):
+            us, offset = to_epoch_us(value)
+            times.append(default if us is None else us)
+            offsets.append(NAIVE if offset is None else offset)
+
+    def columns(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_valid_from": np.array(self.valid_from, dtype="<i8"),
+            f"{prefix}_valid_from_tz": np.array(self.valid_from_tz, dtype="<i4"),
+            f"{prefix}_valid_to": np.array(self.valid_to, dtype="<i8"),
+            f"{prefix}_valid_to_tz": np.array(self.valid_to_tz, dtype="<i4")
+        }
+
+
+class _Blob:
+    """Concatenated JSON documents with an offsets column (row i is bytes offsets[i]:offsets[i + 1])"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.offsets: List[int] = [0]
+
+    def append(self, document: Dict[str, Any]):
+        data = json.dumps(document, default=_json_default, separators=(",", ":")).encode()
+        self.parts.append(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def columns(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_blob_offsets": np.array(self.offsets, dtype="<i8"),
+            f"{prefix}_blob": np.frombuffer(b"".join(self.parts), dtype=np.uint8)
+        }
+
+
+def _codes(values: List[int], distinct: int) -> np.ndarray:
+    return np.array(values, dtype="<u2" if distinct <= 1 << 16 else "<u4")
+
+
+def _fixed_width(values: List[str]) -> np.ndarray:
+    encoded = [value.encode() for value in values]
+    width = max((len(value) for value in encoded), default=1) or 1
+    return np.array(encoded, dtype=f"S{width}")
+
+
+def export_graph(store, out: BinaryIO, timestamp: Optional[datetime] = None) -> Dict[str, int]:
+    """Write the store (or the versions valid at timestamp) to out in the columnar format.
+
+    Layout: MAGIC, then every column as raw little-endian data at a 64-byte
+    aligned offset, then a JSON footer describing the columns (dtype, shape,
+    offset) and the label and type dictionaries, then the footer length and
+    MAGIC again. Nodes are rows of the node_* columns; relationship endpoints
+    are rel_source / rel_target indexes into them, and indexes past the last
+    node refer to external_id (endpoints not exported, e.g. archived).
+    """
+    ts = to_epoch_us(timestamp)[0]
+    ids: List[str] = []
+    index: Dict[str, int] = {}
+    labels: Dict[str, int] = {}
+    label_codes: List[int] = []
+    node_validity, node_blob = _Validity(), _Blob()
+    for node in store.iter_nodes():
+        if ts is not None and not _valid_at(node.valid_from, node.valid_to, ts):
+            continue
+        index[node.id] = len(ids)
+        ids.append(node.id)
+        label_codes.append(labels.setdefault(node.labels[0], len(labels)))
+        node_validity.append(node.valid_from, node.valid_to)
+        node_blob.append({"properties": node.properties, "context": node.context})
+
+    external: List[str] = []
+    external_index: Dict[str, int] = {}
+
+    def endpoint(node_id: str) -> int:
+        i = index.get(node_id)
+        if i is not None:
+            return i
+        if node_id not in external_index:
+            external_index[node_id] = len(external)
+            external.append(node_id)
+        return len(ids) + external_index[node_id]
+
+    rel_types: Dict[str, int] = {}
+    sources: List[int] = []
+    targets: List[int] = []
+    type_codes: List[int] = []
+    rel_validity, rel_blob = _Validity(), _Blob()
+    for rel in store.iter_relationships():
+        if ts is not None and not _valid_at(rel["valid_from"], rel["valid_to"], ts):
+            continue
+        sources.append(endpoint(rel["source_id"]))
+        targets.append(endpoint(rel["target_id"]))
+        type_codes.append(rel_types.setdefault(rel["type"], len(rel_types)))
+        rel_validity.append(rel["valid_from"], rel["valid_to"])
+        rel_blob.append({"properties": rel["properties"], "context": rel["context"]})
+
+    columns = {
+        "node_id": _fixed_width(ids),
+        "node_label": _codes(label_codes, len(labels)),
+        **node_validity.columns("node"),
+        **node_blob.columns("node"),
+        "external_id": _fixed_width(external),
+        "rel_source": np.array(sources, dtype="<i8"),
+        "rel_target": np.array(targets, dtype="<i8"),
+        "rel_type": _codes(type_codes, len(rel_types)),
+        **rel_validity.columns("rel"),
+        **rel_blob.columns("rel")
+    }
+    footer = {
+        "version": VERSION,
+        "nodes": len(ids),
+        "relationships": len(sources),
+        "labels": list(labels),
+        "rel_types": list(rel_types),
+        "as_of": timestamp.isoformat() if timestamp else None,
+        "exported_at": datetime.now().isoformat(),
+        "columns": {}
+    }
+    out.write(MAGIC)
+    position = len(MAGIC)
+    for name, array in columns.items():
+        padding = -position % ALIGNMENT
+        out.write(b"\0" * padding)
+        position += padding
+        footer["columns"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": position}
+        data = np.ascontiguousarray(array).tobytes()
+        out.write(data)
+        position += len(data)
+    encoded = json.dumps(footer).encode()
+    out.write(encoded)
+    out.write(_TRAILER.pack(len(encoded), MAGIC))
+    return {"nodes": len(ids), "relationships": len(sources), "bytes": position + len(encoded) + _TRAILER.size}
+
+
+class ColumnarGraph:
+    """A columnar export opened through a read-only memory map.
+
+    ``column(name)`` returns a NumPy view of the mapped bytes, so nothing is
+    copied or parsed until it is used; ``nodes()`` and ``relationships()``
+    decode rows back into store records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty, not a columnar graph export")
+        size = len(self._map)
+        if size < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a columnar graph export")
+        footer_size, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+        start = size - _TRAILER.size - footer_size
+        self.footer = json.loads(self._map[start:start + footer_size])
+        if self.footer["version"] > VERSION:
+            self.close()
+            raise ValueError(f"{path} has format version {self.footer['version']}; this reader knows {VERSION}")
+        self.labels: List[str] = self.footer["labels"]
+        self.rel_types: List[str] = self.footer["rel_types"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.close()
+        except BufferError:
+            # Frames of the exception in flight may still hold views; the map is unmapped with them
+            if exc_type is None:
+                raise
+
+    def close(self):
+        """Unmap the file; views returned by column() must have been dropped"""
+        try:
+            self._map.close()
+        except BufferError:
+            raise BufferError(f"Column views of {self.path} are still referenced; drop them before closing")
+        finally:
+            self._file.close()
+
+    def __len__(self) -> int:
+        return self.footer["nodes"]
+
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy, read-only view of one column"""
+        spec = self.footer["columns"][name]
+        count = int(np.prod(spec["shape"]))
+        return np.frombuffer(self._map, dtype=np.dtype(spec["dtype"]), count=count,
+                             offset=spec["offset"]).reshape(spec["shape"])
+
+    @staticmethod
+    def _datetime(us: int, offset: int, sentinel: int) -> Optional[datetime]:
+        if us == sentinel:
+            return None
+        return from_epoch_us(int(us), None if offset == NAIVE else int(offset))
+
+    def _rows(self, prefix: str) -> Iterator[Tuple[int, Optional[datetime], Optional[datetime], Dict]]:
+        valid_from = self.column(f"{prefix}_valid_from")
+        valid_from_tz = self.column(f"{prefix}_valid_from_tz")
+        valid_to = self.column(f"{prefix}_valid_to")
+        valid_to_tz = self.column(f"{prefix}_valid_to_tz")
+        offsets = self.column(f"{prefix}_blob_offsets")
+        blob = self.column(f"{prefix}_blob")
+        for i in range(len(valid_from)):
+            yield (
+                i,
+                self._datetime(valid_from[i], valid_from_tz[i], NO_START),
+                self._datetime(valid_to[i], valid_to_tz[i], OPEN_END),
+                json.loads(blob[offsets[i]:offsets[i + 1]].tobytes())
+            )
+
+    def node_ids(self) -> List[str]:
+        return [value.decode() for value in self.column("node_id")]
+
+    def _endpoint_ids(self) -> List[str]:
+        return self.node_ids() + [value.decode() for value in self.column("external_id")]
+
+    def nodes(self) -> Iterator[MockNode]:
+        ids = self.column("node_id")
+        labels = self.column("node_label")
+        for i, valid_from, valid_to, document in self._rows("node"):
+            yield MockNode(ids[i].decode(), [self.labels[labels[i]]], document["properties"],
+                           valid_from, valid_to, document["context"])
+
+    def relationships(self) -> Iterator[Dict[str, Any]]:
+        endpoints = self._endpoint_ids()
+        sources = self.column("rel_source")
+        targets = self.column("rel_target")
+        types = self.column("rel_type")
+        for i, valid_from, valid_to, document in self._rows("rel"):
+            yield {
+                "source_id": endpoints[sources[i]],
+                "target_id": endpoints[targets[i]],
+                "type": self.rel_types[types[i]],
+                "properties": document["properties"],
+                "valid_from": valid_from,
+                "valid_to": valid_to,
+                "context": document["context"]
+            }
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(self.footer)
+
+
+def import_graph(store, source: ColumnarGraph, attach: Optional[Callable[[List[MockNode]], Any]] = None,
+                 batch_size: int = 10_000) -> Dict[str, int]:
+    """Write the nodes and relationships of an export into store, keeping node ids.
+
+    Nodes whose id already exists are skipped, and so are relationships
+    between existing nodes that the store already holds (same source,
+    target, type and valid_from), so importing an export again adds nothing.
+    attach, if given, is called with each batch of created nodes, e.g. to
+    attach their contexts as on POST /nodes/. On SQLite, rows are written in
+    transactions of batch_size.
+    """
+    transaction = getattr(store, "transaction", None)
+    counts = {"nodes": 0, "skipped_nodes": 0, "relationships": 0, "skipped_relationships": 0}
+
+    def batches(rows: Iterator) -> Iterator[List]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def key(rel: Dict[str, Any]) -> Tuple[str, str, Optional[int]]:
+        return rel["target_id"], rel["type"], to_epoch_us(rel["valid_from"])[0]
+
+    created_ids = set()
+    for batch in batches(source.nodes()):
+        created = []
+        with transaction() if transaction else nullcontext():
+            for node in batch:
+                if store.get_node(node.id) is not None:
+                    counts["skipped_nodes"] += 1
+                    continue
+                store.create_node(node.labels[0], node.properties, node.valid_from, node.valid_to,
+                                  node.context, node_id=node.id)
+                created.append(node)
+        created_ids.update(node.id for node in created)
+        counts["nodes"] += len(created)
+        if attach is not None and created:
+            attach(created)
+    # Outgoing relationships each source had before the import, taken the first time the source
+    # comes up; each one matches at most one relationship of the export
+    existing: Dict[str, Counter] = {}
+    for batch in batches(source.relationships()):
+        with transaction() if transaction else nullcontext():
+            for rel in batch:
+                source_id = rel["source_id"]
+                if source_id not in created_ids and rel["target_id"] not in created_ids:
+                    if source_id not in existing:
+                        existing[source_id] = Counter(map(key, store.get_relationships(source_id, "out")))
+                    if existing[source_id][key(rel)] > 0:
+                        existing[source_id][key(rel)] -= 1
+                        counts["skipped_relationships"] += 1
+                        continue
+                store.create_relationship(source_id, rel["target_id"], rel["type"], rel["properties"],
+                                          rel["valid_from"], rel["valid_to"], rel["context"])
+                counts["relationships"] += 1
+    return counts
@@ -0,0 +1,62 @@
+from typing import Optional, Dict, List, Any, Set, Tuple
+import json
+import uuid
+
+# Namespace for deterministic context ids, so every process derives the same id
+CONTEXT_NAMESPACE = uuid.UUID("5b0f7c9e-3d4a-4f2b-9c1e-7a8d6e5f4c3b")
+
+
+def canonicalize_context(context: Dict[str, Any]) -> str:
+    """Canonical text of a context: key order and whitespace never matter"""
+    return json.dumps(context, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def context_id_for(canonical: str) -> str:
+    """Stable id (a UUID, so it is also a valid Qdrant point id) of a canonical context"""
+    return str(uuid.uuid5(CONTEXT_NAMESPACE, canonical))
+
+
+class ContextRefs:
+    """Node to shared-context mapping with reference counts.
+
+    Nodes with identical contexts share one stored vector; this tracks which
+    nodes point at each context so the vector can be dropped when the last
+    of them is detached.
+    """
+
+    def __init__(self):
+        self.node_context: Dict[str, str] = {}
+        self.context_nodes: Dict[str, Set[str]] = {}
+
+    def attach(self, node_id: str, context_id: str) -> Tuple[bool, Optional[str]]:
+        """Point node_id at context_id.
+
+        Returns whether this is the context's first reference, and the node's
+        previous context if moving the node left it without references.
+        """
+        previous = self.node_context.get(node_id)
+        if previous == context_id:
+            return False, None
+        orphaned = self.detach(node_id) if previous is not None else None
+        self.node_context[node_id] = context_id
+        nodes = self.context_nodes.setdefault(context_id, set())
+        nodes.add(node_id)
+        return len(nodes) == 1, orphaned
+
+    def detach(self, node_id: str) -> Optional[str]:
+        """Drop node_id's reference; returns the context id if nothing references it any more"""
+        context_id = self.node_context.pop(node_id, None)
+        if context_id is None:
+            return None
+        nodes = self.context_nodes.get(context_id, set())
+        nodes.discard(node_id)
+        if nodes:
+            return None
+        self.context_nodes.pop(context_id, None)
+        return context_id
+
+    def nodes(self, context_id: str) -> List[str]:
+        return sorted(self.context_nodes.get(context_id, ()))
+
+    def refcount(self, context_id: str) -> int:
+        return len(self.context_nodes.get(context_id, ()))
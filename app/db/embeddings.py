@@ -0,0 +1,64 @@
+from typing import List, Optional
+import re
+import threading
+import zlib
+import numpy as np
+
+VECTOR_SIZE = 384  # MiniLM-L6-v2 embedding size
+
+_TOKEN = re.compile(r"\w+")
+
+
+def hashing_encode(texts: List[str], size: int = VECTOR_SIZE) -> np.ndarray:
+    """Deterministic bag-of-words embeddings by feature hashing, L2-normalized.
+
+    Used by the in-process store when no sentence-transformers model is
+    configured; texts sharing words get similar vectors without any model.
+    """
+    vectors = np.zeros((len(texts), size), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in _TOKEN.findall(text.lower()):
+            h = zlib.crc32(token.encode())
+            vectors[row, h % size] += 1.0 if (h >> 16) & 1 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class ModelEncoder:
+    """sentence-transformers encoder, loaded on first use.
+
+    model_name is a hub name or the path of a local copy; a local path loads
+    without any network access.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def warm_up(encoder, batch_size: int = 32):
+    """Encode a dummy batch, which loads a lazy model and pays its first-call setup up front"""
+    encoder([f"warm-up text {i}" for i in range(max(batch_size, 1))])
+
+
+def get_encoder(model_name: Optional[str] = None):
+    """Encoder for the in-process store: the named model, or feature hashing if none"""
+    return ModelEncoder(model_name) if model_name else hashing_encode
@@ -1,8 +1,18 @@
-from typing import Optional, Dict, List, Any
-from datetime import datetime
+from collections import Counter
+from typing import Optional, Dict, List, Any, Callable, Iterator, Set, Tuple
+from datetime import datetime, timezone
 import json
+import threading
 import uuid
 
+import numpy as np
+
+from app.db.context_refs import ContextRefs, canonicalize_context, context_id_for
+from app.db.embeddings import VECTOR_SIZE, hashing_encode
+from app.db.vector_index import VectorIndex
+from app.utils.memory import estimate_size
+from app.utils.profiling import stage, scanned, used_index
+
 class MockNode:
     def __init__(self, id: str, labels: List[str], properties: Dict, valid_from: datetime,
                  valid_to: Optional[datetime], context: Dict):
@@ -13,14 +23,58 @@ class MockNode:
         self.valid_to = valid_to
         self.context = context
 
+def _utc(value: datetime) -> datetime:
+    """Naive UTC datetime, so that naive (taken as UTC) and aware values compare"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _expired(valid_to: Optional[datetime], cutoff: datetime) -> bool:
+    return valid_to is not None and _utc(valid_to) <= _utc(cutoff)
+
 class MockNeo4j:
+    """In-process graph store, safe to share between request threads.
+
+    Writes are serialized by one short lock. Reads never take it: point
+    lookups are single dict operations, and scans walk append-only lists up
+    to the length they had when the scan started, so they see a consistent
+    snapshot without copying and never block writers. Archiving only marks
+    versions as removed, which reads skip; ``compact`` then replaces the
+    lists once (instead of shrinking them, so running scans are unaffected).
+    """
+
     def __init__(self):
         self.nodes: Dict[str, MockNode] = {}
-        self.relationships: List[Dict] = []
+        # Append-only insertion order of self.nodes, for lock-free snapshot scans
+        self._node_list: List[MockNode] = []
+        self._lock = threading.RLock()
+        # Relationships with their adjacency index (node id -> positions in the list,
+        # outgoing and incoming) and the positions archived since the last compact,
+        # swapped as one tuple so readers never mix versions
+        self._edges: Tuple[List[Dict], Dict[str, List[int]], Dict[str, List[int]], Set[int]] = ([], {}, {}, set())
+        # Label index: label -> append-only list of nodes with that label
+        self.label_index: Dict[str, List[MockNode]] = {}
+        # Archived nodes still in the lists, by label, until compact
+        self._archived_labels: Counter = Counter()
+        # Bumped on every write so derived results (analytics, caches) can be invalidated
+        self.generation = 0
+        self.listeners: List[Callable[[str, Dict], None]] = []
+
+    @property
+    def relationships(self) -> List[Dict]:
+        return list(self.iter_relationships())
+
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """Register a callback invoked as listener(kind, data) after every write"""
+        self.listeners.append(listener)
+
+    def _emit(self, kind: str, data: Dict):
+        for listener in self.listeners:
+            listener(kind, data)
 
     def create_node(self, label: str, properties: dict, valid_from: datetime,
-                   valid_to: Optional[datetime], context: dict) -> str:
-        node_id = str(uuid.uuid4())
+                   valid_to: Optional[datetime], context: dict, node_id: Optional[str] = None) -> str:
+        node_id = node_id or str(uuid.uuid4())
         node = MockNode(
             id=node_id,
             labels=[label],
@@ -29,7 +83,22 @@ class MockNeo4j:
             valid_to=valid_to,
             context=context
         )
-        self.nodes[node_id] = node
+        with self._lock:
+            if node_id in self.nodes:
+                raise ValueError(f"Node {node_id} already exists")
+            self.nodes[node_id] = node
+            self._node_list.append(node)
+            self.label_index.setdefault(label, []).append(node)
+            self.generation += 1
+            # Emitted under the lock so listeners observe writes in store order
+            self._emit("node", {
+                "id": node_id,
+                "label": label,
+                "properties": properties,
+                "valid_from": valid_from,
+                "valid_to": valid_to,
+                "context": context
+            })
         return node_id
 
     def create_relationship(self, source_id: str, target_id: str, rel_type: str,
@@ -44,7 +113,136 @@ class MockNeo4j:
             "valid_to": valid_to,
             "context": context
         }
-        self.relationships.append(rel)
+        with self._lock:
+            relationships, out_edges, in_edges, _ = self._edges
+            # Appended before its position is published, as readers do not take the lock
+            relationships.append(rel)
+            position = len(relationships) - 1
+            out_edges.setdefault(source_id, []).append(position)
+            in_edges.setdefault(target_id, []).append(position)
+            self.generation += 1
+            self._emit("relationship", rel)
+
+    def _live(self, nodes: List[MockNode]) -> Iterator[MockNode]:
+        # Archived nodes stay in the lists until compact, but not in self.nodes
+        live = self.nodes
+        for i in range(len(nodes)):
+            node = nodes[i]
+            if live.get(node.id) is node:
+                yield node
+
+    def iter_nodes(self) -> Iterator[MockNode]:
+        """All nodes, as of the start of the iteration"""
+        return self._live(self._node_list)
+
+    def nodes_by_label(self, label: str) -> Iterator[MockNode]:
+        """Nodes with the given label, as of the start of the iteration"""
+        return self._live(self.label_index.get(label, []))
+
+    def count_nodes(self, label: Optional[str] = None) -> int:
+        if label is None:
+            return len(self.nodes)
+        with self._lock:
+            return len(self.label_index.get(label, ())) - self._archived_labels[label]
+
+    def iter_relationships(self) -> Iterator[Dict]:
+        """All relationships, as of the start of the iteration"""
+        rels, _, _, archived = self._edges
+        for i in range(len(rels)):
+            if i not in archived:
+                yield rels[i]
+
+    def expired_versions(self, cutoff: datetime, limit: int,
+                         cursor: Optional[Tuple] = None) -> Tuple[List[MockNode], List[Tuple[int, Dict]], Tuple]:
+        """Up to limit node and up to limit relationship versions whose validity ended by cutoff.
+
+        Relationships are paired with the key remove_versions takes (their
+        position), which stays valid until the next compact. Also returns a
+        cursor; passing it to the next call with the same cutoff resumes the
+        scan where this one stopped instead of at the start.
+        """
+        node_list, live = self._node_list, self.nodes
+        relationships, _, _, archived = self._edges
+        node_start = rel_start = 0
+        # Positions in lists that compact has since replaced mean nothing
+        if cursor is not None and cursor[0] is node_list and cursor[1] is relationships:
+            node_start, rel_start = cursor[2], cursor[3]
+        nodes = []
+        node_end = len(node_list)
+        for i in range(node_start, node_end):
+            if len(nodes) == limit:
+                node_end = i
+                break
+            node = node_list[i]
+            if live.get(node.id) is node and _expired(node.valid_to, cutoff):
+                nodes.append(node)
+        rels = []
+        rel_end = len(relationships)
+        for i in range(rel_start, rel_end):
+            if len(rels) == limit:
+                rel_end = i
+                break
+            if i not in archived and _expired(relationships[i]["valid_to"], cutoff):
+                rels.append((i, relationships[i]))
+        return nodes, rels, (node_list, relationships, node_end, rel_end)
+
+    def remove_versions(self, node_ids: List[str], relationships: List[Tuple[int, Dict]]):
+        """Drop archived versions from reads; compact removes them from the lists"""
+        with self._lock:
+            for node_id in node_ids:
+                node = self.nodes.pop(node_id, None)
+                if node is not None:
+                    self._archived_labels[node.labels[0]] += 1
+            current, _, _, archived = self._edges
+            # Keys from before a compact point at other relationships now
+            relationships = [
+                (key, rel) for key, rel in relationships
+                if key < len(current) and current[key] is rel and key not in archived
+            ]
+            archived.update(key for key, _ in relationships)
+            self.generation += 1
+            self._emit("archived", {
+                "node_ids": list(node_ids),
+                "relationships": [rel for _, rel in relationships]
+            })
+
+    def compact(self):
+        """Rebuild the lists and indexes without archived versions, once for any number of removals"""
+        with self._lock:
+            relationships, _, _, archived = self._edges
+            if self._archived_labels:
+                live = self.nodes
+                self._node_list = [node for node in self._node_list if live.get(node.id) is node]
+                label_index = {}
+                for label, nodes in self.label_index.items():
+                    kept = [node for node in nodes if live.get(node.id) is node]
+                    if kept:
+                        label_index[label] = kept
+                self.label_index = label_index
+                self._archived_labels = Counter()
+            if archived:
+                kept_rels = [rel for i, rel in enumerate(relationships) if i not in archived]
+                out_edges: Dict[str, List[int]] = {}
+                in_edges: Dict[str, List[int]] = {}
+                for i, rel in enumerate(kept_rels):
+                    out_edges.setdefault(rel["source_id"], []).append(i)
+                    in_edges.setdefault(rel["target_id"], []).append(i)
+                self._edges = (kept_rels, out_edges, in_edges, set())
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of each structure.
+
+        Nodes are counted once, under nodes; node id strings are also counted
+        in relationships and adjacency, which reference them.
+        """
+        relationships, out_edges, in_edges, _ = self._edges
+        return {
+            "nodes": estimate_size(self.nodes, sample=sample),
+            "node_list": estimate_size(self._node_list, depth=0),
+            "label_index": estimate_size(self.label_index, depth=1, sample=sample),
+            "relationships": estimate_size(relationships, sample=sample),
+            "adjacency": estimate_size(out_edges, sample=sample) + estimate_size(in_edges, sample=sample)
+        }
 
     def get_node(self, node_id: str, timestamp: Optional[datetime] = None) -> Optional[MockNode]:
         node = self.nodes.get(node_id)
@@ -52,38 +250,142 @@ class MockNeo4j:
             return None
         
         if timestamp:
-            if node.valid_from > timestamp or (node.valid_to and node.valid_to <= timestamp):
+            ts = _utc(timestamp)
+            if _utc(node.valid_from) > ts or (node.valid_to and _utc(node.valid_to) <= ts):
                 return None
         
         return node
 
+    def get_relationships(self, node_id: str, direction: str = "both",
+                          timestamp: Optional[datetime] = None) -> List[Dict]:
+        """Relationships incident to a node; direction is 'out', 'in' or 'both'"""
+        relationships, out_edges, in_edges, archived = self._edges
+        positions: List[int] = []
+        if direction in ("out", "both"):
+            positions.extend(out_edges.get(node_id, ()))
+        if direction in ("in", "both"):
+            positions.extend(in_edges.get(node_id, ()))
+        rels = [relationships[i] for i in positions if i not in archived]
+        if timestamp:
+            ts = _utc(timestamp)
+            rels = [
+                rel for rel in rels
+                if _utc(rel["valid_from"]) <= ts and (not rel["valid_to"] or _utc(rel["valid_to"]) > ts)
+            ]
+        return rels
+
 class MockVectorStore:
-    def __init__(self):
+    """In-process context store with a (optionally quantized) similarity index.
+
+    ``encoder`` maps a list of texts to normalized vectors; it defaults to
+    feature hashing so no model is needed. See VectorIndex for the
+    quantization modes and where full-precision vectors are kept.
+    """
+
+    def __init__(self, encoder: Optional[Callable] = None, quantization: str = "int8",
+                 oversampling: float = 4.0, vector_path: Optional[str] = None):
         self.contexts: Dict[str, Dict] = {}
+        self.refs = ContextRefs()
+        self.encoder = encoder or hashing_encode
+        self.index = VectorIndex(VECTOR_SIZE, quantization=quantization,
+                                 oversampling=oversampling, path=vector_path)
+        self._lock = threading.RLock()
+        self.listeners: List[Callable[[str, Dict], None]] = []
+
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """Register a callback invoked as listener(kind, data) after every write"""
+        self.listeners.append(listener)
+
+    def _emit(self, kind: str, data: Dict):
+        for listener in self.listeners:
+            listener(kind, data)
 
     def init_collection(self):
         pass
 
-    def store_context(self, context_id: str, context_text: str, metadata: Dict[str, Any]):
-        self.contexts[context_id] = {
-            "text": context_text,
-            "metadata": metadata
-        }
+    def store_context(self, context_id: str, context_text: str, metadata: Dict[str, Any],
+                      embedding: Optional[np.ndarray] = None):
+        """Store a context; embedding, if already computed, is its (1, dim) vector"""
+        if embedding is None:
+            embedding = self.encoder([context_text])
+        with self._lock:
+            self.index.add([context_id], embedding)
+            self.contexts[context_id] = {
+                "text": context_text,
+                "metadata": metadata
+            }
+            self._emit("context", {"id": context_id, "text": context_text, "metadata": metadata})
+
+    def attach_context(self, node_id: str, context: Dict[str, Any],
+                       embedding: Optional[np.ndarray] = None) -> str:
+        """Link a node to its context, storing the context only if no other node shares it"""
+        canonical = canonicalize_context(context)
+        context_id = context_id_for(canonical)
+        while True:
+            with self._lock:
+                # Only the first reference stores the context, and its vector is encoded outside the lock
+                if embedding is not None or self.refs.refcount(context_id) > 0:
+                    first, orphaned = self.refs.attach(node_id, context_id)
+                    if first:
+                        self.store_context(context_id, canonical, {"context": context}, embedding)
+                    self._emit("context_attached", {"node_id": node_id, "context_id": context_id})
+                    if orphaned:
+                        # The node moved off the last reference to its previous context
+                        self.delete_context(orphaned)
+                    return context_id
+            embedding = self.encoder([canonical])
+
+    def detach_context(self, node_id: str):
+        """Unlink a node from its context, deleting the context with its last reference"""
+        with self._lock:
+            orphaned = self.refs.detach(node_id)
+            self._emit("context_detached", {"node_id": node_id})
+            if orphaned:
+                self.delete_context(orphaned)
 
     def find_similar_contexts(self, query_text: str, limit: int = 5):
-        # Simple mock implementation that returns all contexts
-        results = []
-        for context_id, data in self.contexts.items():
-            results.append({
-                "id": context_id,
-                "text": data["text"],
-                "metadata": data["metadata"],
-                "score": 0.9  # Mock similarity score
-            })
-            if len(results) >= limit:
-                break
-        return results
+        """Find similar contexts based on semantic similarity"""
+        return self.find_similar_contexts_batch([query_text], limit)[0]
+
+    def find_similar_contexts_batch(self, query_texts: List[str], limit: int = 5) -> List[List[Dict]]:
+        """find_similar_contexts for many queries: one encode call and one batched index search"""
+        if not query_texts:
+            return []
+        with stage("encode"):
+            query_vectors = self.encoder(list(query_texts))
+        with stage("vector_search"), self._lock:
+            # The first pass compares every query with every stored vector
+            scanned(len(self.index) * len(query_texts))
+            used_index(f"vector index ({self.index.quantization})")
+            return [
+                [
+                    {
+                        "id": context_id,
+                        "text": self.contexts[context_id]["text"],
+                        "metadata": self.contexts[context_id]["metadata"],
+                        "node_ids": self.refs.nodes(context_id),
+                        "score": score
+                    }
+                    for context_id, score in hits
+                ]
+                for hits in self.index.search_batch(query_vectors, limit)
+            ]
 
     def delete_context(self, context_id: str):
-        if context_id in self.contexts:
-            del self.contexts[context_id] 
\ No newline at end of file
+        with self._lock:
+            if context_id in self.contexts:
+                del self.contexts[context_id]
+                self.index.remove(context_id)
+                self._emit("context_deleted", {"id": context_id})
+
+    def compact(self):
+        """Rewrite the similarity index without the rows of deleted contexts"""
+        self.index.compact()
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of the context texts, node references and similarity index"""
+        return {
+            "contexts": estimate_size(self.contexts, sample=sample),
+            "refs": estimate_size(self.refs, sample=sample),
+            **{f"index_{name}": size for name, size in self.index.memory_bytes().items()}
+        }
@@ -4,12 +4,91 @@ import os
 from datetime import datetime
 import json
 
+from app.db.property_index import index_key, parse_index_specs, property_value
+
+RANGE_OPERATORS = ("=", "<", "<=", ">", ">=", "IN")
+
+
+def indexed_property_name(path: str) -> str:
+    """Top-level Neo4j property mirroring an indexed path, e.g. context.domain -> prop_context__domain"""
+    return "prop_" + path.replace(".", "__")
+
+
 class Neo4jConnection:
     def __init__(self):
         uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
         user = os.getenv("NEO4J_USER", "neo4j")
         password = os.getenv("NEO4J_PASSWORD", "password")
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Same declarations as the in-process indexes (CGTDB_PROPERTY_INDEXES)
+        self.index_specs = parse_index_specs(os.getenv("CGTDB_PROPERTY_INDEXES", ""))
+        if self.index_specs:
+            self.create_indexes()
+
+    def create_indexes(self):
+        """Create native indexes for the declared property paths and for validity.
+
+        properties and context are stored as JSON strings, which Neo4j cannot
+        index, so each indexed path is mirrored as a top-level property. Range
+        indexes serve both hash (equality) and sorted (range) declarations.
+        Nodes created before a path was declared are backfilled with its
+        mirrored property, as the in-process indexes are when declared.
+        Declarations without a label ("*") are skipped: Neo4j indexes need one.
+        """
+        with self.driver.session() as session:
+            for label in {label for label, _, _ in self.index_specs if label}:
+                session.run(
+                    "CREATE INDEX `{label}_validity` IF NOT EXISTS "
+                    "FOR (n:`{label}`) ON (n.valid_from, n.valid_to)".format(label=label)
+                )
+            for label, path, _ in self.index_specs:
+                if label is None:
+                    continue
+                prop = indexed_property_name(path)
+                session.run(
+                    "CREATE INDEX `{label}_{prop}` IF NOT EXISTS "
+                    "FOR (n:`{label}`) ON (n.`{prop}`)".format(label=label, prop=prop)
+                )
+                self._backfill(session, label, path)
+
+    def _backfill(self, session, label: str, path: str, batch_size: int = 1000):
+        """Mirror path on existing nodes of label that lack it, in batches ordered by node id"""
+        prop = indexed_property_name(path)
+        keys = tuple(path.split("."))
+        last = -1
+        while True:
+            rows = list(session.run(
+                "MATCH (n:`{label}`) WHERE id(n) > $last AND n.`{prop}` IS NULL "
+                "RETURN id(n) AS id, n.properties AS properties, n.context AS context "
+                "ORDER BY id(n) LIMIT $limit".format(label=label, prop=prop),
+                last=last,
+                limit=batch_size
+            ))
+            if not rows:
+                return
+            last = rows[-1]["id"]
+            updates = []
+            for row in rows:
+                value = property_value(json.loads(row["properties"] or "{}"),
+                                       json.loads(row["context"] or "{}"), keys)
+                if index_key(value) is not None:
+                    updates.append({"id": row["id"], "value": value})
+            if updates:
+                session.run(
+                    "UNWIND $updates AS u MATCH (n) WHERE id(n) = u.id "
+                    "SET n.`{prop}` = u.value".format(prop=prop),
+                    updates=updates
+                )
+
+    def _indexed_properties(self, label: str, properties: dict, context: dict) -> dict:
+        indexed = {}
+        for spec_label, path, _ in self.index_specs:
+            if spec_label not in (None, label):
+                continue
+            value = property_value(properties, context, tuple(path.split(".")))
+            if index_key(value) is not None:
+                indexed[indexed_property_name(path)] = value
+        return indexed
 
     def close(self):
         self.driver.close()
@@ -29,6 +108,7 @@ class Neo4jConnection:
                 valid_to: datetime($valid_to),
                 context: $context
             })
+            SET n += $indexed
             RETURN id(n) as node_id
             """.format(label=label)
             
@@ -37,7 +117,8 @@ class Neo4jConnection:
                 properties=json.dumps(properties),
                 valid_from=valid_from_str,
                 valid_to=valid_to_str,
-                context=json.dumps(context)
+                context=json.dumps(context),
+                indexed=self._indexed_properties(label, properties, context)
             )
             return result.single()["node_id"]
 
@@ -104,4 +185,28 @@ class Neo4jConnection:
                 context_filter=f'"{context_key}": "{context_value}"',
                 timestamp=timestamp.isoformat() if timestamp else datetime.now().isoformat()
             )
-            return [record["n"] for record in result] 
\ No newline at end of file
+            return [record["n"] for record in result]
+
+    def find_nodes(self, label: str, path: str, op: str, value, timestamp: Optional[datetime] = None):
+        """Nodes of label whose indexed path compares with value, optionally valid at timestamp.
+
+        Both conditions are served by native indexes when path is declared
+        in CGTDB_PROPERTY_INDEXES for label.
+        """
+        if op not in RANGE_OPERATORS:
+            raise ValueError(f"op must be one of {RANGE_OPERATORS}")
+        query = "MATCH (n:`{label}`) WHERE n.`{prop}` {op} $value".format(
+            label=label, prop=indexed_property_name(path), op=op
+        )
+        if timestamp:
+            query += """
+            AND n.valid_from <= datetime($timestamp)
+            AND (n.valid_to IS NULL OR n.valid_to > datetime($timestamp))"""
+        query += " RETURN n"
+        with self.driver.session() as session:
+            result = session.run(
+                query,
+                value=value,
+                timestamp=timestamp.isoformat() if timestamp else None
+            )
+            return [record["n"] for record in result]
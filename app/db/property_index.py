@@ -0,0 +1,395 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+import threading
+
+from app.db.mock_db import MockNode
+from app.utils.timestamps import to_epoch_us
+from app.utils.memory import estimate_size
+
+INDEX_KINDS = ("hash", "sorted")
+
+# Open-ended validity, in microseconds since the epoch
+_FOREVER = 2 ** 63 - 1
+
+# Values of different kinds never compare equal or ordered with each other
+_RANKS = ((bool, 0), ((int, float), 1), (str, 2), (datetime, 3))
+
+# Entries per chunk of a sorted index; chunks split at twice this
+_CHUNK_SIZE = 512
+
+
+def index_key(value: Any) -> Optional[Tuple[int, Any]]:
+    """Comparable key of an indexable scalar, or None for values that are not indexed"""
+    for types, rank in _RANKS:
+        if isinstance(value, types):
+            if rank == 3:
+                return rank, to_epoch_us(value)[0]
+            if rank == 1 and value != value:
+                return None  # NaN matches nothing
+            return rank, value
+    return None
+
+
+def property_value(properties: Dict[str, Any], context: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    """Value at a property path: ("budget",) is a property, ("context", "domain") a context key"""
+    if path[0] == "context":
+        value, rest = context, path[1:]
+    else:
+        value, rest = properties.get(path[0]), path[1:]
+    for key in rest:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def parse_index_specs(text: str) -> List[Tuple[Optional[str], str, str]]:
+    """Parse "Project.deadline=sorted,Project.status=hash,*.context.domain=hash" into (label, path, kind)"""
+    specs = []
+    for spec in filter(None, (part.strip() for part in text.split(","))):
+        target, _, kind = spec.partition("=")
+        label, _, path = target.partition(".")
+        kind = kind or "hash"
+        if not path or kind not in INDEX_KINDS:
+            raise ValueError(f"Invalid index spec {spec!r}; expected Label.path=hash|sorted")
+        specs.append((None if label == "*" else label, path, kind))
+    return specs
+
+
+class PropertyIndex(ABC):
+    """Secondary index over one property path of the nodes with one label (or all nodes).
+
+    Each entry keeps the node's validity interval so that lookups can apply
+    an as-of filter without fetching the nodes.
+    """
+
+    def __init__(self, label: Optional[str], path: str, kind: str):
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"kind must be one of {INDEX_KINDS}")
+        self.label = label
+        self.path = path
+        self.keys = tuple(path.split("."))
+        self.kind = kind
+        self.ready = False
+        self._members: Dict[str, Tuple[int, Any]] = {}
+        # Lookups copy what they need under the lock, then filter outside it
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.label or '*'}.{self.path}"
+
+    def covers(self, label: Optional[str]) -> bool:
+        return self.label is None or self.label == label
+
+    def add(self, node: MockNode):
+        key = index_key(property_value(node.properties, node.context, self.keys))
+        if key is None:
+            return
+        valid_from = to_epoch_us(node.valid_from)[0]
+        valid_to = to_epoch_us(node.valid_to)[0]
+        entry = (node.id, valid_from, _FOREVER if valid_to is None else valid_to)
+        with self._lock:
+            if node.id in self._members:
+                return
+            self._members[node.id] = key
+            self._insert(key, entry)
+
+    def remove(self, node_id: str):
+        self.remove_many([node_id])
+
+    def remove_many(self, node_ids: List[str]):
+        with self._lock:
+            removed = []
+            for node_id in node_ids:
+                key = self._members.pop(node_id, None)
+                if key is not None:
+                    removed.append((key, node_id))
+            if removed:
+                self._delete_many(removed)
+
+    @abstractmethod
+    def _insert(self, key: Tuple[int, Any], entry: Tuple[str, int, int]):
+        ...
+
+    @abstractmethod
+    def _delete(self, key: Tuple[int, Any], node_id: str):
+        ...
+
+    def _delete_many(self, removed: List[Tuple[Tuple[int, Any], str]]):
+        for key, node_id in removed:
+            self._delete(key, node_id)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    @staticmethod
+    def _valid(entries: Iterator[Tuple[str, int, int]], timestamp: Optional[datetime]) -> Iterator[str]:
+        if timestamp is None:
+            for node_id, _, _ in entries:
+                yield node_id
+            return
+        ts = to_epoch_us(timestamp)[0]
+        for node_id, valid_from, valid_to in entries:
+            if valid_from <= ts < valid_to:
+                yield node_id
+
+    @abstractmethod
+    def count_equal(self, values: List[Any]) -> int:
+        ...
+
+    @abstractmethod
+    def equal(self, values: List[Any], timestamp: Optional[datetime] = None) -> Iterator[str]:
+        """Ids of nodes whose value equals one of values (and valid at timestamp, if given)"""
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "label": self.label, "path": self.path, "kind": self.kind,
+                "entries": len(self), "ready": self.ready}
+
+
+class HashIndex(PropertyIndex):
+    """Equality lookups in O(1) per value"""
+
+    def __init__(self, label: Optional[str], path: str):
+        super().__init__(label, path, "hash")
+        self._buckets: Dict[Tuple[int, Any], Dict[str, Tuple[str, int, int]]] = {}
+
+    def _insert(self, key, entry):
+        self._buckets.setdefault(key, {})[entry[0]] = entry
+
+    def _delete(self, key, node_id):
+        bucket = self._buckets.get(key, {})
+        bucket.pop(node_id, None)
+        if not bucket:
+            self._buckets.pop(key, None)
+
+    def count_equal(self, values):
+        return sum(len(self._buckets.get(index_key(value), ())) for value in values)
+
+    def equal(self, values, timestamp=None):
+        for value in values:
+            key = index_key(value)
+            if key is None:
+                continue
+            with self._lock:
+                entries = list(self._buckets.get(key, {}).values())
+            yield from self._valid(iter(entries), timestamp)
+
+
+class SortedIndex(PropertyIndex):
+    """Range lookups by binary search over entries kept in key order.
+
+    Entries are held in chunks of at most ``2 * _CHUNK_SIZE``, each sorted
+    and together in order, with the largest key of each chunk alongside. An
+    insert is a binary search plus a list insert into one chunk, rather than
+    into a list of every entry.
+    """
+
+    def __init__(self, label: Optional[str], path: str):
+        super().__init__(label, path, "sorted")
+        self._keys: List[List[Tuple[int, Any]]] = []
+        self._entries: List[List[Tuple[str, int, int]]] = []
+        self._maxes: List[Tuple[int, Any]] = []
+
+    def _insert(self, key, entry):
+        if not self._maxes:
+            self._keys.append([key])
+            self._entries.append([entry])
+            self._maxes.append(key)
+            return
+        c = min(bisect_right(self._maxes, key), len(self._maxes) - 1)
+        keys, entries = self._keys[c], self._entries[c]
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        entries.insert(i, entry)
+        self._maxes[c] = keys[-1]
+        if len(keys) > 2 * _CHUNK_SIZE:
+            self._keys[c:c + 1] = [keys[:_CHUNK_SIZE], keys[_CHUNK_SIZE:]]
+            self._entries[c:c + 1] = [entries[:_CHUNK_SIZE], entries[_CHUNK_SIZE:]]
+            self._maxes[c:c + 1] = [keys[_CHUNK_SIZE - 1], keys[-1]]
+
+    def _delete(self, key, node_id):
+        # Equal keys may continue into the following chunks
+        for c in range(bisect_left(self._maxes, key), len(self._maxes)):
+            keys, entries = self._keys[c], self._entries[c]
+            lo, hi = bisect_left(keys, key), bisect_right(keys, key)
+            for i in range(lo, hi):
+                if entries[i][0] == node_id:
+                    del keys[i]
+                    del entries[i]
+                    if keys:
+                        self._maxes[c] = keys[-1]
+                    else:
+                        del self._keys[c], self._entries[c], self._maxes[c]
+                    return
+            if hi < len(keys):
+                return
+
+    def _delete_many(self, removed):
+        if len(removed) == 1:
+            self._delete(*removed[0])
+            return
+        # One pass over the chunks instead of a deletion per entry
+        node_ids = {node_id for _, node_id in removed}
+        kept = [(key, entry) for keys, entries in zip(self._keys, self._entries)
+                for key, entry in zip(keys, entries) if entry[0] not in node_ids]
+        self._keys = [[key for key, _ in kept[i:i + _CHUNK_SIZE]] for i in range(0, len(kept), _CHUNK_SIZE)]
+        self._entries = [[entry for _, entry in kept[i:i + _CHUNK_SIZE]]
+                         for i in range(0, len(kept), _CHUNK_SIZE)]
+        self._maxes = [keys[-1] for keys in self._keys]
+
+    def _position(self, key: Tuple, right: bool) -> Tuple[int, int]:
+        """(chunk, offset) at which bisect_left (or bisect_right) would put key in the whole index"""
+        bisect = bisect_right if right else bisect_left
+        c = bisect(self._maxes, key)
+        if c == len(self._maxes):
+            return c, 0
+        return c, bisect(self._keys[c], key)
+
+    def _bounds(self, low: Any, low_inclusive: bool, high: Any,
+                high_inclusive: bool) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        low_key, high_key = index_key(low), index_key(high)
+        if low_key is None and high_key is None:
+            return (0, 0), (0, 0)
+        # A range is confined to one kind of value, that of its bounds
+        rank = (low_key or high_key)[0]
+        if low_key is None:
+            start = self._position((rank,), right=False)
+        else:
+            start = self._position(low_key, right=not low_inclusive)
+        if high_key is None:
+            end = self._position((rank + 1,), right=False)
+        else:
+            end = self._position(high_key, right=high_inclusive)
+        return start, max(start, end)
+
+    def _slice(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[str, int, int]]:
+        (c1, i1), (c2, i2) = start, end
+        if c1 == c2:
+            return self._entries[c1][i1:i2] if c1 < len(self._entries) else []
+        entries = self._entries[c1][i1:]
+        for c in range(c1 + 1, c2):
+            entries.extend(self._entries[c])
+        if c2 < len(self._entries):
+            entries.extend(self._entries[c2][:i2])
+        return entries
+
+    def _count(self, start: Tuple[int, int], end: Tuple[int, int]) -> int:
+        (c1, i1), (c2, i2) = start, end
+        if c1 == c2:
+            return i2 - i1
+        return sum(len(keys) for keys in self._keys[c1:c2]) - i1 + i2
+
+    def count_equal(self, values):
+        return sum(self.count_range(value, True, value, True) for value in values)
+
+    def equal(self, values, timestamp=None):
+        for value in values:
+            yield from self.range(value, True, value, True, timestamp=timestamp)
+
+    def count_range(self, low: Any = None, low_inclusive: bool = True, high: Any = None,
+                    high_inclusive: bool = True) -> int:
+        with self._lock:
+            return self._count(*self._bounds(low, low_inclusive, high, high_inclusive))
+
+    def range(self, low: Any = None, low_inclusive: bool = True, high: Any = None,
+              high_inclusive: bool = True, timestamp: Optional[datetime] = None) -> Iterator[str]:
+        """Ids of nodes with low <(=) value <(=) high, in value order; a None bound is open"""
+        with self._lock:
+            entries = self._slice(*self._bounds(low, low_inclusive, high, high_inclusive))
+        yield from self._valid(iter(entries), timestamp)
+
+
+class PropertyIndexes:
+    """The declared secondary indexes of a graph store, maintained on every node write.
+
+    Indexes are registered before they are backfilled and adds are
+    idempotent, so writes racing with a backfill are never lost; the planner
+    only uses an index once it is ready. Indexes declared with
+    ``backfill=False`` are filled by ``backfill`` (a warm-up step) or, at the
+    latest, by the first lookup that needs them.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.indexes: Dict[Tuple[Optional[str], str], PropertyIndex] = {}
+        self._lock = threading.Lock()
+        self._backfill_lock = threading.Lock()
+        store.add_listener(self._on_write)
+
+    def _on_write(self, kind: str, data: Dict):
+        if kind == "archived":
+            self.remove_nodes(data["node_ids"])
+            return
+        if kind != "node":
+            return
+        node = MockNode(data["id"], [data["label"]], data["properties"], data["valid_from"],
+                        data["valid_to"], data["context"])
+        for index in list(self.indexes.values()):
+            if index.covers(data["label"]):
+                index.add(node)
+
+    def create(self, label: Optional[str], path: str, kind: str = "hash",
+               backfill: bool = True) -> PropertyIndex:
+        """Declare an index and backfill it from the store; re-declaring an existing one is a no-op"""
+        keys = path.split(".")
+        if keys[0] in ("id", "label", "valid_from", "valid_to") or keys == ["context"] or "" in keys:
+            raise ValueError(f"Cannot index {path!r}; index a property or a context key (context.<key>)")
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"kind must be one of {INDEX_KINDS}")
+        with self._lock:
+            existing = self.indexes.get((label, path))
+            if existing is not None:
+                if existing.kind != kind:
+                    raise ValueError(f"{existing.name} is already a {existing.kind} index")
+                return existing
+            index = HashIndex(label, path) if kind == "hash" else SortedIndex(label, path)
+            self.indexes[(label, path)] = index
+        if backfill:
+            self._backfill(index)
+        return index
+
+    def _backfill(self, index: PropertyIndex):
+        with self._backfill_lock:
+            if index.ready:
+                return
+            nodes = self.store.nodes_by_label(index.label) if index.label is not None else self.store.iter_nodes()
+            for node in nodes:
+                index.add(node)
+            index.ready = True
+
+    def backfill(self):
+        """Fill every index that is not ready yet"""
+        for index in list(self.indexes.values()):
+            self._backfill(index)
+
+    def drop(self, label: Optional[str], path: str) -> bool:
+        with self._lock:
+            return self.indexes.pop((label, path), None) is not None
+
+    def find(self, label: Optional[str], path: Tuple[str, ...], kinds=INDEX_KINDS) -> Optional[PropertyIndex]:
+        """A usable index for nodes with label on path, preferring a label-specific one.
+
+        Declared indexes that were not backfilled yet are filled first.
+        """
+        dotted = ".".join(path)
+        for key in ((label, dotted), (None, dotted)):
+            index = self.indexes.get(key)
+            if index is not None and index.kind in kinds:
+                self._backfill(index)
+                return index
+        return None
+
+    def remove_node(self, node_id: str):
+        self.remove_nodes([node_id])
+
+    def remove_nodes(self, node_ids: List[str]):
+        for index in list(self.indexes.values()):
+            index.remove_many(node_ids)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [index.describe() for index in self.indexes.values()]
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Estimated size of each index, by name"""
+        return {index.name: estimate_size(index, sample=sample) for index in list(self.indexes.values())}
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Awaitable, Callable, Hashable, Tuple
+import json
+import threading
+import time
+
+from app.utils.profiling import cache_lookup
+from app.utils.timestamps import to_epoch_us
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a search query: lower-cased with collapsed whitespace"""
+    return " ".join(text.lower().split())
+
+
+class _Entry:
+    __slots__ = ("value", "generation", "expires_at", "size")
+
+    def __init__(self, value: Any, generation: Optional[int], expires_at: Optional[float], size: int):
+        self.value = value
+        self.generation = generation
+        self.expires_at = expires_at
+        self.size = size
+
+
+class QueryCache:
+    """LRU cache of read results with TTL and write-generation invalidation.
+
+    Each entry remembers the write generation current when its computation
+    started; any write advances the generation, which makes older entries
+    stale. Entries stored with ``pinned=True`` (results that no write can
+    change, such as historical as-of reads) ignore both the generation and
+    the TTL and only leave the cache through LRU eviction. Memory is bounded
+    by entry count and by an estimate of the serialized result size.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def advance(self, *_):
+        """Invalidate every non-pinned entry; usable directly as a store listener"""
+        with self._lock:
+            self.generation += 1
+
+    def _evict(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fresh = entry.generation is None or (
+                    entry.generation == self.generation
+                    and (entry.expires_at is None or entry.expires_at > time.monotonic())
+                )
+                if fresh:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cache_lookup(True)
+                    return True, entry.value
+                self._evict(key)
+            self.misses += 1
+            cache_lookup(False)
+            return False, None
+
+    def put(self, key: Hashable, value: Any, generation: int, pinned: bool = False,
+            ttl: Optional[float] = None):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if not pinned and generation != self.generation:
+                # A write landed while the value was being computed
+                return
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = _Entry(
+                value,
+                None if pinned else generation,
+                None if pinned else time.monotonic() + ttl,
+                size
+            )
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], pinned: bool = False,
+                       ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, computing and caching it on a miss.
+
+        None results are not cached.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation
+        value = compute()
+        if value is not None:
+            self.put(key, value, generation, pinned=pinned, ttl=ttl)
+        return value
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                                   pinned: bool = False, ttl: Optional[float] = None) -> Any:
+        """Like get_or_compute, for a computation that must be awaited (e.g. offloaded to an executor)"""
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation
+        value = await compute()
+        if value is not None:
+            self.put(key, value, generation, pinned=pinned, ttl=ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Serialized size of the cached results, the measure max_bytes bounds"""
+        return {"results": self._bytes}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def is_historical(timestamp: Optional[datetime]) -> bool:
+    """True if timestamp lies in the past, so as-of reads at it can no longer change.
+
+    Naive timestamps are taken as UTC, as everywhere in the store.
+    """
+    if timestamp is None:
+        return False
+    return to_epoch_us(timestamp)[0] < to_epoch_us(datetime.now(timezone.utc))[0]
@@ -0,0 +1,367 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Tuple
+import base64
+import fcntl
+import json
+import mmap
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from app.db.change_feed import _json_default
+from app.db.context_refs import ContextRefs, canonicalize_context, context_id_for
+
+
+def _encode_vector(embedding: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(embedding, dtype=np.float32).tobytes()).decode()
+
+
+def _decode_vector(value: Optional[str]) -> Optional[np.ndarray]:
+    if value is None:
+        return None
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32).reshape(1, -1)
+
+
+def _compact_records(lines) -> List[bytes]:
+    """Records that rebuild the state the given log lines build, without superseded context records.
+
+    Node and relationship versions are history and all kept; contexts that
+    were deleted or lost their last reference are dropped.
+    """
+    kept: List[bytes] = []
+    refs = ContextRefs()
+    # Stored contexts by id: (record that stored it, whether an attachment stored it)
+    stored: Dict[str, Tuple[Dict[str, Any], bool]] = {}
+    attached: Dict[str, Dict[str, Any]] = {}
+    for line in lines:
+        record = json.loads(line)
+        kind = record["kind"]
+        if kind in ("node", "relationship"):
+            kept.append(line)
+        elif kind == "context":
+            stored[record["id"]] = (record, False)
+        elif kind == "context_deleted":
+            stored.pop(record["id"], None)
+        elif kind == "context_attached":
+            context_id = context_id_for(canonicalize_context(record["context"]))
+            first, orphaned = refs.attach(record["node_id"], context_id)
+            if first:
+                stored[context_id] = (record, True)
+            if orphaned:
+                stored.pop(orphaned, None)
+            attached[record["node_id"]] = record
+        elif kind == "context_detached":
+            attached.pop(record["node_id"], None)
+            orphaned = refs.detach(record["node_id"])
+            if orphaned:
+                stored.pop(orphaned, None)
+    records: List[Dict[str, Any]] = []
+    first_attached = set()
+    for node_id, context_id in refs.node_context.items():
+        record = {key: value for key, value in attached[node_id].items() if key != "vector"}
+        # On replay the first attachment of a context stores it, so it carries the vector
+        if context_id not in first_attached:
+            first_attached.add(context_id)
+            source = stored.get(context_id)
+            if source is not None and source[1] and "vector" in source[0]:
+                record["vector"] = source[0]["vector"]
+        records.append(record)
+    # Contexts deleted while still referenced, and ones stored directly (possibly over an attached one)
+    records.extend({"kind": "context_deleted", "id": context_id}
+                   for context_id in first_attached if context_id not in stored)
+    records.extend(record for record, by_attachment in stored.values() if not by_attachment)
+    return kept + [json.dumps(record).encode() for record in records]
+
+
+class SharedLog:
+    """Append-only log of JSON records in a file shared by all worker processes.
+
+    Appends are serialized across processes with an exclusive ``flock``;
+    readers map the file and decode only the bytes past their own offset.
+    Putting the file on tmpfs (e.g. ``/dev/shm``) keeps it in shared memory.
+
+    Every live process holds a shared lock on ``<path>.members``. The first
+    process to open the log while no other is alive compacts it into a
+    checkpoint of the current state (see ``_compact_records``), so neither
+    the file nor the replay at start-up grows with deleted or detached
+    contexts. The log starts with a header naming its ``epoch``, which
+    changes with every compaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._members = os.open(path + ".members", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = self._open_locked()
+        try:
+            try:
+                fcntl.flock(self._members, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                alone = True
+            except BlockingIOError:
+                alone = False
+            if alone:
+                self._compact()
+            # Converted while holding the write lock, which any other process needs before it can
+            # try for the exclusive lock, so no two processes ever both think they are alone
+            fcntl.flock(self._members, fcntl.LOCK_SH)
+            self.epoch = self._read_epoch()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _open_locked(self) -> int:
+        """Open the log and take its write lock, following a compaction that replaced the file meanwhile"""
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            opened, current = os.fstat(fd), os.stat(self.path)
+            if (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino):
+                return fd
+            os.close(fd)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        os.close(self._fd)
+        os.close(self._members)
+
+    def _lines(self, end: int):
+        if end == 0:
+            return
+        with mmap.mmap(self._fd, end, access=mmap.ACCESS_READ) as data:
+            for line in iter(data.readline, b""):
+                if line.strip():
+                    yield line.rstrip(b"\n")
+
+    def _compact(self):
+        """Rewrite the log as a checkpoint; the caller must hold ``locked()`` and be the only process"""
+        lines = self._lines(self.size())
+        # A header is always rewritten, so the epoch changes with the sequence of records
+        records = _compact_records(line for line in lines if json.loads(line)["kind"] != "log")
+        header = json.dumps({"kind": "log", "epoch": uuid.uuid4().hex[:16]}).encode()
+        temporary = self.path + ".compact"
+        fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        # Locked before it becomes visible; processes still waiting on the old file notice the swap
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with open(fd, "wb", closefd=False) as out:
+            for line in [header, *records]:
+                out.write(line + b"\n")
+        os.fsync(fd)
+        os.replace(temporary, self.path)
+        os.close(self._fd)
+        self._fd = fd
+
+    def _read_epoch(self) -> str:
+        first = next(self._lines(self.size()), None)
+        if first is not None and json.loads(first)["kind"] == "log":
+            return json.loads(first)["epoch"]
+        # Written before logs had headers: the file identity is the same in every process
+        stat = os.fstat(self._fd)
+        return f"{stat.st_dev:x}{stat.st_ino:x}"
+
+    def size(self) -> int:
+        return os.fstat(self._fd).st_size
+
+    @contextmanager
+    def locked(self):
+        """Hold the cross-process write lock"""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def encode(record: Dict[str, Any]) -> bytes:
+        return json.dumps(record, default=_json_default).encode() + b"\n"
+
+    def append(self, line: bytes) -> int:
+        """Append an encoded record; the caller must hold ``locked()``. Returns the new end offset"""
+        os.write(self._fd, line)
+        return self.size()
+
+    def read_from(self, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Complete records after offset, and the offset just past the last one"""
+        size = self.size()
+        if size <= offset:
+            return [], offset
+        if self._map is None or len(self._map) < size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        end = self._map.rfind(b"\n", offset, size) + 1
+        if end <= offset:
+            # Only a partially written record so far
+            return [], offset
+        records = [json.loads(line) for line in self._map[offset:end].splitlines() if line]
+        return records, end
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class LogReplicator:
+    """Keeps a process-local graph and vector store in step with a SharedLog.
+
+    Every write goes through the log under the cross-process lock: the
+    writer first applies records other workers appended, then applies its
+    own and appends it, so a write the local store rejects never reaches
+    the log. All workers therefore apply the same records in the
+    same order, and store listeners (change feed, caches) fire identically
+    in each of them. Reads only need to apply whatever was appended since
+    the worker's last sync, which is a single ``fstat`` when nothing changed.
+    """
+
+    def __init__(self, log: SharedLog, graph, vectors):
+        self.log = log
+        self.graph = graph
+        self.vectors = vectors
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def _apply(self, record: Dict[str, Any]):
+        kind = record["kind"]
+        if kind == "node":
+            self.graph.create_node(
+                label=record["label"],
+                properties=record["properties"],
+                valid_from=_parse_datetime(record["valid_from"]),
+                valid_to=_parse_datetime(record["valid_to"]),
+                context=record["context"],
+                node_id=record["id"]
+            )
+        elif kind == "relationship":
+            self.graph.create_relationship(
+                source_id=record["source_id"],
+                target_id=record["target_id"],
+                rel_type=record["type"],
+                properties=record["properties"],
+                valid_from=_parse_datetime(record["valid_from"]),
+                valid_to=_parse_datetime(record["valid_to"]),
+                context=record["context"]
+            )
+        elif kind == "context":
+            self.vectors.store_context(record["id"], record["text"], record["metadata"],
+                                       _decode_vector(record.get("vector")))
+        elif kind == "context_deleted":
+            self.vectors.delete_context(record["id"])
+        elif kind == "context_attached":
+            self.vectors.attach_context(record["node_id"], record["context"],
+                                        _decode_vector(record.get("vector")))
+        elif kind == "context_detached":
+            self.vectors.detach_context(record["node_id"])
+
+    def _catch_up(self):
+        records, self.offset = self.log.read_from(self.offset)
+        for record in records:
+            self._apply(record)
+
+    def sync(self):
+        """Apply records appended by other workers since the last sync"""
+        if self.log.size() == self.offset:
+            return
+        with self._lock:
+            self._catch_up()
+
+    def write(self, record: Dict[str, Any]):
+        line = self.log.encode(record)
+        with self._lock, self.log.locked():
+            self._catch_up()
+            self._apply(record)
+            self.offset = self.log.append(line)
+
+
+class _ReplicatedProxy:
+    """Delegates to a local store, syncing from the log before every access"""
+
+    def __init__(self, target, replicator: LogReplicator):
+        self._target = target
+        self._replicator = replicator
+
+    def __getattr__(self, name):
+        self._replicator.sync()
+        return getattr(self._target, name)
+
+    def add_listener(self, listener):
+        # Registered before the first sync so that replayed history reaches the listener too
+        self._target.add_listener(listener)
+
+    @property
+    def epoch(self) -> str:
+        """Epoch of the shared log, the same in every worker"""
+        return self._replicator.log.epoch
+
+
+class ReplicatedGraph(_ReplicatedProxy):
+    # Writes go through the shared log first, so a local rollback could not undo them
+    transaction = None
+
+    def create_node(self, label: str, properties: dict, valid_from: datetime,
+                    valid_to: Optional[datetime], context: dict, node_id: Optional[str] = None) -> str:
+        node_id = node_id or str(uuid.uuid4())
+        self._replicator.write({
+            "kind": "node",
+            "id": node_id,
+            "label": label,
+            "properties": properties,
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+            "context": context
+        })
+        return node_id
+
+    def create_relationship(self, source_id: str, target_id: str, rel_type: str,
+                            properties: dict, valid_from: datetime,
+                            valid_to: Optional[datetime], context: dict):
+        self._replicator.write({
+            "kind": "relationship",
+            "source_id": source_id,
+            "target_id": target_id,
+            "type": rel_type,
+            "properties": properties,
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+            "context": context
+        })
+
+
+class ReplicatedVectorStore(_ReplicatedProxy):
+    # Vectors are encoded once, by the writer, and logged, so replaying workers do not re-encode
+
+    def store_context(self, context_id: str, context_text: str, metadata: Dict[str, Any]):
+        embedding = self._target.encoder([context_text])
+        self._replicator.write({
+            "kind": "context",
+            "id": context_id,
+            "text": context_text,
+            "metadata": metadata,
+            "vector": _encode_vector(embedding)
+        })
+
+    def delete_context(self, context_id: str):
+        self._replicator.write({"kind": "context_deleted", "id": context_id})
+
+    def attach_context(self, node_id: str, context: Dict[str, Any]) -> str:
+        canonical = canonicalize_context(context)
+        context_id = context_id_for(canonical)
+        record = {"kind": "context_attached", "node_id": node_id, "context": context}
+        # Only a context no node shares yet gets stored; if another worker stores it first, replay
+        # just ignores the vector
+        if context_id not in self.contexts:
+            record["vector"] = _encode_vector(self._target.encoder([canonical]))
+        self._replicator.write(record)
+        return context_id
+
+    def detach_context(self, node_id: str):
+        self._replicator.write({"kind": "context_detached", "node_id": node_id})
+
+
+def replicate(log_path: str, graph, vectors) -> Tuple[ReplicatedGraph, ReplicatedVectorStore]:
+    """Wrap a local graph and vector store so that they share state through the log at log_path"""
+    replicator = LogReplicator(SharedLog(log_path), graph, vectors)
+    return ReplicatedGraph(graph, replicator), ReplicatedVectorStore(vectors, replicator)
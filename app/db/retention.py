@@ -0,0 +1,330 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Iterator, Set
+import gzip
+import json
+import os
+import threading
+import time
+
+from app.db.change_feed import _json_default
+from app.db.mock_db import MockNode
+from app.utils.timestamps import to_epoch_us
+
+_KINDS = ("nodes", "relationships")
+
+
+def partition_of(valid_to: datetime) -> str:
+    """Archive partition of a version: the UTC month its validity ended in"""
+    if valid_to.tzinfo is not None:
+        valid_to = valid_to.astimezone(timezone.utc)
+    return valid_to.strftime("%Y-%m")
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _valid_at(record: Dict[str, Any], ts: Optional[int]) -> bool:
+    if ts is None:
+        return True
+    valid_to = to_epoch_us(record["valid_to"])[0]
+    return to_epoch_us(record["valid_from"])[0] <= ts and (valid_to is None or valid_to > ts)
+
+
+def _rel_key(rel: Dict[str, Any]) -> str:
+    return json.dumps([rel["source_id"], rel["target_id"], rel["type"],
+                       to_epoch_us(rel["valid_from"])[0], to_epoch_us(rel["valid_to"])[0]])
+
+
+def _node_from_record(record: Dict[str, Any]) -> MockNode:
+    return MockNode(
+        id=record["id"],
+        labels=[record["label"]],
+        properties=record["properties"],
+        valid_from=record["valid_from"],
+        valid_to=record["valid_to"],
+        context=record["context"]
+    )
+
+
+class ColdArchive:
+    """Compressed, time-partitioned archive of expired node and relationship versions.
+
+    Versions are appended as JSON lines to ``nodes/YYYY-MM.jsonl.gz`` and
+    ``relationships/YYYY-MM.jsonl.gz`` by the month their validity ended, one
+    gzip member per write. A plain-text ``.ids`` file next to each partition
+    lists its node ids (relationship endpoints), so lookups decompress only
+    the partitions that can match; as-of scans skip partitions that ended
+    before the timestamp.
+
+    Relationships have no id, so the keys of those written since the last
+    ``committed`` are kept in ``pending.jsonl``; a write repeating them
+    (after a run that failed before removing them from the store) skips them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        for kind in _KINDS:
+            os.makedirs(os.path.join(path, kind), exist_ok=True)
+        # node id -> partition holding the node; endpoint id -> partitions holding its relationships
+        self._node_partitions: Dict[str, str] = {}
+        self._rel_partitions: Dict[str, Set[str]] = {}
+        self.relationship_count = 0
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._load_ids()
+
+    def _file(self, kind: str, partition: str, suffix: str = ".jsonl.gz") -> str:
+        return os.path.join(self.path, kind, partition + suffix)
+
+    def partitions(self, kind: str) -> List[str]:
+        names = os.listdir(os.path.join(self.path, kind))
+        return sorted(name[:-len(".jsonl.gz")] for name in names if name.endswith(".jsonl.gz"))
+
+    def _load_ids(self):
+        for kind in _KINDS:
+            for partition in self.partitions(kind):
+                path = self._file(kind, partition, ".ids")
+                if not os.path.exists(path):
+                    continue
+                with open(path) as f:
+                    for line in f:
+                        line = line.rstrip("\n")
+                        if kind == "nodes":
+                            self._node_partitions[line] = partition
+                        else:
+                            self._index_relationship(line.split("\t"), partition)
+        pending = os.path.join(self.path, "pending.jsonl")
+        if os.path.exists(pending):
+            with open(pending) as f:
+                self._pending.update(line.rstrip("\n") for line in f)
+
+    def _index_relationship(self, endpoints: List[str], partition: str):
+        for node_id in endpoints:
+            self._rel_partitions.setdefault(node_id, set()).add(partition)
+        self.relationship_count += 1
+
+    @staticmethod
+    def _sync_append(path: str, write):
+        with open(path, "ab") as raw:
+            write(raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def _append(self, kind: str, partition: str, records: List[Dict[str, Any]], ids: List[str]):
+        def write_records(raw):
+            with gzip.GzipFile(fileobj=raw, mode="ab") as out:
+                for record in records:
+                    out.write(json.dumps(record, default=_json_default).encode() + b"\n")
+        # Records are synced before their ids, so a listed id always refers to a durable record
+        self._sync_append(self._file(kind, partition), write_records)
+        self._sync_append(self._file(kind, partition, ".ids"),
+                          lambda raw: raw.write("".join(line + "\n" for line in ids).encode()))
+
+    def write(self, nodes: List[MockNode], relationships: List[Dict[str, Any]]):
+        """Durably append versions; versions already archived by an interrupted run are skipped"""
+        with self._lock:
+            node_groups: Dict[str, List[MockNode]] = {}
+            for node in nodes:
+                if node.id not in self._node_partitions:
+                    node_groups.setdefault(partition_of(node.valid_to), []).append(node)
+            for partition, group in node_groups.items():
+                records = [{
+                    "id": node.id,
+                    "label": node.labels[0],
+                    "properties": node.properties,
+                    "valid_from": node.valid_from,
+                    "valid_to": node.valid_to,
+                    "context": node.context
+                } for node in group]
+                self._append("nodes", partition, records, [node.id for node in group])
+                for node in group:
+                    self._node_partitions[node.id] = partition
+            rel_groups: Dict[str, List[Dict[str, Any]]] = {}
+            written = self._pending.copy()
+            keys = []
+            for rel in relationships:
+                key = _rel_key(rel)
+                if written[key] > 0:
+                    written[key] -= 1
+                    continue
+                keys.append(key)
+                rel_groups.setdefault(partition_of(rel["valid_to"]), []).append(rel)
+            for partition, group in rel_groups.items():
+                endpoints = [(rel["source_id"], rel["target_id"]) for rel in group]
+                self._append("relationships", partition, group, ["\t".join(pair) for pair in endpoints])
+                for pair in endpoints:
+                    self._index_relationship(list(pair), partition)
+            if keys:
+                # After the records: a crash in between repeats them rather than losing them
+                self._sync_append(os.path.join(self.path, "pending.jsonl"),
+                                  lambda raw: raw.write("".join(key + "\n" for key in keys).encode()))
+                self._pending.update(keys)
+
+    def committed(self):
+        """The versions written so far are gone from the store, so they cannot be written again"""
+        with self._lock:
+            if self._pending:
+                os.remove(os.path.join(self.path, "pending.jsonl"))
+                self._pending.clear()
+
+    def _read(self, kind: str, partition: str) -> Iterator[Dict[str, Any]]:
+        with gzip.open(self._file(kind, partition), "rt") as f:
+            for line in f:
+                record = json.loads(line)
+                record["valid_from"] = _parse_datetime(record["valid_from"])
+                record["valid_to"] = _parse_datetime(record["valid_to"])
+                yield record
+
+    def get_node(self, node_id: str, timestamp: Optional[datetime] = None) -> Optional[MockNode]:
+        partition = self._node_partitions.get(node_id)
+        if partition is None:
+            return None
+        ts = to_epoch_us(timestamp)[0]
+        for record in self._read("nodes", partition):
+            if record["id"] == node_id:
+                return _node_from_record(record) if _valid_at(record, ts) else None
+        return None
+
+    def get_relationships(self, node_id: str, direction: str = "both",
+                          timestamp: Optional[datetime] = None) -> List[Dict]:
+        """Archived relationships incident to a node; direction is 'out', 'in' or 'both'"""
+        ends = {"out": ("source_id",), "in": ("target_id",), "both": ("source_id", "target_id")}[direction]
+        ts = to_epoch_us(timestamp)[0]
+        rels = []
+        for partition in sorted(self._rel_partitions.get(node_id, ())):
+            for record in self._read("relationships", partition):
+                if any(record[end] == node_id for end in ends) and _valid_at(record, ts):
+                    rels.append(record)
+        return rels
+
+    def nodes_valid_at(self, timestamp: datetime, label: Optional[str] = None) -> Iterator[MockNode]:
+        """Archived nodes whose validity interval contains timestamp"""
+        ts = to_epoch_us(timestamp)[0]
+        # A version valid at timestamp ended after it, so earlier partitions cannot match
+        first = partition_of(timestamp)
+        for partition in self.partitions("nodes"):
+            if partition < first:
+                continue
+            for record in self._read("nodes", partition):
+                if (label is None or record["label"] == label) and _valid_at(record, ts):
+                    yield _node_from_record(record)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = {
+            kind: sum(os.path.getsize(self._file(kind, p)) for p in self.partitions(kind))
+            for kind in _KINDS
+        }
+        return {
+            "path": self.path,
+            "nodes": len(self._node_partitions),
+            "relationships": self.relationship_count,
+            "partitions": {kind: self.partitions(kind) for kind in _KINDS},
+            "compressed_bytes": sizes
+        }
+
+
+class RetentionEngine:
+    """Moves versions whose validity ended more than ``retention`` ago into a ColdArchive.
+
+    A pass works in batches: select expired versions from the hot store,
+    append them to the archive, then remove them from the store, which emits
+    an ``archived`` event for the derived indexes. Batches are small and
+    separated by ``pause`` seconds so writers are never held up for long,
+    and each resumes the scan where the previous one stopped. Contexts of
+    archived nodes are detached, and after the pass the store and vector
+    index are compacted once. ``start`` repeats passes every ``interval``
+    seconds on a background thread.
+    """
+
+    def __init__(self, store, vectors, archive: ColdArchive, retention: timedelta,
+                 batch_size: int = 10_000, interval: float = 3600.0, pause: float = 0.05):
+        self.store = store
+        self.vectors = vectors
+        self.archive = archive
+        self.retention = retention
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.total_nodes = 0
+        self.total_relationships = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # One pass at a time: relationship keys are only stable until the next compact
+        self._run_lock = threading.Lock()
+
+    def cutoff(self) -> datetime:
+        """Versions that ended at or before this instant (naive UTC) are archived"""
+        return datetime.now(timezone.utc).replace(tzinfo=None) - self.retention
+
+    def run_once(self, cutoff: Optional[datetime] = None) -> Dict[str, Any]:
+        """Archive everything that expired by cutoff (default: now minus retention)"""
+        cutoff = cutoff or self.cutoff()
+        with self._run_lock:
+            started = time.perf_counter()
+            nodes_archived = rels_archived = batches = 0
+            cursor = None
+            while not self._stop.is_set():
+                nodes, rels, cursor = self.store.expired_versions(cutoff, self.batch_size, cursor)
+                if not nodes and not rels:
+                    break
+                self.archive.write(nodes, [rel for _, rel in rels])
+                self.store.remove_versions([node.id for node in nodes], rels)
+                self.archive.committed()
+                for node in nodes:
+                    self.vectors.detach_context(node.id)
+                nodes_archived += len(nodes)
+                rels_archived += len(rels)
+                batches += 1
+                if len(nodes) < self.batch_size and len(rels) < self.batch_size:
+                    break
+                time.sleep(self.pause)
+            # Also reclaims what an interrupted run removed but did not compact
+            self.store.compact()
+            self.vectors.compact()
+            self.total_nodes += nodes_archived
+            self.total_relationships += rels_archived
+            self.last_run = {
+                "cutoff": cutoff,
+                "finished_at": datetime.now(timezone.utc),
+                "nodes_archived": nodes_archived,
+                "relationships_archived": rels_archived,
+                "batches": batches,
+                "seconds": time.perf_counter() - started
+            }
+            return self.last_run
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.last_run = {"error": str(e), "finished_at": datetime.now(timezone.utc)}
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="cgtdb-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "retention_seconds": self.retention.total_seconds(),
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "running": self._thread is not None,
+            "cutoff": self.cutoff(),
+            "archived_nodes": self.total_nodes,
+            "archived_relationships": self.total_relationships,
+            "last_run": self.last_run,
+            "archive": self.archive.stats()
+        }
@@ -0,0 +1,345 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable, Iterator, Tuple
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from app.db.mock_db import MockNode
+from app.utils.timestamps import to_epoch_us, from_epoch_us
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    properties TEXT NOT NULL,
+    valid_from INTEGER NOT NULL,
+    valid_from_tz INTEGER,
+    valid_to INTEGER,
+    valid_to_tz INTEGER,
+    context TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_label ON nodes (label);
+CREATE INDEX IF NOT EXISTS nodes_validity ON nodes (valid_from, valid_to);
+CREATE INDEX IF NOT EXISTS nodes_expiry ON nodes (valid_to);
+
+CREATE TABLE IF NOT EXISTS relationships (
+    seq INTEGER PRIMARY KEY,
+    source_id TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    properties TEXT NOT NULL,
+    valid_from INTEGER NOT NULL,
+    valid_from_tz INTEGER,
+    valid_to INTEGER,
+    valid_to_tz INTEGER,
+    context TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS relationships_source ON relationships (source_id, type);
+CREATE INDEX IF NOT EXISTS relationships_target ON relationships (target_id, type);
+CREATE INDEX IF NOT EXISTS relationships_expiry ON relationships (valid_to);
+"""
+
+NODE_COLUMNS = "id, label, properties, valid_from, valid_from_tz, valid_to, valid_to_tz, context"
+REL_COLUMNS = ("source_id, target_id, type, properties, valid_from, valid_from_tz, "
+               "valid_to, valid_to_tz, context")
+
+# Rows where the validity interval [valid_from, valid_to) contains :ts
+VALID_AT = "valid_from <= :ts AND (valid_to IS NULL OR valid_to > :ts)"
+
+
+def _node_from_row(row) -> MockNode:
+    return MockNode(
+        id=row[0],
+        labels=[row[1]],
+        properties=json.loads(row[2]),
+        valid_from=from_epoch_us(row[3], row[4]),
+        valid_to=from_epoch_us(row[5], row[6]),
+        context=json.loads(row[7])
+    )
+
+
+def _rel_from_row(row) -> Dict[str, Any]:
+    return {
+        "source_id": row[0],
+        "target_id": row[1],
+        "type": row[2],
+        "properties": json.loads(row[3]),
+        "valid_from": from_epoch_us(row[4], row[5]),
+        "valid_to": from_epoch_us(row[6], row[7]),
+        "context": json.loads(row[8])
+    }
+
+
+class SQLiteGraph:
+    """Embedded on-disk graph store with the same interface as MockNeo4j.
+
+    Data lives in a SQLite database in WAL mode, so readers never block the
+    single writer and the graph can be far larger than RAM: only the page
+    cache (``cache_mb``) and memory-mapped region (``mmap_mb``) are resident.
+    Nodes are indexed by id, label and validity interval and relationships
+    by source and target, and scans stream rows instead of materializing them.
+    Each thread gets its own connection; writes are serialized in-process.
+
+    Caches, indexes and the change feed built on a store only learn of
+    writes through its listeners, so a database file is served by one
+    process at a time: opening it while another process has it open raises
+    RuntimeError.
+    """
+
+    def __init__(self, path: str, cache_mb: int = 256, mmap_mb: int = 1024):
+        self.path = path
+        self.cache_mb = cache_mb
+        self.mmap_mb = mmap_mb
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self.generation = 0
+        self.listeners: List[Callable[[str, Dict], None]] = []
+        # Events of writes inside transaction(), emitted once it commits
+        self._deferred: Optional[List[Tuple[str, Dict]]] = None
+        self._owner = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._owner)
+            raise RuntimeError(f"{path} is already open elsewhere; a SQLite store can only "
+                               f"be served by one process")
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA cache_size = {-self.cache_mb * 1024}")
+            conn.execute(f"PRAGMA mmap_size = {self.mmap_mb * 1024 * 1024}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        if self._owner is not None:
+            os.close(self._owner)
+            self._owner = None
+
+    @contextmanager
+    def transaction(self):
+        """Commit the writes made on this thread inside the block at once, for bulk loads.
+
+        Other writers wait until the block ends. Listeners see the block's
+        writes after it commits, and never if it rolls back.
+        """
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            self._deferred = []
+            try:
+                yield
+            except BaseException:
+                self._deferred = None
+                conn.execute("ROLLBACK")
+                raise
+            deferred, self._deferred = self._deferred, None
+            try:
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            # Readers may have cached the pre-commit rows under a generation the block already advanced
+            self.generation += 1
+            for kind, data in deferred:
+                self._emit(kind, data)
+
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """Register a callback invoked as listener(kind, data) after every write"""
+        self.listeners.append(listener)
+
+    def _emit(self, kind: str, data: Dict):
+        if self._deferred is not None:
+            self._deferred.append((kind, data))
+            return
+        for listener in self.listeners:
+            listener(kind, data)
+
+    def create_node(self, label: str, properties: dict, valid_from: datetime,
+                    valid_to: Optional[datetime], context: dict, node_id: Optional[str] = None) -> str:
+        node_id = node_id or str(uuid.uuid4())
+        with self._lock:
+            try:
+                self._conn().execute(
+                    f"INSERT INTO nodes ({NODE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (node_id, label, json.dumps(properties), *to_epoch_us(valid_from),
+                     *to_epoch_us(valid_to), json.dumps(context))
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Node {node_id} already exists")
+            self.generation += 1
+            self._emit("node", {
+                "id": node_id,
+                "label": label,
+                "properties": properties,
+                "valid_from": valid_from,
+                "valid_to": valid_to,
+                "context": context
+            })
+        return node_id
+
+    def create_relationship(self, source_id: str, target_id: str, rel_type: str,
+                            properties: dict, valid_from: datetime,
+                            valid_to: Optional[datetime], context: dict):
+        rel = {
+            "source_id": source_id,
+            "target_id": target_id,
+            "type": rel_type,
+            "properties": properties,
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+            "context": context
+        }
+        with self._lock:
+            self._conn().execute(
+                f"INSERT INTO relationships ({REL_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source_id, target_id, rel_type, json.dumps(properties), *to_epoch_us(valid_from),
+                 *to_epoch_us(valid_to), json.dumps(context))
+            )
+            self.generation += 1
+            self._emit("relationship", rel)
+
+    def get_node(self, node_id: str, timestamp: Optional[datetime] = None) -> Optional[MockNode]:
+        query = f"SELECT {NODE_COLUMNS} FROM nodes WHERE id = :id"
+        params: Dict[str, Any] = {"id": node_id}
+        if timestamp:
+            query += f" AND {VALID_AT}"
+            params["ts"] = to_epoch_us(timestamp)[0]
+        row = self._conn().execute(query, params).fetchone()
+        return _node_from_row(row) if row else None
+
+    def get_relationships(self, node_id: str, direction: str = "both",
+                          timestamp: Optional[datetime] = None) -> List[Dict]:
+        """Relationships incident to a node; direction is 'out', 'in' or 'both'"""
+        columns = {"out": ["source_id"], "in": ["target_id"], "both": ["source_id", "target_id"]}
+        params: Dict[str, Any] = {"id": node_id}
+        validity = ""
+        if timestamp:
+            validity = f" AND {VALID_AT}"
+            params["ts"] = to_epoch_us(timestamp)[0]
+        rels = []
+        for column in columns[direction]:
+            rows = self._conn().execute(
+                f"SELECT {REL_COLUMNS} FROM relationships WHERE {column} = :id{validity} ORDER BY seq",
+                params
+            )
+            rels.extend(_rel_from_row(row) for row in rows)
+        return rels
+
+    def _stream(self, query: str, params: Dict[str, Any], decode, batch_size: int = 1000) -> Iterator:
+        # A single SELECT reads from one WAL snapshot for its whole duration
+        cursor = self._conn().execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield decode(row)
+
+    def iter_nodes(self) -> Iterator[MockNode]:
+        """All nodes, streamed from one consistent snapshot"""
+        return self._stream(f"SELECT {NODE_COLUMNS} FROM nodes ORDER BY seq", {}, _node_from_row)
+
+    def nodes_by_label(self, label: str) -> Iterator[MockNode]:
+        """Nodes with the given label, streamed through the label index"""
+        return self._stream(f"SELECT {NODE_COLUMNS} FROM nodes WHERE label = :label ORDER BY seq",
+                            {"label": label}, _node_from_row)
+
+    def nodes_valid_at(self, timestamp: datetime, label: Optional[str] = None) -> Iterator[MockNode]:
+        """Nodes whose validity interval contains timestamp, streamed through the validity index"""
+        query = f"SELECT {NODE_COLUMNS} FROM nodes WHERE {VALID_AT}"
+        params: Dict[str, Any] = {"ts": to_epoch_us(timestamp)[0]}
+        if label is not None:
+            query += " AND label = :label"
+            params["label"] = label
+        return self._stream(query, params, _node_from_row)
+
+    def count_nodes(self, label: Optional[str] = None) -> int:
+        if label is None:
+            return self._conn().execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM nodes WHERE label = ?", (label,)).fetchone()[0]
+
+    def iter_relationships(self) -> Iterator[Dict]:
+        """All relationships, streamed from one consistent snapshot"""
+        return self._stream(f"SELECT {REL_COLUMNS} FROM relationships ORDER BY seq", {}, _rel_from_row)
+
+    def expired_versions(self, cutoff: datetime, limit: int,
+                         cursor: Optional[Tuple] = None) -> Tuple[List[MockNode], List[Tuple[int, Dict]], None]:
+        """Up to limit node and up to limit relationship versions whose validity ended by cutoff.
+
+        Relationships are paired with the key remove_versions takes (their seq).
+        Removed versions are deleted, so every call resumes where the last one
+        stopped through the valid_to index; the cursor is accepted for
+        symmetry with MockNeo4j and always None.
+        """
+        params = {"cutoff": to_epoch_us(cutoff)[0], "limit": limit}
+        conn = self._conn()
+        nodes = [_node_from_row(row) for row in conn.execute(
+            f"SELECT {NODE_COLUMNS} FROM nodes WHERE valid_to <= :cutoff ORDER BY valid_to LIMIT :limit",
+            params
+        )]
+        rels = [(row[0], _rel_from_row(row[1:])) for row in conn.execute(
+            f"SELECT seq, {REL_COLUMNS} FROM relationships WHERE valid_to <= :cutoff "
+            "ORDER BY valid_to LIMIT :limit",
+            params
+        )]
+        return nodes, rels, None
+
+    def remove_versions(self, node_ids: List[str], relationships: List[Tuple[int, Dict]]):
+        """Delete archived versions in one transaction"""
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("DELETE FROM nodes WHERE id = ?", [(node_id,) for node_id in node_ids])
+                conn.executemany("DELETE FROM relationships WHERE seq = ?", [(seq,) for seq, _ in relationships])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self.generation += 1
+            self._emit("archived", {
+                "node_ids": list(node_ids),
+                "relationships": [rel for _, rel in relationships]
+            })
+
+    def compact(self):
+        """Fold the WAL back into the database and refresh the planner statistics.
+
+        Freed pages are reused by later writes; the file itself only shrinks
+        with an explicit VACUUM, which would block every reader and writer.
+        """
+        conn = self._conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+
+    def memory_bytes(self, sample: int = 256) -> Dict[str, int]:
+        """Bounds of what the store can keep resident, and its size on disk.
+
+        The page cache limit applies to each thread's connection; the mapped
+        region is shared page cache of the operating system.
+        """
+        def file_size(path: str) -> int:
+            return os.path.getsize(path) if os.path.exists(path) else 0
+        return {
+            "page_cache_limit_per_connection": self.cache_mb * 1024 * 1024,
+            "mmap_limit": self.mmap_mb * 1024 * 1024,
+            "database_on_disk": file_size(self.path),
+            "wal_on_disk": file_size(self.path + "-wal")
+        }
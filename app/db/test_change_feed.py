@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.db.change_feed import ChangeFeed, ChangeFeedGap
+
+
+def test_resume_from_last_seen_sequence():
+    feed = ChangeFeed()
+    for i in range(5):
+        feed.append("node", {"id": str(i)})
+    first = feed.since(0, limit=2, epoch=feed.epoch)
+    assert [event["seq"] for event in first] == [1, 2]
+    rest = feed.since(first[-1]["seq"], epoch=feed.epoch)
+    assert [event["seq"] for event in rest] == [3, 4, 5]
+    assert feed.since(5, epoch=feed.epoch) == []
+
+
+def test_position_from_another_epoch_is_a_gap():
+    feed = ChangeFeed()
+    feed.append("node", {"id": "a"})
+    restarted = ChangeFeed()
+    with pytest.raises(ChangeFeedGap):
+        restarted.since(0, epoch=feed.epoch)
+    assert ChangeFeed(epoch=feed.epoch).epoch == feed.epoch
+
+
+def test_position_beyond_head_is_a_gap():
+    feed = ChangeFeed()
+    feed.append("node", {"id": "a"})
+    with pytest.raises(ChangeFeedGap):
+        feed.since(2)
+
+
+def test_position_older_than_retention_is_a_gap():
+    feed = ChangeFeed(retention=3)
+    for i in range(5):
+        feed.append("node", {"id": str(i)})
+    assert feed.first_seq == 3
+    assert [event["seq"] for event in feed.since(2)] == [3, 4, 5]
+    with pytest.raises(ChangeFeedGap):
+        feed.since(1)
+
+
+def test_stream_resumes_with_epoch_qualified_ids():
+    feed = ChangeFeed()
+    for i in range(3):
+        feed.append("node", {"id": str(i)})
+
+    async def first_chunk():
+        stream = feed.stream_sse(1, epoch=feed.epoch)
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    chunk = asyncio.run(first_chunk())
+    ids = [line[len("id: "):] for line in chunk.splitlines() if line.startswith("id: ")]
+    assert ids == [f"{feed.epoch}-2", f"{feed.epoch}-3"]
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.columnar import ColumnarGraph, export_graph, import_graph
+from app.db.mock_db import MockNeo4j
+from app.db.sqlite_store import SQLiteGraph
+
+
+def _fill(store):
+    a = store.create_node("Person", {"name": "a"}, datetime(2024, 1, 1), None, {"team": "x"})
+    b = store.create_node("Project", {"name": "b"}, datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2))),
+                          datetime(2024, 6, 1), {})
+    store.create_relationship(a, b, "WORKS_ON", {"w": 1}, datetime(2024, 2, 1), None, {"r": 1})
+    # Two identical relationships must both survive the first import and neither be duplicated later
+    store.create_relationship(a, b, "KNOWS", {}, datetime(2024, 2, 1), None, {})
+    store.create_relationship(a, b, "KNOWS", {}, datetime(2024, 2, 1), None, {})
+
+
+def _contents(store):
+    nodes = sorted((n.id, n.labels[0], repr(n.properties), n.valid_from, n.valid_to) for n in store.iter_nodes())
+    rels = sorted((r["source_id"], r["target_id"], r["type"], r["valid_from"]) for r in store.iter_relationships())
+    return nodes, rels
+
+
+@pytest.fixture(params=["mock", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make():
+        store = MockNeo4j() if request.param == "mock" else SQLiteGraph(str(tmp_path / f"{len(stores)}.db"))
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        if isinstance(store, SQLiteGraph):
+            store.close()
+
+
+def test_import_round_trips_and_is_idempotent(make_store, tmp_path):
+    source = make_store()
+    _fill(source)
+    path = str(tmp_path / "graph.cgtc")
+    with open(path, "wb") as out:
+        export_graph(source, out)
+
+    target = make_store()
+    with ColumnarGraph(path) as graph:
+        first = import_graph(target, graph, batch_size=2)
+    assert first == {"nodes": 2, "skipped_nodes": 0, "relationships": 3, "skipped_relationships": 0}
+    assert _contents(target) == _contents(source)
+
+    with ColumnarGraph(path) as graph:
+        again = import_graph(target, graph, batch_size=2)
+    assert again == {"nodes": 0, "skipped_nodes": 2, "relationships": 0, "skipped_relationships": 3}
+    assert _contents(target) == _contents(source)
+
+
+def test_import_adds_relationships_missing_between_existing_nodes(make_store, tmp_path):
+    source = make_store()
+    _fill(source)
+    path = str(tmp_path / "graph.cgtc")
+    with open(path, "wb") as out:
+        export_graph(source, out)
+
+    target = make_store()
+    for node in source.iter_nodes():
+        target.create_node(node.labels[0], node.properties, node.valid_from, node.valid_to, node.context,
+                           node_id=node.id)
+    with ColumnarGraph(path) as graph:
+        counts = import_graph(target, graph)
+    assert counts["relationships"] == 3
+    assert _contents(target) == _contents(source)
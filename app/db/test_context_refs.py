@@ -0,0 +1,27 @@
+from app.db.context_refs import ContextRefs, canonicalize_context, context_id_for
+
+
+def test_reference_counts():
+    refs = ContextRefs()
+    assert refs.attach("a", "c1") == (True, None)
+    assert refs.attach("b", "c1") == (False, None)
+    assert refs.attach("a", "c1") == (False, None)
+    assert refs.refcount("c1") == 2
+    assert refs.detach("a") is None
+    assert refs.detach("b") == "c1"
+    assert refs.detach("b") is None
+
+
+def test_moving_the_last_reference_orphans_the_previous_context():
+    refs = ContextRefs()
+    refs.attach("a", "c1")
+    refs.attach("b", "c1")
+    assert refs.attach("a", "c2") == (True, None)
+    assert refs.attach("b", "c2") == (False, "c1")
+    assert refs.nodes("c2") == ["a", "b"]
+    assert refs.refcount("c1") == 0
+
+
+def test_canonical_ids_ignore_key_order():
+    assert context_id_for(canonicalize_context({"a": 1, "b": 2})) == \
+        context_id_for(canonicalize_context({"b": 2, "a": 1}))
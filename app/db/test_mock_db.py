@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+import threading
+
+from app.db.embeddings import hashing_encode
+from app.db.mock_db import MockNeo4j, MockVectorStore
+
+
+def test_adjacency_readers_never_see_unpublished_positions():
+    store = MockNeo4j()
+    hub = store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                for rel in store.get_relationships(hub, "out"):
+                    assert rel["source_id"] == hub
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(20_000):
+        store.create_relationship(hub, f"t{i}", "KNOWS", {}, datetime(2024, 1, 1), None, {})
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert len(store.get_relationships(hub, "out")) == 20_000
+
+
+def test_relationship_is_appended_before_its_position_is_published():
+    store = MockNeo4j()
+    relationships = store._edges[0]
+    published = []
+
+    class Positions(list):
+        def append(self, position):
+            # What a lock-free reader would dereference at this instant
+            published.append(position < len(relationships))
+            super().append(position)
+
+    class Adjacency(dict):
+        def setdefault(self, key, default=None):
+            return super().setdefault(key, Positions())
+
+    store._edges = (relationships, Adjacency(), Adjacency(), set())
+    a = store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    b = store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    store.create_relationship(a, b, "KNOWS", {}, datetime(2024, 1, 1), None, {})
+    store.create_relationship(b, a, "KNOWS", {}, datetime(2024, 1, 1), None, {})
+    assert published == [True] * 4
+
+
+def test_aware_and_naive_timestamps_mix():
+    store = MockNeo4j()
+    plus_two = timezone(timedelta(hours=2))
+    a = store.create_node("Person", {}, datetime(2024, 1, 1, 12), datetime(2024, 2, 1), {})
+    b = store.create_node("Person", {}, datetime(2024, 1, 1, 12, tzinfo=plus_two), None, {})
+    store.create_relationship(a, b, "KNOWS", {}, datetime(2024, 1, 1, 12, tzinfo=timezone.utc), None, {})
+
+    # 13:00+02:00 is 11:00 UTC: before a (naive, taken as UTC) exists
+    assert store.get_node(a, datetime(2024, 1, 1, 13, tzinfo=plus_two)) is None
+    assert store.get_node(a, datetime(2024, 1, 1, 12, tzinfo=timezone.utc)) is not None
+    # b starts at 10:00 UTC
+    assert store.get_node(b, datetime(2024, 1, 1, 10, 30)) is not None
+    assert store.get_node(b, datetime(2024, 1, 1, 9, 30)) is None
+    assert store.get_relationships(a, "out", datetime(2024, 1, 1, 11, 59)) == []
+    assert len(store.get_relationships(b, "in", datetime(2024, 1, 1, 14, tzinfo=plus_two))) == 1
+
+
+def test_context_is_stored_once_and_deleted_with_its_last_reference():
+    encoded = []
+
+    def encoder(texts):
+        encoded.extend(texts)
+        return hashing_encode(texts)
+
+    vectors = MockVectorStore(encoder=encoder)
+    deleted = []
+    vectors.add_listener(lambda kind, data: deleted.append(data["id"]) if kind == "context_deleted" else None)
+    shared = vectors.attach_context("a", {"team": "x"})
+    assert vectors.attach_context("b", {"team": "x"}) == shared
+    assert len(encoded) == 1 and len(vectors.index) == 1
+
+    # Moving both nodes to another context leaves nothing referencing the first
+    vectors.attach_context("a", {"team": "y"})
+    assert shared in vectors.contexts
+    moved = vectors.attach_context("b", {"team": "y"})
+    assert deleted == [shared]
+    assert list(vectors.contexts) == [moved]
+    assert len(vectors.index) == 1
+    vectors.detach_context("a")
+    vectors.detach_context("b")
+    assert vectors.contexts == {} and deleted == [shared, moved]
@@ -0,0 +1,41 @@
+from datetime import datetime
+import random
+
+import pytest
+
+from app.db.mock_db import MockNode
+from app.db.property_index import PropertyIndex, SortedIndex
+
+
+def _node(node_id: str, value) -> MockNode:
+    return MockNode(node_id, ["Item"], {"v": value}, datetime(2024, 1, 1), None, {})
+
+
+def test_property_index_is_abstract():
+    with pytest.raises(TypeError):
+        PropertyIndex("Item", "v", "hash")
+
+
+def test_sorted_index_matches_a_full_scan_across_chunks():
+    rng = random.Random(7)
+    index = SortedIndex("Item", "v")
+    values = {}
+    for i in range(5000):
+        values[str(i)] = rng.randint(0, 400)
+        index.add(_node(str(i), values[str(i)]))
+    removed = rng.sample(sorted(values), 1500)
+    index.remove_many(removed[:1000])
+    for node_id in removed[1000:]:
+        index.remove(node_id)
+    for node_id in removed:
+        del values[node_id]
+
+    for _ in range(50):
+        low, high = sorted(rng.sample(range(-10, 410), 2))
+        expected = {node_id for node_id, value in values.items() if low < value <= high}
+        assert set(index.range(low, False, high, True)) == expected
+        assert index.count_range(low, False, high, True) == len(expected)
+        wanted = {node_id for node_id, value in values.items() if value == low}
+        assert set(index.equal([low])) == wanted
+        assert index.count_equal([low]) == len(wanted)
+    assert len(index) == len(values)
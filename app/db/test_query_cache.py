@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from app.db.mock_db import MockNeo4j
+from app.db.query_cache import QueryCache, is_historical
+
+
+def test_write_invalidates_cached_results():
+    store = MockNeo4j()
+    cache = QueryCache()
+    store.add_listener(cache.advance)
+    calls = []
+
+    def count():
+        calls.append(1)
+        return store.count_nodes()
+
+    assert cache.get_or_compute("count", count) == 0
+    assert cache.get_or_compute("count", count) == 0
+    assert len(calls) == 1
+    store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    assert cache.get_or_compute("count", count) == 1
+    assert len(calls) == 2
+
+
+def test_result_computed_across_a_write_is_not_cached():
+    cache = QueryCache()
+    generation = cache.generation
+    cache.advance()
+    cache.put("key", "stale", generation)
+    assert cache.get("key") == (False, None)
+
+
+def test_pinned_results_survive_writes():
+    cache = QueryCache()
+    cache.put("past", [1, 2], cache.generation, pinned=True)
+    cache.advance()
+    assert cache.get("past") == (True, [1, 2])
+
+
+def test_expired_results_are_dropped():
+    cache = QueryCache(ttl=0.0)
+    cache.put("key", 1, cache.generation)
+    assert cache.get("key") == (False, None)
+
+
+def test_naive_timestamps_are_historical_in_utc():
+    now = datetime.now(timezone.utc)
+    assert is_historical(now.replace(tzinfo=None) - timedelta(minutes=1))
+    assert not is_historical(now.replace(tzinfo=None) + timedelta(minutes=1))
+    assert is_historical(now.astimezone(timezone(timedelta(hours=-5))) - timedelta(minutes=1))
+    assert not is_historical(None)
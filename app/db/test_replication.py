@@ -0,0 +1,186 @@
+from datetime import datetime
+import json
+
+import pytest
+
+from app.db.embeddings import hashing_encode
+from app.db.mock_db import MockNeo4j, MockVectorStore
+from app.db.replication import LogReplicator, SharedLog, replicate
+
+
+class _Worker:
+    """One worker's local stores replicated through the log, counting the texts it encodes"""
+
+    def __init__(self, path: str, graph=None):
+        self.encoded = 0
+
+        def encoder(texts):
+            self.encoded += len(texts)
+            return hashing_encode(texts)
+
+        self.local_graph = graph or MockNeo4j()
+        self.local_vectors = MockVectorStore(encoder=encoder)
+        self.graph, self.vectors = replicate(path, self.local_graph, self.local_vectors)
+
+    def close(self):
+        self.graph._replicator.log.close()
+
+    def state(self):
+        nodes = sorted((n.id, n.labels[0], json.dumps(n.properties)) for n in self.graph.iter_nodes())
+        rels = sorted((r["source_id"], r["target_id"], r["type"]) for r in self.graph.iter_relationships())
+        index = self.vectors.index
+        contexts = {context_id: index._originals()[index.rows[context_id]].tolist()
+                    for context_id in self.vectors.contexts}
+        return nodes, rels, sorted(self.vectors.refs.node_context.items()), contexts
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "graph.log")
+
+
+def _populate(worker: _Worker):
+    a = worker.graph.create_node("Person", {"name": "a"}, datetime(2024, 1, 1), None, {"team": "x"})
+    b = worker.graph.create_node("Person", {"name": "b"}, datetime(2024, 1, 1), None, {"team": "x"})
+    c = worker.graph.create_node("Person", {"name": "c"}, datetime(2024, 1, 1), None, {"team": "y"})
+    for node_id, team in ((a, "x"), (b, "x"), (c, "y")):
+        worker.vectors.attach_context(node_id, {"team": team})
+    worker.graph.create_relationship(a, b, "KNOWS", {}, datetime(2024, 2, 1), None, {})
+    worker.vectors.detach_context(c)
+    worker.vectors.attach_context(b, {"team": "z"})
+    # The last node on team x moves too, orphaning its context
+    worker.vectors.attach_context(a, {"team": "z"})
+    worker.vectors.store_context("note", "free text", {"source": "test"})
+    worker.vectors.store_context("gone", "deleted text", {})
+    worker.vectors.delete_context("gone")
+    return a, b, c
+
+
+def test_writes_of_one_worker_reach_another(log_path):
+    writer, reader = _Worker(log_path), _Worker(log_path)
+    try:
+        a, b, c = _populate(writer)
+        assert reader.graph.get_node(a).properties == {"name": "a"}
+        assert [rel["target_id"] for rel in reader.graph.get_relationships(a, "out")] == [b]
+        assert reader.state() == writer.state()
+        # Vectors come from the log; the reader never encodes a context
+        assert reader.encoded == 0
+        assert writer.graph.epoch == reader.graph.epoch
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_replay_after_compaction_rebuilds_the_same_state(log_path):
+    writer = _Worker(log_path)
+    _populate(writer)
+    expected = writer.state()
+    writer.close()
+    with open(log_path, "rb") as f:
+        uncompacted = f.read().count(b"\n")
+
+    # Alone on the log, so it compacts it before replaying
+    restarted = _Worker(log_path)
+    try:
+        assert restarted.state() == expected
+        assert restarted.encoded == 0
+    finally:
+        restarted.close()
+    with open(log_path, "rb") as f:
+        lines = [json.loads(line) for line in f.read().splitlines()]
+    assert len(lines) < uncompacted
+    assert lines[0]["kind"] == "log"
+    assert not any(line["kind"] in ("context_detached", "context_deleted") for line in lines)
+
+    again = _Worker(log_path)
+    try:
+        assert again.state() == expected
+    finally:
+        again.close()
+
+
+def test_epoch_is_shared_by_members_and_changes_with_compaction(log_path):
+    first = _Worker(log_path)
+    first.graph.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+    second = _Worker(log_path)
+    epoch = first.graph.epoch
+    assert second.graph.epoch == epoch
+    first.close()
+    # Another member is still alive, so this one must not compact
+    third = _Worker(log_path)
+    assert third.graph.epoch == epoch
+    second.close()
+    third.close()
+    fourth = _Worker(log_path)
+    try:
+        assert fourth.graph.epoch != epoch
+        assert fourth.graph.count_nodes() == 1
+    finally:
+        fourth.close()
+
+
+def test_log_without_header_gets_one_on_compaction(log_path):
+    record = {"kind": "node", "id": "n1", "label": "Person", "properties": {}, "valid_from": "2024-01-01T00:00:00",
+              "valid_to": None, "context": {}}
+    with open(log_path, "wb") as f:
+        f.write(json.dumps(record).encode() + b"\n")
+    worker = _Worker(log_path)
+    try:
+        assert worker.graph.get_node("n1") is not None
+        with open(log_path, "rb") as f:
+            header = json.loads(f.readline())
+        assert header == {"kind": "log", "epoch": worker.graph.epoch}
+    finally:
+        worker.close()
+
+
+class _RejectingGraph(MockNeo4j):
+    def create_node(self, label, properties, valid_from, valid_to, context, node_id=None):
+        if not label:
+            raise ValueError("label is required")
+        return super().create_node(label, properties, valid_from, valid_to, context, node_id)
+
+
+def test_write_is_applied_locally_before_it_is_logged(log_path):
+    worker = _Worker(log_path, graph=_RejectingGraph())
+    try:
+        log = worker.graph._replicator.log
+        sizes = []
+        worker.local_graph.add_listener(lambda kind, data: sizes.append(log.size()))
+        before = log.size()
+        worker.graph.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+        assert sizes == [before]
+        assert log.size() > before
+
+        logged = log.size()
+        with pytest.raises(ValueError):
+            worker.graph.create_node("", {}, datetime(2024, 1, 1), None, {})
+        # A write the local store rejects never reaches the log or the other workers
+        assert log.size() == logged
+        other = _Worker(log_path)
+        try:
+            assert other.graph.count_nodes() == 1
+        finally:
+            other.close()
+    finally:
+        worker.close()
+
+
+def test_partial_record_is_not_read(log_path):
+    log = SharedLog(log_path)
+    try:
+        replicator = LogReplicator(log, MockNeo4j(), MockVectorStore())
+        replicator.sync()
+        start = replicator.offset
+        record = SharedLog.encode({"kind": "node", "id": "n1", "label": "Person", "properties": {},
+                                   "valid_from": datetime(2024, 1, 1), "valid_to": None, "context": {}})
+        with log.locked():
+            log.append(record[:10])
+        replicator.sync()
+        assert replicator.offset == start and replicator.graph.count_nodes() == 0
+        with log.locked():
+            log.append(record[10:])
+        replicator.sync()
+        assert replicator.graph.count_nodes() == 1
+    finally:
+        log.close()
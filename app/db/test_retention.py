@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.analytics.temporal_paths import TemporalPaths
+from app.db.mock_db import MockNeo4j, MockVectorStore
+from app.db.property_index import PropertyIndexes
+from app.db.retention import ColdArchive, RetentionEngine
+from app.db.sqlite_store import SQLiteGraph
+
+DAY = datetime(2024, 1, 1)
+CUTOFF = datetime(2024, 6, 1)
+
+
+def at(day: int) -> datetime:
+    return DAY + timedelta(days=day)
+
+
+def _store(backend, tmp_path):
+    return MockNeo4j() if backend == "mock" else SQLiteGraph(str(tmp_path / "graph.db"))
+
+
+def _populate(store, expired: int = 5):
+    """expired Person versions that ended before CUTOFF, one current one, and a chain of FLIGHTs between them"""
+    for i in range(expired):
+        store.create_node("Person", {"name": f"old{i}"}, at(0), at(10 + i), {"note": f"old{i}"},
+                          node_id=f"old{i}")
+    store.create_node("Person", {"name": "current"}, at(0), None, {"note": "current"}, node_id="current")
+    for i in range(expired - 1):
+        store.create_relationship(f"old{i}", f"old{i + 1}", "FLIGHT", {}, at(1), at(2), {})
+    store.create_relationship("old0", "current", "FLIGHT", {}, at(1), None, {})
+
+
+def _engine(store, vectors, path, batch_size=2):
+    return RetentionEngine(store, vectors, ColdArchive(str(path)), timedelta(days=30),
+                           batch_size=batch_size, pause=0)
+
+
+@pytest.mark.parametrize("backend", ["mock", "sqlite"])
+def test_archived_versions_are_read_as_of_from_the_archive(backend, tmp_path):
+    store = _store(backend, tmp_path)
+    try:
+        _populate(store)
+        engine = _engine(store, MockVectorStore(), tmp_path / "archive")
+        result = engine.run_once(CUTOFF)
+        assert (result["nodes_archived"], result["relationships_archived"]) == (5, 4)
+        assert result["batches"] == 3
+        assert store.count_nodes() == store.count_nodes("Person") == 1
+        assert store.get_node("old2") is None
+        assert len(list(store.iter_relationships())) == 1
+        assert [rel["target_id"] for rel in store.get_relationships("old0")] == ["current"]
+
+        archive = engine.archive
+        node = archive.get_node("old2", at(11))
+        assert node.properties == {"name": "old2"} and node.valid_to == at(12)
+        assert archive.get_node("old2", at(12)) is None
+        assert sorted(n.id for n in archive.nodes_valid_at(at(12), "Person")) == ["old3", "old4"]
+        assert [rel["target_id"] for rel in archive.get_relationships("old1", "out", at(1))] == ["old2"]
+        assert archive.get_relationships("old1", "out", at(2)) == []
+        # A second pass finds nothing left to archive
+        assert engine.run_once(CUTOFF)["batches"] == 0
+    finally:
+        if backend == "sqlite":
+            store.close()
+
+
+def test_batches_resume_the_scan_and_the_store_is_rebuilt_once(tmp_path):
+    store = MockNeo4j()
+    _populate(store)
+    compactions = []
+    compact = store.compact
+    store.compact = lambda: compactions.append(len(store._node_list)) or compact()
+    nodes, _, cursor = store.expired_versions(CUTOFF, 2)
+    store.remove_versions([node.id for node in nodes], [])
+    # Removal only hides the versions, and the next batch starts after them
+    assert len(store._node_list) == 6
+    nodes, _, cursor = store.expired_versions(CUTOFF, 2, cursor)
+    assert [node.id for node in nodes] == ["old2", "old3"]
+    assert cursor[2] == 4
+
+    _engine(store, MockVectorStore(), tmp_path / "archive", batch_size=1).run_once(CUTOFF)
+    assert compactions == [6]
+    assert [node.id for node in store._node_list] == ["current"]
+    assert store.label_index == {"Person": store._node_list}
+    assert len(store._edges[0]) == 1
+
+
+class _FailingStore(MockNeo4j):
+    """Fails the first removal, as if the process died between archiving and removing a batch"""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = True
+
+    def remove_versions(self, node_ids, relationships):
+        if self.fail:
+            self.fail = False
+            raise RuntimeError("interrupted")
+        super().remove_versions(node_ids, relationships)
+
+
+def test_rerun_after_an_interrupted_run_does_not_duplicate(tmp_path):
+    store = _FailingStore()
+    _populate(store)
+    # Two identical relationships are two versions, and both must be archived
+    store.create_relationship("old0", "old1", "FLIGHT", {}, at(1), at(2), {})
+    with pytest.raises(RuntimeError):
+        _engine(store, MockVectorStore(), tmp_path / "archive", batch_size=10).run_once(CUTOFF)
+    # The retry comes from a new process, which reloads the archive
+    engine = _engine(store, MockVectorStore(), tmp_path / "archive", batch_size=10)
+    assert engine.run_once(CUTOFF)["relationships_archived"] == 5
+    stats = engine.archive.stats()
+    assert (stats["nodes"], stats["relationships"]) == (5, 5)
+    flights = engine.archive.get_relationships("old0", "out", at(1))
+    assert sorted(rel["target_id"] for rel in flights) == ["old1", "old1"]
+    assert not (tmp_path / "archive" / "pending.jsonl").exists()
+
+    # Later runs archive identical versions again rather than mistaking them for repeats
+    store.create_relationship("old0", "old1", "FLIGHT", {}, at(1), at(2), {})
+    engine.run_once(CUTOFF)
+    assert len(engine.archive.get_relationships("old0", "out", at(1))) == 3
+
+
+def test_run_compacts_indexes_and_vectors(tmp_path):
+    store = MockNeo4j()
+    vectors = MockVectorStore(vector_path=str(tmp_path / "vectors.f32"))
+    indexes = PropertyIndexes(store)
+    names = indexes.create("Person", "name")
+    paths = TemporalPaths(store)
+    paths.load()
+    _populate(store)
+    for node in store.iter_nodes():
+        vectors.attach_context(node.id, node.context)
+    assert paths.earliest_arrival("old0", "old1", start=at(0))["reachable"] is True
+
+    _engine(store, vectors, tmp_path / "archive").run_once(CUTOFF)
+    assert list(names.equal(["old1"])) == []
+    assert list(names.equal(["current"])) == ["current"]
+    assert paths.earliest_arrival("old0", "old1", start=at(0))["reachable"] is False
+    assert paths.earliest_arrival("old0", "current", start=at(0))["reachable"] is True
+    assert len(vectors.contexts) == 1
+    assert vectors.index.ids == list(vectors.contexts)
+    assert (tmp_path / "vectors.f32").stat().st_size == vectors.index.dim * 4
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from app.db.mock_db import MockNeo4j
+from app.db.sqlite_store import SQLiteGraph
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteGraph(str(tmp_path / "graph.db"))
+    yield store
+    store.close()
+
+
+def test_transaction_emits_events_after_commit(store):
+    events = []
+    store.add_listener(lambda kind, data: events.append((kind, store.get_node(data["id"]) is not None)))
+    with store.transaction():
+        store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+        assert events == []
+    assert events == [("node", True)]
+
+
+def test_rolled_back_transaction_emits_nothing(store):
+    events = []
+    store.add_listener(lambda kind, data: events.append(kind))
+    with pytest.raises(KeyError):
+        with store.transaction():
+            store.create_node("Person", {}, datetime(2024, 1, 1), None, {})
+            raise KeyError("abort")
+    assert events == []
+    assert store.count_nodes() == 0
+
+
+def test_file_is_served_by_one_store_at_a_time(store, tmp_path):
+    with pytest.raises(RuntimeError):
+        SQLiteGraph(store.path)
+    store.close()
+    SQLiteGraph(store.path).close()
+
+
+@pytest.mark.parametrize("backend", ["mock", "sqlite"])
+def test_existing_node_id_is_rejected(backend, tmp_path):
+    store = MockNeo4j() if backend == "mock" else SQLiteGraph(str(tmp_path / "ids.db"))
+    try:
+        store.create_node("Person", {"v": 1}, datetime(2024, 1, 1), None, {}, node_id="n1")
+        with pytest.raises(ValueError):
+            store.create_node("Project", {"v": 2}, datetime(2024, 2, 1), None, {}, node_id="n1")
+        assert store.get_node("n1").properties == {"v": 1}
+        assert [node.id for node in store.iter_nodes()] == ["n1"]
+        assert store.count_nodes() == 1
+        assert store.count_nodes("Project") == 0
+        assert list(store.nodes_by_label("Person")) != []
+    finally:
+        if backend == "sqlite":
+            store.close()
@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.db.vector_index import VectorIndex
+
+DIM = 64
+
+
+def _normalized(rng, n):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(3)
+    # Clustered, so near neighbours are meaningfully closer than the rest
+    centres = _normalized(rng, 50)
+    vectors = centres[rng.integers(0, 50, 4000)] + 0.3 * _normalized(rng, 4000)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(4000, 40, replace=False)] + 0.1 * _normalized(rng, 40)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return [f"v{i}" for i in range(4000)], vectors, queries
+
+
+def _exact(ids, vectors, queries, k):
+    scores = queries @ vectors.T
+    return [[ids[i] for i in np.argsort(-row, kind="stable")[:k]] for row in scores]
+
+
+def _build(ids, vectors, tmp_path, **kwargs):
+    index = VectorIndex(DIM, path=str(tmp_path / "vectors.f32"), **kwargs)
+    for lo in range(0, len(ids), 1000):
+        index.add(ids[lo:lo + 1000], vectors[lo:lo + 1000])
+    return index
+
+
+@pytest.mark.parametrize("quantization,oversampling,min_recall", [
+    ("none", 1.0, 1.0),
+    ("int8", 4.0, 0.97),
+    ("binary", 10.0, 0.85),
+])
+def test_recall_against_exact_search(data, tmp_path, quantization, oversampling, min_recall):
+    ids, vectors, queries = data
+    index = _build(ids, vectors, tmp_path, quantization=quantization, oversampling=oversampling)
+    try:
+        expected = _exact(ids, vectors, queries, 10)
+        results = index.search_batch(queries, 10)
+        recall = np.mean([len(set(e) & {id_ for id_, _ in r}) / 10 for e, r in zip(expected, results)])
+        assert recall >= min_recall, recall
+        # Whatever the first pass was, returned scores are re-ranked exactly from the originals
+        rows = {id_: i for i, id_ in enumerate(ids)}
+        for query, hits in zip(queries, results):
+            scores = [score for _, score in hits]
+            assert scores == sorted(scores, reverse=True)
+            for id_, score in hits:
+                assert score == pytest.approx(float(vectors[rows[id_]] @ query), abs=1e-5)
+    finally:
+        index.close()
+
+
+def test_originals_are_kept_on_disk_and_codes_are_smaller(data, tmp_path):
+    ids, vectors, _ = data
+    index = _build(ids, vectors, tmp_path, quantization="binary")
+    try:
+        assert os.path.getsize(index.path) == len(ids) * DIM * 4
+        sizes = index.memory_bytes()
+        assert sizes["full_precision_on_disk"] == len(ids) * DIM * 4
+        assert sizes["codes"] < len(ids) * DIM * 4 / 8
+    finally:
+        index.close()
+
+
+def test_chunked_top_k_matches_a_single_chunk(data, tmp_path):
+    ids, vectors, queries = data
+    (tmp_path / "whole").mkdir()
+    (tmp_path / "chunked").mkdir()
+    whole = _build(ids, vectors, tmp_path / "whole", chunk_rows=len(ids))
+    chunked = _build(ids, vectors, tmp_path / "chunked", chunk_rows=97)
+    try:
+        assert chunked.search_batch(queries, 7) == whole.search_batch(queries, 7)
+        assert chunked.search(queries[0], 7) == whole.search(queries[0], 7)
+    finally:
+        whole.close()
+        chunked.close()
+
+
+def test_search_after_compaction(data, tmp_path):
+    ids, vectors, queries = data
+    index = _build(ids, vectors, tmp_path, chunk_rows=500)
+    try:
+        for id_ in ids[::2]:
+            index.remove(id_)
+        before = index.search_batch(queries, 10)
+        assert all(int(id_[1:]) % 2 for hits in before for id_, _ in hits)
+
+        index.compact()
+        assert len(index) == len(ids) // 2
+        assert os.path.getsize(index.path) == len(ids) // 2 * DIM * 4
+        after = index.search_batch(queries, 10)
+        assert [[id_ for id_, _ in hits] for hits in after] == [[id_ for id_, _ in hits] for hits in before]
+        for hits_after, hits_before in zip(after, before):
+            assert [s for _, s in hits_after] == pytest.approx([s for _, s in hits_before])
+
+        # Still writable and replaceable after the rewrite
+        index.add(["v1"], vectors[0:1])
+        index.add(["new"], queries[0:1])
+        assert index.search(queries[0], 1)[0][0] == "new"
+        assert len(index) == len(ids) // 2 + 1
+    finally:
+        index.close()
+
+
+def test_removed_ids_are_never_returned(data, tmp_path):
+    ids, vectors, queries = data
+    index = _build(ids[:20], vectors[:20], tmp_path)
+    try:
+        for id_ in ids[:18]:
+            index.remove(id_)
+        assert {id_ for id_, _ in index.search(queries[0], 10)} == set(ids[18:20])
+        assert VectorIndex(DIM).search(queries[0], 5) == []
+    finally:
+        index.close()
@@ -0,0 +1,206 @@
+from typing import Optional, Dict, List, Tuple
+import os
+import tempfile
+import threading
+import numpy as np
+
+from app.utils.memory import estimate_size
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+
+class VectorIndex:
+    """In-process cosine-similarity index over L2-normalized vectors.
+
+    Full-precision vectors are appended to a float32 file that is only read
+    through a memory map, so they stay on disk until the OS pages them in.
+    With ``quantization="int8"`` (4x smaller) or ``"binary"`` (32x smaller)
+    a compact code per vector is kept in RAM for the first pass; the best
+    ``limit * oversampling`` candidates are then re-ranked exactly from the
+    memory-mapped originals. With ``"none"`` the originals are scanned directly.
+    Deleted rows are tombstoned until ``compact`` rewrites the index.
+    """
+
+    def __init__(self, dim: int, quantization: str = "int8", oversampling: float = 4.0,
+                 path: Optional[str] = None, chunk_rows: int = 4096):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        self.dim = dim
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.chunk_rows = chunk_rows
+        if path is None:
+            self._tmp = tempfile.NamedTemporaryFile(prefix="cgtdb-vectors-", suffix=".f32")
+            path = self._tmp.name
+        else:
+            self._tmp = None
+        self.path = path
+        self._file = open(path, "wb")
+        self._mmap: Optional[np.memmap] = None
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = np.zeros((0, self._code_width()), dtype=self._code_dtype())
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._lock = threading.RLock()
+
+    def _code_width(self) -> int:
+        return {"none": 0, "int8": self.dim, "binary": (self.dim + 7) // 8}[self.quantization]
+
+    def _code_dtype(self):
+        return np.int8 if self.quantization == "int8" else np.uint8
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), np.ones(len(vectors), dtype=np.float32)
+        return np.zeros((len(vectors), 0), dtype=np.uint8), np.ones(len(vectors), dtype=np.float32)
+
+    def _grow(self, extra: int):
+        needed = len(self.ids) + extra
+        if needed <= len(self._alive):
+            return
+        capacity = max(needed, 2 * len(self._alive), 1024)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        codes = np.zeros((capacity, self._codes.shape[1]), dtype=self._codes.dtype)
+        codes[:len(self._codes)] = self._codes
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:len(self._scales)] = self._scales
+        self._alive, self._codes, self._scales = alive, codes, scales
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Add (or replace) vectors, one row per id"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            for id_ in ids:
+                self.remove(id_)
+            self._grow(len(ids))
+            start = len(self.ids)
+            self._file.write(vectors.tobytes())
+            self._file.flush()
+            codes, scales = self._quantize(vectors)
+            self._codes[start:start + len(ids)] = codes
+            self._scales[start:start + len(ids)] = scales
+            self._alive[start:start + len(ids)] = True
+            for offset, id_ in enumerate(ids):
+                self.rows[id_] = start + offset
+                self.ids.append(id_)
+
+    def remove(self, id_: str):
+        with self._lock:
+            row = self.rows.pop(id_, None)
+            if row is not None:
+                self._alive[row] = False
+                self.ids[row] = None
+
+    def _originals(self) -> np.ndarray:
+        """Memory map of the full-precision vectors, remapped when rows were appended"""
+        n = len(self.ids)
+        if self._mmap is None or self._mmap.shape[0] < n:
+            self._mmap = np.memmap(self.path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._mmap
+
+    def _first_pass(self, queries: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        """Approximate scores of rows [lo, hi) against every query, shape (hi - lo, m)"""
+        if self.quantization == "int8":
+            return (self._codes[lo:hi].astype(np.float32) @ queries.T) * self._scales[lo:hi, None]
+        if self.quantization == "binary":
+            # Dot product of +-1 sign vectors, i.e. dim - 2 * Hamming distance
+            signs = np.unpackbits(self._codes[lo:hi], axis=1, count=self.dim).astype(np.float32) * 2 - 1
+            return signs @ np.where(queries > 0, 1.0, -1.0).astype(np.float32).T
+        return self._originals()[lo:hi] @ queries.T
+
+    def _top_rows(self, queries: np.ndarray, n: int, k: int) -> np.ndarray:
+        """Rows of the k best first-pass scores per query, shape (k, m), in no particular order"""
+        m = len(queries)
+        best_scores = np.full((0, m), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((0, m), dtype=np.int64)
+        for lo in range(0, n, self.chunk_rows):
+            hi = min(lo + self.chunk_rows, n)
+            scores = self._first_pass(queries, lo, hi)
+            scores[~self._alive[lo:hi]] = -np.inf
+            rows = np.broadcast_to(np.arange(lo, hi)[:, None], scores.shape)
+            # Keep a running top k per query so memory stays O((k + chunk_rows) * m)
+            scores = np.concatenate([best_scores, scores])
+            rows = np.concatenate([best_rows, rows])
+            if len(scores) > k:
+                keep = np.argpartition(-scores, k - 1, axis=0)[:k]
+                scores = np.take_along_axis(scores, keep, axis=0)
+                rows = np.take_along_axis(rows, keep, axis=0)
+            best_scores, best_rows = scores, rows
+        return best_rows
+
+    def search(self, query: np.ndarray, limit: int = 5) -> List[Tuple[str, float]]:
+        """Top ``limit`` (id, cosine similarity) pairs for a normalized query vector"""
+        return self.search_batch(np.asarray(query).reshape(1, self.dim), limit)[0]
+
+    def search_batch(self, queries: np.ndarray, limit: int = 5) -> List[List[Tuple[str, float]]]:
+        """``search`` for many normalized queries at once, as matrix-matrix products"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            n = len(self.ids)
+            live = len(self.rows)
+            if not live or limit <= 0:
+                return [[] for _ in queries]
+            k = min(limit, live)
+            n_candidates = k
+            if self.quantization != "none":
+                n_candidates = min(live, max(limit, int(np.ceil(limit * self.oversampling))))
+            candidates = self._top_rows(queries, n, n_candidates)
+            # Exact scores for the union of every query's candidates, read once from the memory map
+            union, positions = np.unique(candidates, return_inverse=True)
+            positions = positions.reshape(candidates.shape)
+            exact = self._originals()[union] @ queries.T
+            results = []
+            for j in range(len(queries)):
+                scores = exact[positions[:, j], j]
+                order = np.argsort(-scores, kind="stable")[:k]
+                rows = candidates[order, j]
+                results.append([(self.ids[r], float(s)) for r, s in zip(rows, scores[order])])
+            return results
+
+    def compact(self):
+        """Drop tombstoned rows, rewriting the originals file and the in-memory codes"""
+        with self._lock:
+            n = len(self.ids)
+            keep = np.flatnonzero(self._alive[:n])
+            if len(keep) == n:
+                return
+            self._file.flush()
+            originals = self._originals()
+            tmp_path = self.path + ".compact"
+            with open(tmp_path, "wb") as out:
+                for lo in range(0, len(keep), self.chunk_rows):
+                    out.write(np.ascontiguousarray(originals[keep[lo:lo + self.chunk_rows]]).tobytes())
+            self._mmap = None
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "ab")
+            self.ids = [self.ids[row] for row in keep]
+            self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+            self._alive = np.ones(len(keep), dtype=bool)
+            self._codes = self._codes[keep]
+            self._scales = self._scales[keep]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Resident size of the first-pass structures and on-disk size of the originals"""
+        n = len(self.ids)
+        return {
+            "codes": int(self._codes[:n].nbytes + self._scales[:n].nbytes),
+            "ids": estimate_size(self.ids, depth=1) + estimate_size(self.rows, depth=0),
+            "full_precision_on_disk": n * self.dim * 4
+        }
+
+    def close(self):
+        self._file.close()
+        self._mmap = None
+        if self._tmp is not None:
+            self._tmp.close()
@@ -1,34 +1,111 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchAny, MatchValue, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams, SearchRequest
+)
 import os
-from typing import List, Dict, Any
+import threading
+import uuid
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+
+from app.db.context_refs import CONTEXT_NAMESPACE, ContextRefs, canonicalize_context, context_id_for
+from app.db.embeddings import ModelEncoder
+from app.utils.profiling import stage
+
+
+def _ref_id(node_id: str) -> str:
+    """Point id of a node's reference in the refs collection"""
+    return str(uuid.uuid5(CONTEXT_NAMESPACE, "node:" + node_id))
+
 
 class VectorStore:
-    def __init__(self):
+    def __init__(self, quantization: Optional[str] = None, oversampling: Optional[float] = None):
         self.client = QdrantClient(
             host=os.getenv("QDRANT_HOST", "localhost"),
             port=int(os.getenv("QDRANT_PORT", 6333))
         )
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        # Loaded on first use; CGTDB_EMBEDDING_MODEL may name a local copy of the model
+        self.encoder = ModelEncoder(
+            os.getenv("CGTDB_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        )
         self.collection_name = "context_embeddings"
+        # One vectorless point per node naming its context, so attaching a node writes one small
+        # point however many nodes share the context
+        self.refs_collection_name = "context_refs"
         self.vector_size = 384  # MiniLM-L6-v2 embedding size
+        # "none", "int8" (scalar) or "binary"; originals stay on disk and are used to re-rank
+        self.quantization = quantization or os.getenv("CGTDB_VECTOR_QUANTIZATION", "int8")
+        self.oversampling = oversampling or float(os.getenv("CGTDB_RESCORE_OVERSAMPLING", 4.0))
+        # Local view of which nodes share each context; the refs collection is the durable copy
+        self.refs = ContextRefs()
+        self._lock = threading.RLock()
+
+    @property
+    def model(self):
+        return self.encoder.model
 
     def init_collection(self):
-        """Initialize the vector collection if it doesn't exist"""
-        collections = self.client.get_collections().collections
-        if not any(c.name == self.collection_name for c in collections):
+        """Initialize the vector and reference collections if they don't exist"""
+        collections = {c.name for c in self.client.get_collections().collections}
+        if self.collection_name not in collections:
             self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE)
+                vectors_config=VectorParams(
+                    size=self.vector_size,
+                    distance=Distance.COSINE,
+                    on_disk=self.quantization != "none"
+                ),
+                quantization_config=self._quantization_config()
             )
+        if self.refs_collection_name not in collections:
+            self.client.create_collection(collection_name=self.refs_collection_name, vectors_config={})
+            self.client.create_payload_index(
+                collection_name=self.refs_collection_name,
+                field_name="context_id",
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+            if self.collection_name in collections:
+                self._migrate_payload_refs()
 
-    def store_context(self, context_id: str, context_text: str, metadata: Dict[str, Any]):
-        """Store context with its embedding"""
-        embedding = self.model.encode(context_text)
+    def _migrate_payload_refs(self):
+        """Move references kept in node_ids payloads of context points (earlier versions) to the refs collection"""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=["node_ids"],
+                with_vectors=False
+            )
+            refs = [self._ref_point(node_id, str(point.id))
+                    for point in points for node_id in (point.payload or {}).get("node_ids", [])]
+            if refs:
+                self.client.upsert(collection_name=self.refs_collection_name, points=refs)
+            if offset is None:
+                return
+
+    def _quantization_config(self):
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def store_context(self, context_id: str, context_text: str, metadata: Dict[str, Any],
+                      embedding: Optional[np.ndarray] = None):
+        """Store context with its embedding; embedding, if already computed, is its vector"""
+        if embedding is None:
+            embedding = self.encoder([context_text])[0]
         point = PointStruct(
             id=context_id,
-            vector=embedding.tolist(),
+            vector=np.asarray(embedding).reshape(-1).tolist(),
             payload={"text": context_text, **metadata}
         )
         self.client.upsert(
@@ -36,27 +113,150 @@ class VectorStore:
             points=[point]
         )
 
+    @staticmethod
+    def _ref_point(node_id: str, context_id: str) -> PointStruct:
+        return PointStruct(id=_ref_id(node_id), vector={},
+                           payload={"node_id": node_id, "context_id": context_id})
+
+    def _scroll_refs(self, context_ids: List[str]) -> Iterator[Tuple[str, str]]:
+        """(node_id, context_id) of every node referencing one of context_ids"""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.refs_collection_name,
+                scroll_filter=Filter(must=[FieldCondition(key="context_id", match=MatchAny(any=context_ids))]),
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                yield point.payload["node_id"], point.payload["context_id"]
+            if offset is None:
+                return
+
+    def _load_refs(self, context_id: str):
+        """Pick up node references persisted for a context by earlier runs"""
+        for node_id, _ in self._scroll_refs([context_id]):
+            self.refs.attach(node_id, context_id)
+
+    def _context_of(self, node_id: str) -> Optional[str]:
+        if node_id in self.refs.node_context:
+            return self.refs.node_context[node_id]
+        points = self.client.retrieve(
+            collection_name=self.refs_collection_name,
+            ids=[_ref_id(node_id)],
+            with_payload=True
+        )
+        if not points:
+            return None
+        context_id = points[0].payload["context_id"]
+        self._load_refs(context_id)
+        return context_id
+
+    def attach_context(self, node_id: str, context: Dict[str, Any]) -> str:
+        """Link a node to its context, embedding and storing the context only once"""
+        canonical = canonicalize_context(context)
+        context_id = context_id_for(canonical)
+        embedding = None
+        while True:
+            with self._lock:
+                self._context_of(node_id)
+                if context_id not in self.refs.context_nodes:
+                    self._load_refs(context_id)
+                # Only the first reference stores the context, and its vector is encoded outside the lock
+                if embedding is not None or self.refs.refcount(context_id) > 0:
+                    first, orphaned = self.refs.attach(node_id, context_id)
+                    if first:
+                        self.store_context(context_id, canonical, {"context": context}, embedding)
+                    self.client.upsert(collection_name=self.refs_collection_name,
+                                       points=[self._ref_point(node_id, context_id)])
+                    if orphaned:
+                        # The node moved off the last reference to its previous context
+                        self.delete_context(orphaned)
+                    return context_id
+            embedding = self.encoder([canonical])[0]
+
+    def detach_context(self, node_id: str):
+        """Unlink a node from its context, deleting the vector with its last reference"""
+        with self._lock:
+            if self._context_of(node_id) is None:
+                return
+            orphaned = self.refs.detach(node_id)
+            self.client.delete(
+                collection_name=self.refs_collection_name,
+                points_selector=[_ref_id(node_id)]
+            )
+            if orphaned:
+                self.delete_context(orphaned)
+
     def find_similar_contexts(self, query_text: str, limit: int = 5):
         """Find similar contexts based on semantic similarity"""
-        query_vector = self.model.encode(query_text)
-        results = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=query_vector,
-            limit=limit
+        with stage("encode"):
+            query_vector = self.model.encode(query_text)
+        with stage("vector_search"):
+            results = self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_vector,
+                limit=limit,
+                search_params=self._search_params()
+            )
+        return self._with_nodes([results])[0]
+
+    def find_similar_contexts_batch(self, query_texts: List[str], limit: int = 5) -> List[List[Dict]]:
+        """find_similar_contexts for many queries: one encode batch and one Qdrant batch search"""
+        if not query_texts:
+            return []
+        with stage("encode"):
+            query_vectors = self.model.encode(list(query_texts), batch_size=64)
+        with stage("vector_search"):
+            batches = self.client.search_batch(
+                collection_name=self.collection_name,
+                requests=[
+                    SearchRequest(
+                        vector=vector.tolist(),
+                        limit=limit,
+                        with_payload=True,
+                        params=self._search_params()
+                    )
+                    for vector in query_vectors
+                ]
+            )
+        return self._with_nodes(batches)
+
+    def _with_nodes(self, batches) -> List[List[Dict]]:
+        """Search hits as results, with the nodes referencing each context looked up in one scroll"""
+        context_ids = sorted({str(hit.id) for hits in batches for hit in hits})
+        nodes: Dict[str, List[str]] = {}
+        if context_ids:
+            for node_id, context_id in self._scroll_refs(context_ids):
+                nodes.setdefault(context_id, []).append(node_id)
+        return [[self._hit_to_result(hit, sorted(nodes.get(str(hit.id), []))) for hit in hits]
+                for hits in batches]
+
+    def _hit_to_result(self, hit, node_ids: List[str]) -> Dict[str, Any]:
+        return {
+            "id": hit.id,
+            "text": hit.payload["text"],
+            "metadata": {k: v for k, v in hit.payload.items() if k not in ("text", "node_ids")},
+            "node_ids": node_ids,
+            "score": hit.score
+        }
+
+    def _search_params(self) -> Optional[SearchParams]:
+        if self.quantization == "none":
+            return None
+        # Search the quantized vectors, then re-rank the oversampled candidates exactly
+        return SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
         )
-        return [
-            {
-                "id": hit.id,
-                "text": hit.payload["text"],
-                "metadata": {k: v for k, v in hit.payload.items() if k != "text"},
-                "score": hit.score
-            }
-            for hit in results
-        ]
 
     def delete_context(self, context_id: str):
         """Delete a context by ID"""
         self.client.delete(
             collection_name=self.collection_name,
             points_selector=[context_id]
-        ) 
\ No newline at end of file
+        )
+
+    def compact(self):
+        """Nothing to do: Qdrant's optimizer vacuums deleted points in the background"""
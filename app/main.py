@@ -1,19 +1,182 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query as QueryParam, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 import strawberry
 from strawberry.fastapi import GraphQLRouter
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-from pydantic import BaseModel
-from app.db.mock_db import MockNeo4j, MockVectorStore
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from itertools import islice
+from pydantic import BaseModel, Field
+from app.db.mock_db import MockNeo4j, MockNode, MockVectorStore
+from app.analytics.graph_analytics import GraphAnalytics
+from app.analytics.layout import IncrementalLayout
+from app.analytics.temporal_paths import TemporalPaths
+from app.analytics.statistics import GraphStatistics
+from app.db.change_feed import ChangeFeed, ChangeFeedGap
+from app.db.query_cache import QueryCache, normalize_query, is_historical
+from app.db.replication import replicate
+from app.db.sqlite_store import SQLiteGraph
+from app.db.embeddings import get_encoder, warm_up
+from app.db.property_index import PropertyIndexes, parse_index_specs
+from app.db.retention import ColdArchive, RetentionEngine
+from app.db.columnar import ColumnarGraph, export_graph, import_graph
+from app.query.cypher import CypherError
+from app.query.planner import QueryEngine
+from app.utils.executors import run_io, run_model, iterate_io, shutdown as shutdown_executors
+from app.utils.startup import Startup
+from app.utils.timestamps import to_epoch_us
+from app.utils.memory import process_rss
+from app.utils.profiling import (
+    PROFILE_HEADER, ProfilingMiddleware, SlowQueryLog, current_profile, stage, scanned, used_index
+)
+import asyncio
 import json
+import os
+import tempfile
+import threading
 
 app = FastAPI(title="Contextual Graph-Temporal DB")
 
-# Initialize mock database connections
-neo4j_db = MockNeo4j()
-vector_store = MockVectorStore()
-vector_store.init_collection()
+# CGTDB_STORAGE selects the local graph engine: "memory" (default) or "sqlite" (on disk)
+storage = os.getenv("CGTDB_STORAGE", "memory")
+if storage not in ("memory", "sqlite"):
+    raise ValueError(f"Unknown CGTDB_STORAGE {storage!r}; expected 'memory' or 'sqlite'")
+if os.getenv("CGTDB_SHARED_LOG") and storage != "memory":
+    raise ValueError("CGTDB_SHARED_LOG replicates the in-memory store; a SQLite database "
+                     "can only be served by one process")
+if os.getenv("CGTDB_RETENTION_DAYS") and os.getenv("CGTDB_SHARED_LOG"):
+    raise ValueError("CGTDB_RETENTION_DAYS cannot be combined with CGTDB_SHARED_LOG: "
+                     "every worker would archive the same versions")
+MAX_BATCH_QUERIES = int(os.getenv("CGTDB_MAX_BATCH_QUERIES", 1024))
+
+
+class Services:
+    """The stores and everything derived from them, wired together.
+
+    Opening a database or replaying a shared log can take a while, so none
+    of this is built at import: ``services()`` builds it on first use, and
+    the first warm-up step builds it ahead of that.
+    """
+
+    def __init__(self):
+        if storage == "sqlite":
+            self.neo4j_db = SQLiteGraph(
+                os.getenv("CGTDB_SQLITE_PATH", "cgtdb.sqlite3"),
+                cache_mb=int(os.getenv("CGTDB_SQLITE_CACHE_MB", 256)),
+                mmap_mb=int(os.getenv("CGTDB_SQLITE_MMAP_MB", 1024))
+            )
+        else:
+            self.neo4j_db = MockNeo4j()
+        self.vector_store = MockVectorStore(
+            encoder=get_encoder(os.getenv("CGTDB_EMBEDDING_MODEL")),
+            quantization=os.getenv("CGTDB_VECTOR_QUANTIZATION", "int8"),
+            oversampling=float(os.getenv("CGTDB_RESCORE_OVERSAMPLING", 4.0)),
+            vector_path=os.getenv("CGTDB_VECTOR_PATH")
+        )
+        if os.getenv("CGTDB_SHARED_LOG"):
+            # Multi-worker mode: every worker keeps a local replica fed from one shared write log
+            self.neo4j_db, self.vector_store = replicate(
+                os.environ["CGTDB_SHARED_LOG"], self.neo4j_db, self.vector_store
+            )
+        self.graph_analytics = GraphAnalytics(self.neo4j_db)
+        self.graph_layout = IncrementalLayout(self.neo4j_db)
+        self.temporal_paths = TemporalPaths(self.neo4j_db)
+        # Secondary property indexes, e.g. CGTDB_PROPERTY_INDEXES="Project.deadline=sorted,Project.status=hash"
+        self.property_indexes = PropertyIndexes(self.neo4j_db)
+        for label, path, kind in parse_index_specs(os.getenv("CGTDB_PROPERTY_INDEXES", "")):
+            self.property_indexes.create(label, path, kind, backfill=False)
+        self.query_engine = QueryEngine(self.neo4j_db, self.vector_store, self.property_indexes)
+        # Replicas apply the shared log in the same order, so their sequence numbers agree
+        self.change_feed = ChangeFeed(epoch=self.neo4j_db.epoch if os.getenv("CGTDB_SHARED_LOG") else None)
+        self.neo4j_db.add_listener(self.change_feed.append)
+        self.vector_store.add_listener(self.change_feed.append)
+        self.query_cache = QueryCache(
+            max_entries=int(os.getenv("CGTDB_CACHE_MAX_ENTRIES", 10000)),
+            max_bytes=int(os.getenv("CGTDB_CACHE_MAX_MB", 64)) * 1024 * 1024,
+            ttl=float(os.getenv("CGTDB_CACHE_TTL", 300))
+        )
+        self.neo4j_db.add_listener(self.query_cache.advance)
+        self.vector_store.add_listener(self.query_cache.advance)
+        # Retention: versions whose validity ended more than CGTDB_RETENTION_DAYS ago move to a
+        # compressed archive, which keeps serving as-of reads once retention is switched off again
+        archive_path = os.getenv("CGTDB_ARCHIVE_PATH", "cgtdb-archive")
+        self.archive = None
+        self.retention = None
+        if os.getenv("CGTDB_RETENTION_DAYS"):
+            self.archive = ColdArchive(archive_path)
+            self.retention = RetentionEngine(
+                self.neo4j_db, self.vector_store, self.archive,
+                retention=timedelta(days=float(os.environ["CGTDB_RETENTION_DAYS"])),
+                batch_size=int(os.getenv("CGTDB_RETENTION_BATCH", 10000)),
+                interval=float(os.getenv("CGTDB_RETENTION_INTERVAL", 3600))
+            )
+        elif os.path.isdir(archive_path):
+            self.archive = ColdArchive(archive_path)
+        # /stats rescans the store at most once per write (or per CGTDB_STATS_MAX_AGE seconds)
+        self.graph_statistics = GraphStatistics(
+            self.neo4j_db, max_age=float(os.getenv("CGTDB_STATS_MAX_AGE", 60))
+        )
+
+
+_services: Optional[Services] = None
+_services_lock = threading.Lock()
+
+
+def services() -> Services:
+    global _services
+    if _services is None:
+        with _services_lock:
+            if _services is None:
+                _services = Services()
+    return _services
+
+
+def _start_retention():
+    retention = services().retention
+    if retention is not None:
+        retention.start()
+
+# Nothing heavy happens at import: the stores, the embedding model, property index
+# backfills and temporal path lists are built on first use, or ahead of it by the
+# warm-up steps in CGTDB_WARMUP (comma-separated, "none" to skip) that run after the
+# stores are built and before /ready reports ready
+WARMUP_STEPS = {
+    "embedding_model": lambda: warm_up(services().vector_store.encoder, int(os.getenv("CGTDB_WARMUP_BATCH", 32))),
+    "property_indexes": lambda: services().property_indexes.backfill(),
+    "temporal_paths": lambda: services().temporal_paths.load()
+}
+startup = Startup()
+startup.add("services", services)
+startup.add("vector_collection", lambda: services().vector_store.init_collection())
+if os.getenv("CGTDB_RETENTION_DAYS"):
+    startup.add("retention", _start_retention)
+for step in filter(None, (part.strip() for part in os.getenv("CGTDB_WARMUP", ",".join(WARMUP_STEPS)).split(","))):
+    if step == "none":
+        continue
+    if step not in WARMUP_STEPS:
+        raise ValueError(f"Unknown CGTDB_WARMUP step {step!r}; expected some of {', '.join(WARMUP_STEPS)}")
+    startup.add(step, WARMUP_STEPS[step])
+
+# Profiling: a CGTDB_SLOW_QUERY_SAMPLE fraction of requests is profiled and those
+# slower than CGTDB_SLOW_QUERY_MS are kept in the slow-query log
+slow_query_log = SlowQueryLog(
+    threshold=float(os.getenv("CGTDB_SLOW_QUERY_MS", 500)) / 1000,
+    sample_rate=float(os.getenv("CGTDB_SLOW_QUERY_SAMPLE", 0.01)),
+    capacity=int(os.getenv("CGTDB_SLOW_QUERY_LOG_SIZE", 1000))
+)
+
+@app.on_event("startup")
+def start_background_work():
+    startup.start()
+
+@app.on_event("shutdown")
+def stop_background_work():
+    if _services is not None and _services.retention is not None:
+        _services.retention.stop()
+    shutdown_executors()
 
 # Enable CORS
 app.add_middleware(
@@ -22,7 +185,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PROFILE_HEADER, "Server-Timing"],
 )
+# Outermost, so request durations include every other middleware
+app.add_middleware(ProfilingMiddleware, log=slow_query_log)
 
 # Base Pydantic models
 class NodeBase(BaseModel):
@@ -43,7 +209,20 @@ class EdgeBase(BaseModel):
 
 class ContextSearch(BaseModel):
     query_text: str
-    limit: Optional[int] = 5
+    limit: int = Field(default=5, ge=1)
+
+class BatchContextSearch(BaseModel):
+    queries: List[str]
+    limit: int = Field(default=5, ge=1)
+
+class CypherRequest(BaseModel):
+    query: str
+    parameters: Optional[Dict[str, Any]] = None
+
+class IndexDefinition(BaseModel):
+    label: Optional[str] = None  # None indexes nodes of every label
+    path: str  # a property ("budget") or a context key ("context.domain")
+    kind: str = "hash"  # "hash" for equality, "sorted" for equality and ranges
 
 class NodeResponse(BaseModel):
     id: str
@@ -54,23 +233,21 @@ class NodeResponse(BaseModel):
     context: dict
 
 # REST Endpoints
+# Handlers never call the stores directly: storage calls go to the I/O pool and
+# anything that runs the embedding model goes to the model pool (app.utils.executors).
 @app.post("/nodes/", response_model=str)
 async def create_node(node: NodeBase):
     try:
-        node_id = neo4j_db.create_node(
+        node_id = await run_io(
+            services().neo4j_db.create_node,
             label=node.label,
             properties=node.properties,
             valid_from=node.valid_from,
             valid_to=node.valid_to,
             context=node.context
         )
-        # Store context in vector store
-        context_text = str(node.context)
-        vector_store.store_context(
-            context_id=str(node_id),
-            context_text=context_text,
-            metadata={"node_id": node_id, "label": node.label}
-        )
+        # Link the node to its context; identical contexts share one stored vector
+        await run_model(services().vector_store.attach_context, str(node_id), node.context)
         return node_id
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -78,18 +255,20 @@ async def create_node(node: NodeBase):
 @app.get("/nodes/all", response_model=List[NodeResponse])
 async def get_all_nodes():
     """Get all nodes in the database"""
-    try:
-        nodes = []
-        for node_id, node in neo4j_db.nodes.items():
-            nodes.append(NodeResponse(
+    def collect():
+        return jsonable_encoder([
+            NodeResponse(
                 id=node.id,
                 label=node.labels[0],
                 properties=node.properties,
                 valid_from=node.valid_from,
                 valid_to=node.valid_to,
                 context=node.context
-            ))
-        return nodes
+            )
+            for node in services().neo4j_db.iter_nodes()
+        ])
+    try:
+        return JSONResponse(content=await run_io(collect))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -97,14 +276,17 @@ async def get_all_nodes():
 async def get_all_relationships():
     """Get all relationships in the database"""
     try:
-        return neo4j_db.relationships
+        return JSONResponse(content=await run_io(
+            lambda: jsonable_encoder(list(services().neo4j_db.iter_relationships()))
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/relationships/")
 async def create_relationship(edge: EdgeBase):
     try:
-        neo4j_db.create_relationship(
+        await run_io(
+            services().neo4j_db.create_relationship,
             source_id=edge.source_id,
             target_id=edge.target_id,
             rel_type=edge.type,
@@ -117,34 +299,470 @@ async def create_relationship(edge: EdgeBase):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _node_response(node_id: str, timestamp: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    built = services()
+    with stage("store"):
+        node = built.neo4j_db.get_node(node_id, timestamp)
+    scanned(1)
+    used_index("node id")
+    if not node and built.archive is not None:
+        # Archived versions are still served, decompressed from their partition
+        with stage("archive"):
+            node = built.archive.get_node(node_id, timestamp)
+    if not node:
+        return None
+    return NodeResponse(
+        id=node.id,
+        label=node.labels[0],
+        properties=node.properties,
+        valid_from=node.valid_from,
+        valid_to=node.valid_to,
+        context=node.context
+    ).model_dump()
+
 @app.get("/nodes/{node_id}", response_model=NodeResponse)
 async def get_node(node_id: str, timestamp: Optional[datetime] = None):
     try:
-        node = neo4j_db.get_node(node_id, timestamp)
-        if not node:
-            raise HTTPException(status_code=404, detail="Node not found")
-        return NodeResponse(
-            id=node.id,
-            label=node.labels[0],
-            properties=node.properties,
-            valid_from=node.valid_from,
-            valid_to=node.valid_to,
-            context=node.context
+        # Nodes are never modified in place, so as-of reads in the past are cached indefinitely
+        node = await services().query_cache.get_or_compute_async(
+            ("node", node_id, timestamp.isoformat() if timestamp else None),
+            lambda: run_io(_node_response, node_id, timestamp),
+            pinned=is_historical(timestamp)
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return node
 
 @app.post("/contexts/search/")
 async def search_contexts(search: ContextSearch):
     try:
-        results = vector_store.find_similar_contexts(
-            query_text=search.query_text,
-            limit=search.limit
+        query_text = normalize_query(search.query_text)
+        results = await services().query_cache.get_or_compute_async(
+            ("search", query_text, search.limit),
+            lambda: run_model(
+                services().vector_store.find_similar_contexts,
+                query_text=query_text,
+                limit=search.limit
+            )
         )
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/contexts/search/batch")
+async def search_contexts_batch(search: BatchContextSearch):
+    """Top-k similar contexts for each query, in request order.
+
+    Cached queries are answered from the query cache; the rest are encoded
+    in one batch and searched together.
+    """
+    if len(search.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        query_cache = services().query_cache
+        query_texts = [normalize_query(text) for text in search.queries]
+        results: Dict[str, Any] = {}
+        for text in query_texts:
+            found, value = query_cache.get(("search", text, search.limit))
+            if found:
+                results[text] = value
+        missing = list(dict.fromkeys(text for text in query_texts if text not in results))
+        if missing:
+            generation = query_cache.generation
+            computed = await run_model(
+                services().vector_store.find_similar_contexts_batch,
+                query_texts=missing,
+                limit=search.limit
+            )
+            for text, value in zip(missing, computed):
+                results[text] = value
+                query_cache.put(("search", text, search.limit), value, generation)
+        return [results[text] for text in query_texts]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit rate and memory usage of the query result cache"""
+    return services().query_cache.stats()
+
+# Graph analytics endpoints (cached until the next write)
+@app.get("/analytics/pagerank")
+async def analytics_pagerank(timestamp: Optional[datetime] = None, rel_type: Optional[str] = None,
+                             damping: float = 0.85,
+                             limit: int = QueryParam(default=20, ge=1, le=10_000)):
+    if not 0 < damping < 1:
+        raise HTTPException(status_code=400, detail="damping must be between 0 and 1 (exclusive)")
+    try:
+        return await run_io(services().graph_analytics.pagerank, timestamp, rel_type, damping=damping, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/components")
+async def analytics_components(timestamp: Optional[datetime] = None,
+                               rel_type: Optional[str] = None,
+                               limit: int = QueryParam(default=20, ge=1, le=10_000)):
+    try:
+        return await run_io(services().graph_analytics.components, timestamp, rel_type, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/degrees")
+async def analytics_degrees(timestamp: Optional[datetime] = None, rel_type: Optional[str] = None):
+    try:
+        return await run_io(services().graph_analytics.degrees, timestamp, rel_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/shortest-path")
+async def analytics_shortest_path(source_id: str, target_id: str,
+                                  timestamp: Optional[datetime] = None,
+                                  rel_type: Optional[str] = None, directed: bool = False):
+    try:
+        path = await run_io(services().graph_analytics.shortest_path, source_id, target_id, timestamp,
+                            rel_type, directed=directed)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail="No path found")
+    return {"path": path, "length": len(path) - 1}
+
+# Visualization endpoints: laid-out subgraphs and level-of-detail views
+@app.get("/graph/neighbourhood/{node_id}")
+async def graph_neighbourhood(node_id: str, depth: int = 1, limit: int = 500,
+                              timestamp: Optional[datetime] = None):
+    try:
+        view = await run_io(services().graph_layout.neighbourhood, node_id, depth=depth, limit=limit,
+                            timestamp=timestamp)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if view is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return view
+
+@app.get("/graph/overview")
+async def graph_overview(mode: str = "sample", max_nodes: int = 500, resolution: int = 20,
+                         timestamp: Optional[datetime] = None, rel_type: Optional[str] = None):
+    if mode not in ("sample", "aggregate"):
+        raise HTTPException(status_code=400, detail="mode must be 'sample' or 'aggregate'")
+    try:
+        def build():
+            csr = services().graph_analytics.csr(timestamp, rel_type)
+            if mode == "sample":
+                return services().graph_layout.sample(csr, max_nodes=max_nodes)
+            return services().graph_layout.aggregate(csr, resolution=resolution)
+        return await run_io(build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Temporal paths: time-respecting routes over relationship validity intervals
+TEMPORAL_PATH_MODES = {
+    "earliest-arrival": "earliest_arrival",
+    "latest-departure": "latest_departure",
+    "fastest": "fastest"
+}
+
+@app.get("/temporal/paths/{mode}")
+async def temporal_path(mode: str, source_id: str, target_id: str,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        max_depth: Optional[int] = None,
+                        rel_type: Optional[List[str]] = QueryParam(default=None)):
+    """Earliest-arrival, latest-departure or fastest path whose traversals are in chronological order"""
+    if mode not in TEMPORAL_PATH_MODES:
+        raise HTTPException(status_code=400,
+                            detail=f"mode must be one of {', '.join(TEMPORAL_PATH_MODES)}")
+    try:
+        return await run_io(getattr(services().temporal_paths, TEMPORAL_PATH_MODES[mode]),
+                            source_id, target_id, start=start, end=end,
+                            max_depth=max_depth, rel_types=rel_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/temporal/reachable/{node_id}")
+async def temporal_reachable(node_id: str, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None, max_depth: Optional[int] = None,
+                             rel_type: Optional[List[str]] = QueryParam(default=None),
+                             limit: int = 1000):
+    """Nodes reachable from node_id after start, with their earliest arrival times"""
+    try:
+        return await run_io(services().temporal_paths.reachable, node_id, start=start, end=end,
+                            max_depth=max_depth, rel_types=rel_type, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Secondary property indexes, used by the /query planner
+@app.get("/indexes")
+async def list_indexes():
+    return services().property_indexes.describe()
+
+@app.post("/indexes")
+async def create_index(definition: IndexDefinition):
+    """Declare an index and backfill it; it is maintained on every later write"""
+    try:
+        index = await run_io(services().property_indexes.create, definition.label, definition.path, definition.kind)
+        return index.describe()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/indexes")
+async def drop_index(path: str, label: Optional[str] = None):
+    if not services().property_indexes.drop(label, path):
+        raise HTTPException(status_code=404, detail="Index not found")
+    return {"dropped": f"{label or '*'}.{path}"}
+
+# Ad-hoc queries in a Cypher subset
+def _record_query_usage(prepared):
+    profile = current_profile()
+    if profile is not None:
+        usage = prepared.usage()
+        profile.scanned(usage["rows_scanned"])
+        for index in usage["indexes"]:
+            profile.used_index(index)
+
+def _query_result(prepared, run):
+    try:
+        with stage("execute"):
+            return run()
+    finally:
+        _record_query_usage(prepared)
+
+def _query_chunks(prepared):
+    """The streamed result; what the query read is added to the request's profile at the end"""
+    try:
+        with stage("execute"):
+            yield from prepared.json_chunks()
+    finally:
+        _record_query_usage(prepared)
+
+@app.post("/query")
+async def run_query(request: CypherRequest):
+    """Run [EXPLAIN|PROFILE] MATCH ... [WHERE ...] RETURN ... [SKIP n] [LIMIT n].
+
+    Plain queries stream their rows as they are produced; EXPLAIN returns the
+    plan without running it and PROFILE runs it and adds per-operator row
+    counts and timings.
+    """
+    profile = current_profile()
+    if profile is not None:
+        profile.details["statement"] = request.query
+    try:
+        with stage("plan"):
+            prepared = await run_io(services().query_engine.prepare, request.query, request.parameters)
+        if prepared.mode == "EXPLAIN":
+            return prepared.explain()
+        if prepared.mode == "PROFILE":
+            return await run_io(_query_result, prepared, prepared.profile)
+        if profile is not None and profile.requested:
+            # Profile headers go out before the body, so run the query to completion first
+            body = await run_io(_query_result, prepared, lambda: "".join(prepared.json_chunks()))
+            return Response(body, media_type="application/json")
+    except CypherError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(iterate_io(lambda: _query_chunks(prepared)), media_type="application/json")
+
+# Capacity planning: memory, cardinalities, validity and slow requests
+@app.get("/stats")
+async def store_stats(sample: int = QueryParam(default=256, ge=1, le=100_000)):
+    """Estimated memory per structure, cardinalities and validity distributions.
+
+    Memory estimates extrapolate from ``sample`` items per container; the
+    cardinalities come from a full scan that is reused until the next write.
+    """
+    def collect():
+        built = services()
+        structures = {
+            "graph": built.neo4j_db,
+            "vectors": built.vector_store,
+            "property_indexes": built.property_indexes,
+            "temporal_paths": built.temporal_paths,
+            "analytics_cache": built.graph_analytics,
+            "layout": built.graph_layout,
+            "query_cache": built.query_cache,
+            "change_feed": built.change_feed
+        }
+        memory = {name: structure.memory_bytes(sample) for name, structure in structures.items()}
+        graph = dict(built.graph_statistics.collect())
+        graph["cardinalities"] = {**graph["cardinalities"], "contexts": len(built.vector_store.contexts)}
+        return {
+            "memory": {"process_rss": process_rss(), "structures": memory},
+            **graph,
+            "slow_queries": slow_query_log.stats()
+        }
+    try:
+        return jsonable_encoder(await run_io(collect))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/stats/slow-queries")
+async def slow_queries(limit: int = QueryParam(default=100, ge=1, le=10_000)):
+    """Sampled requests slower than CGTDB_SLOW_QUERY_MS, newest first, with their profiles"""
+    return {**slow_query_log.stats(), "requests": slow_query_log.entries(limit)}
+
+@app.delete("/stats/slow-queries")
+async def clear_slow_queries():
+    slow_query_log.clear()
+    return {"cleared": True}
+
+# Retention and the cold archive of expired versions
+@app.get("/retention")
+async def retention_status():
+    """Retention policy, progress of the background engine and archive size"""
+    retention = services().retention
+    if retention is None:
+        raise HTTPException(status_code=404, detail="Retention is not enabled; set CGTDB_RETENTION_DAYS")
+    try:
+        return await run_io(retention.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/retention/run")
+async def run_retention(cutoff: Optional[datetime] = None):
+    """Archive versions that expired by cutoff (default: now minus the retention period) now"""
+    retention = services().retention
+    if retention is None:
+        raise HTTPException(status_code=404, detail="Retention is not enabled; set CGTDB_RETENTION_DAYS")
+    # Versions still valid now would be archived while current
+    if cutoff is not None and to_epoch_us(cutoff)[0] > to_epoch_us(datetime.now(timezone.utc))[0]:
+        raise HTTPException(status_code=400, detail="cutoff must not be later than now")
+    try:
+        return await run_io(retention.run_once, cutoff)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/archive/nodes", response_model=List[NodeResponse])
+async def get_archived_nodes(timestamp: datetime, label: Optional[str] = None, limit: int = 1000):
+    """Archived nodes valid at timestamp"""
+    archive = services().archive
+    if archive is None:
+        raise HTTPException(status_code=404, detail="No archive")
+    def collect():
+        return jsonable_encoder([
+            NodeResponse(
+                id=node.id,
+                label=node.labels[0],
+                properties=node.properties,
+                valid_from=node.valid_from,
+                valid_to=node.valid_to,
+                context=node.context
+            )
+            for node in islice(archive.nodes_valid_at(timestamp, label), limit)
+        ])
+    try:
+        return JSONResponse(content=await run_io(collect))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/archive/relationships/{node_id}")
+async def get_archived_relationships(node_id: str, direction: str = "both",
+                                     timestamp: Optional[datetime] = None):
+    """Archived relationships of a node, optionally only those valid at timestamp"""
+    archive = services().archive
+    if archive is None:
+        raise HTTPException(status_code=404, detail="No archive")
+    if direction not in ("out", "in", "both"):
+        raise HTTPException(status_code=400, detail="direction must be 'out', 'in' or 'both'")
+    try:
+        return JSONResponse(content=jsonable_encoder(
+            await run_io(archive.get_relationships, node_id, direction, timestamp)
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk transfer in the columnar binary format (app/db/columnar.py)
+@app.get("/export/columnar")
+async def export_columnar(timestamp: Optional[datetime] = None):
+    """Every node and relationship, or the versions valid at timestamp, as one binary file"""
+    def write() -> str:
+        fd, path = tempfile.mkstemp(prefix="cgtdb-export-", suffix=".cgtc")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                export_graph(services().neo4j_db, out, timestamp)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+    try:
+        path = await run_io(write)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return FileResponse(path, media_type="application/octet-stream", filename="graph.cgtc",
+                        background=BackgroundTask(os.remove, path))
+
+@app.post("/import/columnar")
+async def import_columnar(request: Request):
+    """Load a columnar export sent as the raw request body; existing node ids are skipped"""
+    fd, path = tempfile.mkstemp(prefix="cgtdb-import-", suffix=".cgtc")
+    loop = asyncio.get_running_loop()
+
+    def attach_contexts(nodes: List[MockNode]):
+        for node in nodes:
+            services().vector_store.attach_context(node.id, node.context)
+
+    def attach(nodes: List[MockNode]):
+        # Called on the I/O thread; encoding belongs on the model pool
+        asyncio.run_coroutine_threadsafe(run_model(attach_contexts, nodes), loop).result()
+
+    def load() -> Dict[str, int]:
+        with ColumnarGraph(path) as source:
+            return import_graph(services().neo4j_db, source, attach)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in request.stream():
+                await run_io(out.write, chunk)
+        return await run_io(load)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(path)
+
+# Change feed: incremental sync by sequence number
+@app.get("/changes")
+async def get_changes(since: int = QueryParam(default=0, ge=0), limit: int = QueryParam(default=1000, ge=0),
+                      epoch: Optional[str] = None):
+    """Page of node, relationship and context changes after sequence number since.
+
+    Pass the epoch of the previous page so that positions from before a restart are detected.
+    """
+    try:
+        return Response(content=services().change_feed.page_json(since, limit=limit, epoch=epoch),
+                        media_type="application/json")
+    except ChangeFeedGap as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+@app.get("/changes/head")
+async def changes_head():
+    """Newest and oldest retained sequence numbers, to check for changes without reading events"""
+    change_feed = services().change_feed
+    return {"epoch": change_feed.epoch, "head_seq": change_feed.last_seq, "first_seq": change_feed.first_seq}
+
+@app.get("/changes/stream")
+async def stream_changes(since: Optional[int] = QueryParam(default=None, ge=0), epoch: Optional[str] = None,
+                         last_event_id: Optional[str] = Header(default=None)):
+    """Server-sent events of changes; resumes from Last-Event-ID (``<epoch>-<seq>``) after a disconnect"""
+    resume_epoch, _, resume_seq = (last_event_id or "").rpartition("-")
+    if resume_seq.isdigit():
+        # A reconnect repeats the original URL, so the event id takes precedence over since
+        since, epoch = int(resume_seq), resume_epoch or None
+    change_feed = services().change_feed
+    if since is None:
+        since = change_feed.last_seq
+    # The slot itself is taken when the stream starts; this only turns clients away early
+    if change_feed.full():
+        raise HTTPException(status_code=503, detail="Too many change feed subscribers")
+    return StreamingResponse(
+        change_feed.stream_sse(since, epoch),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # GraphQL types
 @strawberry.type
 class Node:
@@ -165,12 +783,42 @@ class Edge:
     valid_to: Optional[str]
     context: str
 
+@strawberry.enum
+class TemporalPathMode(Enum):
+    EARLIEST_ARRIVAL = "earliest-arrival"
+    LATEST_DEPARTURE = "latest-departure"
+    FASTEST = "fastest"
+
+@strawberry.type
+class TemporalStep:
+    source_id: str
+    target_id: str
+    type: str
+    properties: str
+    valid_from: str
+    valid_to: Optional[str]
+    traversed_at: str
+
+@strawberry.type
+class TemporalPath:
+    source_id: str
+    target_id: str
+    reachable: bool
+    departure: Optional[str]
+    arrival: Optional[str]
+    duration_seconds: Optional[float]
+    hops: Optional[int]
+    path: List[TemporalStep]
+
 # GraphQL Query type
 @strawberry.type
 class Query:
     @strawberry.field
-    def get_node(self, id: str) -> Optional[Node]:
-        node = neo4j_db.get_node(id)
+    async def get_node(self, id: str) -> Optional[Node]:
+        built = services()
+        node = await run_io(built.neo4j_db.get_node, id)
+        if not node and built.archive is not None:
+            node = await run_io(built.archive.get_node, id)
         if not node:
             return None
         return Node(
@@ -183,27 +831,87 @@ class Query:
         )
 
     @strawberry.field
-    def get_nodes(self, label: Optional[str] = None) -> List[Node]:
-        nodes = []
-        for node in neo4j_db.nodes.values():
-            if not label or label in node.labels:
-                nodes.append(Node(
-                    id=str(node.id),
-                    label=node.labels[0],
-                    properties=json.dumps(node.properties),
-                    valid_from=node.valid_from.isoformat(),
-                    valid_to=node.valid_to.isoformat() if node.valid_to else None,
-                    context=json.dumps(node.context)
-                ))
-        return nodes
-
-# GraphQL schema
-schema = strawberry.Schema(query=Query)
-
-# Add GraphQL endpoint
-graphql_app = GraphQLRouter(schema)
+    async def get_nodes(self, label: Optional[str] = None) -> List[Node]:
+        def collect():
+            nodes = []
+            for node in services().neo4j_db.iter_nodes():
+                if not label or label in node.labels:
+                    nodes.append(Node(
+                        id=str(node.id),
+                        label=node.labels[0],
+                        properties=json.dumps(node.properties),
+                        valid_from=node.valid_from.isoformat(),
+                        valid_to=node.valid_to.isoformat() if node.valid_to else None,
+                        context=json.dumps(node.context)
+                    ))
+            return nodes
+        return await run_io(collect)
+
+    @strawberry.field
+    async def temporal_path(self, source_id: str, target_id: str,
+                            mode: TemporalPathMode = TemporalPathMode.EARLIEST_ARRIVAL,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            max_depth: Optional[int] = None,
+                            rel_types: Optional[List[str]] = None) -> TemporalPath:
+        result = await run_io(getattr(services().temporal_paths, TEMPORAL_PATH_MODES[mode.value]),
+                              source_id, target_id, start=start,
+                              end=end, max_depth=max_depth, rel_types=rel_types)
+        return TemporalPath(
+            source_id=result["source_id"],
+            target_id=result["target_id"],
+            reachable=result["reachable"],
+            departure=result["departure"].isoformat() if result["departure"] else None,
+            arrival=result["arrival"].isoformat() if result["arrival"] else None,
+            duration_seconds=result["duration_seconds"],
+            hops=result["hops"],
+            path=[
+                TemporalStep(
+                    source_id=step["source_id"],
+                    target_id=step["target_id"],
+                    type=step["type"],
+                    properties=json.dumps(step["properties"]),
+                    valid_from=step["valid_from"].isoformat(),
+                    valid_to=step["valid_to"].isoformat() if step["valid_to"] else None,
+                    traversed_at=step["traversed_at"].isoformat()
+                )
+                for step in result["path"]
+            ]
+        )
+
+# GraphQL schema, built on first use like the stores
+class LazyGraphQLRouter(GraphQLRouter):
+    """GraphQL router whose schema is built by the first request that needs it"""
+
+    def __init__(self, build_schema, **kwargs):
+        self._schema = None
+        self._build_schema = build_schema
+        self._schema_lock = threading.Lock()
+        super().__init__(None, **kwargs)
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            with self._schema_lock:
+                if self._schema is None:
+                    self._schema = self._build_schema()
+        return self._schema
+
+    @schema.setter
+    def schema(self, value):
+        self._schema = value
+
+# GraphQL endpoint
+graphql_app = LazyGraphQLRouter(lambda: strawberry.Schema(query=Query))
 app.include_router(graphql_app, prefix="/graphql")
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to Contextual Graph-Temporal DB"} 
\ No newline at end of file
+    return {"message": "Welcome to Contextual Graph-Temporal DB"}
+
+@app.get("/ready")
+def readiness():
+    """200 once the warm-up steps finished, 503 (with their progress) until then"""
+    status = jsonable_encoder(startup.status())
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status 
\ No newline at end of file
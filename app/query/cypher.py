@@ -0,0 +1,668 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Tuple
+import inspect
+import operator
+import re
+
+
+class CypherError(ValueError):
+    """A query outside the supported Cypher subset, or one that cannot be parsed"""
+
+
+# Expressions
+
+class Expr(ABC):
+    @abstractmethod
+    def evaluate(self, row: Dict[str, Any], params: Dict[str, Any]) -> Any:
+        ...
+
+    def variables(self) -> set:
+        return set()
+
+
+@dataclass
+class Literal(Expr):
+    value: Any
+
+    def evaluate(self, row, params):
+        return self.value
+
+    def __str__(self):
+        if isinstance(self.value, datetime):
+            return f"datetime('{self.value.isoformat()}')"
+        return repr(self.value)
+
+
+@dataclass
+class Param(Expr):
+    name: str
+
+    def evaluate(self, row, params):
+        if self.name not in params:
+            raise CypherError(f"Missing parameter ${self.name}")
+        return params[self.name]
+
+    def __str__(self):
+        return f"${self.name}"
+
+
+@dataclass
+class Variable(Expr):
+    name: str
+
+    def evaluate(self, row, params):
+        return row.get(self.name)
+
+    def variables(self):
+        return {self.name}
+
+    def __str__(self):
+        return self.name
+
+
+# Node and relationship attributes that are not user properties
+NODE_FIELDS = ("id", "label", "valid_from", "valid_to", "context")
+REL_FIELDS = ("source_id", "target_id", "type", "valid_from", "valid_to", "context")
+
+
+def entity_field(entity: Any, key: str) -> Any:
+    """A top-level attribute of a node (MockNode), relationship (dict) or map"""
+    if entity is None:
+        return None
+    if isinstance(entity, dict):
+        if "source_id" in entity and "properties" in entity:
+            if key in REL_FIELDS:
+                return entity.get(key)
+            return entity["properties"].get(key)
+        return entity.get(key)
+    if key == "label":
+        return entity.labels[0] if entity.labels else None
+    if key in NODE_FIELDS:
+        return getattr(entity, key)
+    return entity.properties.get(key)
+
+
+@dataclass
+class Property(Expr):
+    """var.key.subkey..., e.g. n.name or n.context.domain"""
+    var: str
+    path: Tuple[str, ...]
+
+    def evaluate(self, row, params):
+        value = entity_field(row.get(self.var), self.path[0])
+        for key in self.path[1:]:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    def variables(self):
+        return {self.var}
+
+    def __str__(self):
+        return ".".join((self.var,) + self.path)
+
+
+@dataclass
+class MapLiteral(Expr):
+    items: Dict[str, Expr]
+
+    def evaluate(self, row, params):
+        return {key: value.evaluate(row, params) for key, value in self.items.items()}
+
+    def variables(self):
+        return set().union(*(value.variables() for value in self.items.values()))
+
+    def __str__(self):
+        return "{" + ", ".join(f"{key}: {value}" for key, value in self.items.items()) + "}"
+
+
+@dataclass
+class ListLiteral(Expr):
+    items: List[Expr]
+
+    def evaluate(self, row, params):
+        return [item.evaluate(row, params) for item in self.items]
+
+    def variables(self):
+        return set().union(*(item.variables() for item in self.items))
+
+    def __str__(self):
+        return "[" + ", ".join(map(str, self.items)) + "]"
+
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise CypherError(f"Invalid datetime {value!r}")
+
+
+FUNCTIONS = {
+    "datetime": lambda value=None: datetime.now(timezone.utc) if value is None else _parse_datetime(value),
+    "id": lambda entity: entity_field(entity, "id"),
+    "type": lambda rel: entity_field(rel, "type"),
+    "labels": lambda node: list(node.labels) if node is not None else None,
+    "tolower": lambda value: value.lower() if isinstance(value, str) else None,
+    "toupper": lambda value: value.upper() if isinstance(value, str) else None,
+    "coalesce": lambda value, *values: next((v for v in (value, *values) if v is not None), None),
+}
+
+
+def _utc(value: Any) -> Any:
+    """Aware datetimes as naive UTC, as the stores treat naive ones, so the two kinds compare"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass
+class Function(Expr):
+    name: str
+    args: List[Expr]
+
+    def evaluate(self, row, params):
+        return FUNCTIONS[self.name](*(arg.evaluate(row, params) for arg in self.args))
+
+    def variables(self):
+        return set().union(*(arg.variables() for arg in self.args))
+
+    def __str__(self):
+        return f"{self.name}({', '.join(map(str, self.args))})"
+
+
+_COMPARISONS = {
+    "=": operator.eq, "<>": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+@dataclass
+class Compare(Expr):
+    op: str
+    left: Expr
+    right: Expr
+
+    def evaluate(self, row, params):
+        left = _utc(self.left.evaluate(row, params))
+        right = _utc(self.right.evaluate(row, params))
+        if left is None or right is None:
+            return None
+        try:
+            return _COMPARISONS[self.op](left, right)
+        except TypeError:
+            # Incomparable values (e.g. a string and a number) never match
+            return None
+
+    def variables(self):
+        return self.left.variables() | self.right.variables()
+
+    def __str__(self):
+        return f"{self.left} {self.op} {self.right}"
+
+
+@dataclass
+class StringMatch(Expr):
+    op: str  # "STARTS WITH", "ENDS WITH" or "CONTAINS"
+    left: Expr
+    right: Expr
+
+    def evaluate(self, row, params):
+        left = self.left.evaluate(row, params)
+        right = self.right.evaluate(row, params)
+        if not isinstance(left, str) or not isinstance(right, str):
+            return None
+        if self.op == "STARTS WITH":
+            return left.startswith(right)
+        if self.op == "ENDS WITH":
+            return left.endswith(right)
+        return right in left
+
+    def variables(self):
+        return self.left.variables() | self.right.variables()
+
+    def __str__(self):
+        return f"{self.left} {self.op} {self.right}"
+
+
+@dataclass
+class In(Expr):
+    item: Expr
+    collection: Expr
+
+    def evaluate(self, row, params):
+        item = _utc(self.item.evaluate(row, params))
+        collection = self.collection.evaluate(row, params)
+        if item is None or collection is None:
+            return None
+        if isinstance(item, datetime):
+            collection = [_utc(value) for value in collection]
+        return item in collection
+
+    def variables(self):
+        return self.item.variables() | self.collection.variables()
+
+    def __str__(self):
+        return f"{self.item} IN {self.collection}"
+
+
+@dataclass
+class IsNull(Expr):
+    operand: Expr
+    negated: bool = False
+
+    def evaluate(self, row, params):
+        return (self.operand.evaluate(row, params) is None) != self.negated
+
+    def variables(self):
+        return self.operand.variables()
+
+    def __str__(self):
+        return f"{self.operand} IS {'NOT ' if self.negated else ''}NULL"
+
+
+@dataclass
+class Not(Expr):
+    operand: Expr
+
+    def evaluate(self, row, params):
+        value = self.operand.evaluate(row, params)
+        return None if value is None else not value
+
+    def variables(self):
+        return self.operand.variables()
+
+    def __str__(self):
+        return f"NOT ({self.operand})"
+
+
+@dataclass
+class And(Expr):
+    operands: List[Expr]
+
+    def evaluate(self, row, params):
+        # Three-valued logic: false wins over null
+        result = True
+        for operand in self.operands:
+            value = operand.evaluate(row, params)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    def variables(self):
+        return set().union(*(operand.variables() for operand in self.operands))
+
+    def __str__(self):
+        return " AND ".join(f"({operand})" for operand in self.operands)
+
+
+@dataclass
+class Or(Expr):
+    operands: List[Expr]
+
+    def evaluate(self, row, params):
+        result = False
+        for operand in self.operands:
+            value = operand.evaluate(row, params)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    def variables(self):
+        return set().union(*(operand.variables() for operand in self.operands))
+
+    def __str__(self):
+        return " OR ".join(f"({operand})" for operand in self.operands)
+
+
+# Patterns and queries
+
+@dataclass
+class NodePattern:
+    var: str
+    label: Optional[str] = None
+    properties: Dict[str, Expr] = field(default_factory=dict)
+
+
+@dataclass
+class RelPattern:
+    var: str
+    types: List[str] = field(default_factory=list)
+    direction: str = "out"  # "out" (a)-->(b), "in" (a)<--(b) or "both" (a)--(b)
+    properties: Dict[str, Expr] = field(default_factory=dict)
+
+
+@dataclass
+class Pattern:
+    """A chain (n0)-[r0]-(n1)-[r1]-...; rels[i] joins nodes[i] and nodes[i + 1]"""
+    nodes: List[NodePattern]
+    rels: List[RelPattern]
+
+
+@dataclass
+class ReturnItem:
+    expr: Expr
+    alias: str
+
+
+@dataclass
+class CypherQuery:
+    mode: Optional[str]  # None, "EXPLAIN" or "PROFILE"
+    patterns: List[Pattern]
+    where: Optional[Expr]
+    returns: List[ReturnItem]
+    distinct: bool = False
+    skip: Optional[Expr] = None
+    limit: Optional[Expr] = None
+    parameters: set = field(default_factory=set)
+
+
+# Tokenizer
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|//[^\n]*)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d*|\.\d+|\d+)
+  | (?P<param>\$\w+)
+  | (?P<name>[A-Za-z_]\w*|`[^`]+`)
+  | (?P<op><=|>=|<>|!=|\.\.|[-<>=()\[\]{}:,.|*+])
+""", re.VERBOSE)
+
+KEYWORDS = {
+    "MATCH", "WHERE", "RETURN", "LIMIT", "SKIP", "AND", "OR", "NOT", "IS", "NULL",
+    "TRUE", "FALSE", "IN", "STARTS", "ENDS", "WITH", "CONTAINS", "AS", "EXPLAIN",
+    "PROFILE", "DISTINCT", "XOR", "ORDER", "BY", "OPTIONAL", "CREATE", "MERGE",
+    "DELETE", "SET", "REMOVE", "UNWIND", "CALL", "UNION",
+}
+
+_UNSUPPORTED = {"ORDER", "OPTIONAL", "CREATE", "MERGE", "DELETE", "SET", "REMOVE",
+                "UNWIND", "CALL", "UNION", "XOR"}
+
+_ESCAPES = {"n": "\n", "t": "\t", "\\": "\\", "'": "'", '"': '"'}
+
+
+@dataclass
+class Token:
+    kind: str  # "string", "number", "param", "name", "keyword", "op" or "end"
+    value: Any
+    position: int
+
+
+def tokenize(text: str) -> List[Token]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise CypherError(f"Unexpected character {text[position]!r} at position {position}")
+        kind = match.lastgroup
+        raw = match.group()
+        if kind == "string":
+            value = re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), raw[1:-1])
+            tokens.append(Token("string", value, position))
+        elif kind == "number":
+            tokens.append(Token("number", float(raw) if "." in raw else int(raw), position))
+        elif kind == "param":
+            tokens.append(Token("param", raw[1:], position))
+        elif kind == "name":
+            if raw.startswith("`"):
+                tokens.append(Token("name", raw[1:-1], position))
+            elif raw.upper() in KEYWORDS:
+                tokens.append(Token("keyword", raw.upper(), position))
+            else:
+                tokens.append(Token("name", raw, position))
+        elif kind == "op":
+            tokens.append(Token("op", "<>" if raw == "!=" else raw, position))
+        position = match.end()
+    tokens.append(Token("end", None, len(text)))
+    return tokens
+
+
+# Parser
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.i = 0
+        self._anonymous = 0
+        self.parameters: set = set()
+
+    @property
+    def token(self) -> Token:
+        return self.tokens[self.i]
+
+    def _error(self, expected: str) -> CypherError:
+        token = self.token
+        found = "end of query" if token.kind == "end" else repr(token.value)
+        return CypherError(f"Expected {expected} at position {token.position}, found {found}")
+
+    def _at(self, kind: str, value: Any = None) -> bool:
+        token = self.token
+        return token.kind == kind and (value is None or token.value == value)
+
+    def _accept(self, kind: str, value: Any = None) -> Optional[Token]:
+        if self._at(kind, value):
+            token = self.token
+            self.i += 1
+            return token
+        return None
+
+    def _expect(self, kind: str, value: Any = None) -> Token:
+        token = self._accept(kind, value)
+        if token is None:
+            raise self._error(repr(value) if value is not None else kind)
+        return token
+
+    def _anonymous_var(self) -> str:
+        self._anonymous += 1
+        return f"_anon{self._anonymous}"
+
+    def parse(self) -> CypherQuery:
+        mode = None
+        for keyword in ("EXPLAIN", "PROFILE"):
+            if self._accept("keyword", keyword):
+                mode = keyword
+        patterns: List[Pattern] = []
+        conditions: List[Expr] = []
+        if not self._at("keyword", "MATCH"):
+            self._reject_unsupported()
+            raise self._error("MATCH")
+        while self._accept("keyword", "MATCH"):
+            patterns.append(self._pattern())
+            while self._accept("op", ","):
+                patterns.append(self._pattern())
+            if self._accept("keyword", "WHERE"):
+                conditions.append(self._expression())
+        self._reject_unsupported()
+        self._expect("keyword", "RETURN")
+        distinct = bool(self._accept("keyword", "DISTINCT"))
+        returns = [self._return_item()]
+        while self._accept("op", ","):
+            returns.append(self._return_item())
+        self._reject_unsupported()
+        skip = self._expression() if self._accept("keyword", "SKIP") else None
+        limit = self._expression() if self._accept("keyword", "LIMIT") else None
+        self._reject_unsupported()
+        if not self._at("end"):
+            raise self._error("end of query")
+        where = None
+        if conditions:
+            where = conditions[0] if len(conditions) == 1 else And(conditions)
+        return CypherQuery(mode, patterns, where, returns, distinct, skip, limit, self.parameters)
+
+    def _reject_unsupported(self):
+        if self.token.kind == "keyword" and self.token.value in _UNSUPPORTED:
+            raise CypherError(f"{self.token.value} is not supported; queries are "
+                              "[EXPLAIN|PROFILE] MATCH ... [WHERE ...] RETURN ... [SKIP n] [LIMIT n]")
+
+    def _pattern(self) -> Pattern:
+        nodes = [self._node_pattern()]
+        rels = []
+        while self._at("op", "-") or self._at("op", "<"):
+            rels.append(self._rel_pattern())
+            nodes.append(self._node_pattern())
+        return Pattern(nodes, rels)
+
+    def _node_pattern(self) -> NodePattern:
+        self._expect("op", "(")
+        name = self._accept("name")
+        label = None
+        if self._accept("op", ":"):
+            label = self._expect("name").value
+            if self._at("op", ":"):
+                raise CypherError("Nodes have a single label; match one label per node")
+        properties = self._map_items() if self._at("op", "{") else {}
+        self._expect("op", ")")
+        return NodePattern(name.value if name else self._anonymous_var(), label, properties)
+
+    def _rel_pattern(self) -> RelPattern:
+        incoming = bool(self._accept("op", "<"))
+        self._expect("op", "-")
+        name, types, properties = None, [], {}
+        if self._accept("op", "["):
+            name = self._accept("name")
+            if self._accept("op", ":"):
+                types.append(self._expect("name").value)
+                while self._accept("op", "|"):
+                    self._accept("op", ":")
+                    types.append(self._expect("name").value)
+            if self._at("op", "*"):
+                raise CypherError("Variable-length relationships are not supported; "
+                                  "use /temporal/paths or /analytics/shortest-path")
+            if self._at("op", "{"):
+                properties = self._map_items()
+            self._expect("op", "]")
+        self._expect("op", "-")
+        outgoing = bool(self._accept("op", ">"))
+        if incoming and outgoing:
+            raise CypherError("A relationship cannot point both ways")
+        direction = "in" if incoming else "out" if outgoing else "both"
+        return RelPattern(name.value if name else self._anonymous_var(), types, direction, properties)
+
+    def _map_items(self) -> Dict[str, Expr]:
+        self._expect("op", "{")
+        items: Dict[str, Expr] = {}
+        if not self._at("op", "}"):
+            while True:
+                key = self._accept("name") or self._accept("keyword") or self._expect("string")
+                self._expect("op", ":")
+                items[key.value] = self._expression()
+                if not self._accept("op", ","):
+                    break
+        self._expect("op", "}")
+        return items
+
+    def _return_item(self) -> ReturnItem:
+        expr = self._expression()
+        if self._accept("keyword", "AS"):
+            return ReturnItem(expr, self._expect("name").value)
+        return ReturnItem(expr, str(expr) if not isinstance(expr, Variable) else expr.name)
+
+    # Expressions, lowest precedence first
+
+    def _expression(self) -> Expr:
+        operands = [self._and()]
+        while self._accept("keyword", "OR"):
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def _and(self) -> Expr:
+        operands = [self._not()]
+        while self._accept("keyword", "AND"):
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def _not(self) -> Expr:
+        if self._accept("keyword", "NOT"):
+            return Not(self._not())
+        return self._comparison()
+
+    def _comparison(self) -> Expr:
+        left = self._atom()
+        while True:
+            if self.token.kind == "op" and self.token.value in _COMPARISONS:
+                op = self._expect("op").value
+                left = Compare(op, left, self._atom())
+            elif self._accept("keyword", "IS"):
+                negated = bool(self._accept("keyword", "NOT"))
+                self._expect("keyword", "NULL")
+                left = IsNull(left, negated)
+            elif self._accept("keyword", "IN"):
+                left = In(left, self._atom())
+            elif self._accept("keyword", "CONTAINS"):
+                left = StringMatch("CONTAINS", left, self._atom())
+            elif self._at("keyword", "STARTS") or self._at("keyword", "ENDS"):
+                op = self._expect("keyword").value
+                self._expect("keyword", "WITH")
+                left = StringMatch(f"{op} WITH", left, self._atom())
+            else:
+                return left
+
+    def _atom(self) -> Expr:
+        token = self.token
+        if self._accept("string") or self._accept("number"):
+            return Literal(token.value)
+        if self._accept("op", "-"):
+            number = self._expect("number")
+            return Literal(-number.value)
+        if self._accept("param"):
+            self.parameters.add(token.value)
+            return Param(token.value)
+        if self._accept("keyword", "TRUE"):
+            return Literal(True)
+        if self._accept("keyword", "FALSE"):
+            return Literal(False)
+        if self._accept("keyword", "NULL"):
+            return Literal(None)
+        if self._accept("op", "("):
+            expr = self._expression()
+            self._expect("op", ")")
+            return expr
+        if self._at("op", "["):
+            self._expect("op", "[")
+            items = []
+            if not self._at("op", "]"):
+                items.append(self._expression())
+                while self._accept("op", ","):
+                    items.append(self._expression())
+            self._expect("op", "]")
+            return ListLiteral(items)
+        if self._at("op", "{"):
+            return MapLiteral(self._map_items())
+        if self._accept("name"):
+            if self._accept("op", "("):
+                name = token.value.lower()
+                if name not in FUNCTIONS:
+                    raise CypherError(f"Unknown function {token.value}(); supported: "
+                                      f"{', '.join(sorted(FUNCTIONS))}")
+                args = []
+                if not self._at("op", ")"):
+                    args.append(self._expression())
+                    while self._accept("op", ","):
+                        args.append(self._expression())
+                self._expect("op", ")")
+                try:
+                    inspect.signature(FUNCTIONS[name]).bind(*args)
+                except TypeError:
+                    raise CypherError(f"Wrong number of arguments for {token.value}(): got {len(args)}")
+                if name == "datetime" and args and isinstance(args[0], Literal):
+                    # Parse constant timestamps once, so the planner can use them
+                    return Literal(_parse_datetime(args[0].value))
+                return Function(name, args)
+            path = []
+            while self._accept("op", "."):
+                key = self._accept("name") or self._expect("keyword")
+                path.append(key.value if key.kind == "name" else key.value.lower())
+            return Property(token.value, tuple(path)) if path else Variable(token.value)
+        raise self._error("an expression")
+
+
+def parse(text: str) -> CypherQuery:
+    """Parse a query in the supported Cypher subset"""
+    return _Parser(text).parse()
@@ -0,0 +1,743 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from itertools import islice
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+import json
+import time
+
+from app.db.context_refs import canonicalize_context, context_id_for
+from app.db.mock_db import MockNode
+from app.query.cypher import (
+    CypherError, CypherQuery, Expr, Literal, Property, Function, Compare, In, IsNull,
+    Or, And, ListLiteral, Pattern, parse
+)
+
+Row = Dict[str, Any]
+
+
+class ExecutionContext:
+    def __init__(self, graph, vectors, params: Dict[str, Any], profile: bool = False):
+        self.graph = graph
+        self.vectors = vectors
+        self.params = params
+        self.profile = profile
+
+
+# Operators. Each one pulls rows from its child (or a single empty row for a
+# leaf) and yields rows lazily, so LIMIT stops the whole pipeline early.
+
+class Operator(ABC):
+    name = "Operator"
+    # The index or lookup structure the operator reads through, if any
+    index: Optional[str] = None
+
+    def __init__(self, child: Optional["Operator"] = None):
+        self.child = child
+        self.estimated_rows: Optional[int] = None
+        self.rows = 0
+        # Nodes and relationships read from the stores
+        self.scanned = 0
+        self.time = 0.0
+
+    def details(self) -> str:
+        return ""
+
+    @abstractmethod
+    def _process(self, rows: Iterator[Row], ctx: ExecutionContext) -> Iterator[Row]:
+        ...
+
+    def execute(self, ctx: ExecutionContext) -> Iterator[Row]:
+        upstream = self.child.execute(ctx) if self.child is not None else iter([{}])
+        rows = self._process(upstream, ctx)
+        return self._timed(rows) if ctx.profile else self._counted(rows)
+
+    def _counted(self, rows: Iterator[Row]) -> Iterator[Row]:
+        for row in rows:
+            self.rows += 1
+            yield row
+
+    def _timed(self, rows: Iterator[Row]) -> Iterator[Row]:
+        # Inclusive of the children; describe() subtracts them
+        while True:
+            started = time.perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                self.time += time.perf_counter() - started
+                return
+            self.time += time.perf_counter() - started
+            self.rows += 1
+            yield row
+
+    def describe(self, profiled: bool = False) -> List[Dict[str, Any]]:
+        """The pipeline from this operator down to its leaf, one entry per operator"""
+        steps = []
+        op = self
+        while op is not None:
+            step: Dict[str, Any] = {"operator": op.name, "details": op.details()}
+            if op.estimated_rows is not None:
+                step["estimated_rows"] = op.estimated_rows
+            if profiled:
+                child_time = op.child.time if op.child is not None else 0.0
+                step["rows"] = op.rows
+                step["time_ms"] = round((op.time - child_time) * 1000, 3)
+            steps.append(step)
+            op = op.child
+        return steps
+
+
+class AllNodesScan(Operator):
+    name = "AllNodesScan"
+
+    def __init__(self, child, var: str):
+        super().__init__(child)
+        self.var = var
+
+    def details(self):
+        return f"({self.var})"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            for node in ctx.graph.iter_nodes():
+                self.scanned += 1
+                yield {**row, self.var: node}
+
+
+class NodeByLabelScan(Operator):
+    name = "NodeByLabelScan"
+    index = "label index"
+
+    def __init__(self, child, var: str, label: str):
+        super().__init__(child)
+        self.var = var
+        self.label = label
+
+    def details(self):
+        return f"({self.var}:{self.label})"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            for node in ctx.graph.nodes_by_label(self.label):
+                self.scanned += 1
+                yield {**row, self.var: node}
+
+
+class NodeByIdSeek(Operator):
+    name = "NodeByIdSeek"
+    index = "node id"
+
+    def __init__(self, child, var: str, ids: Expr, many: bool):
+        super().__init__(child)
+        self.var = var
+        self.ids = ids
+        self.many = many
+
+    def details(self):
+        return f"({self.var}) id {'IN' if self.many else '='} {self.ids}"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            ids = self.ids.evaluate(row, ctx.params)
+            for node_id in (ids or []) if self.many else [ids]:
+                node = ctx.graph.get_node(str(node_id)) if node_id is not None else None
+                self.scanned += 1
+                if node is not None:
+                    yield {**row, self.var: node}
+
+
+class NodeByContextSeek(Operator):
+    name = "NodeByContextSeek"
+    index = "context references"
+
+    def __init__(self, child, var: str, context: Expr):
+        super().__init__(child)
+        self.var = var
+        self.context = context
+
+    def details(self):
+        return f"({self.var}) context = {self.context}"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            context = self.context.evaluate(row, ctx.params)
+            if not isinstance(context, dict):
+                continue
+            context_id = context_id_for(canonicalize_context(context))
+            for node_id in ctx.vectors.refs.nodes(context_id):
+                node = ctx.graph.get_node(node_id)
+                self.scanned += 1
+                if node is not None:
+                    yield {**row, self.var: node}
+
+
+class NodeByValidityScan(Operator):
+    name = "NodeByValidityScan"
+    index = "validity index"
+
+    def __init__(self, child, var: str, timestamp: Expr, label: Optional[str]):
+        super().__init__(child)
+        self.var = var
+        self.timestamp = timestamp
+        self.label = label
+
+    def details(self):
+        label = f":{self.label}" if self.label else ""
+        return f"({self.var}{label}) valid at {self.timestamp}"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            timestamp = self.timestamp.evaluate(row, ctx.params)
+            if not isinstance(timestamp, datetime):
+                continue
+            for node in ctx.graph.nodes_valid_at(timestamp, label=self.label):
+                self.scanned += 1
+                yield {**row, self.var: node}
+
+
+class NodeByIndexSeek(Operator):
+    name = "NodeByIndexSeek"
+
+    def __init__(self, child, var: str, index, values: Expr, many: bool, timestamp: Optional[Expr]):
+        super().__init__(child)
+        self.var = var
+        self.property_index = index
+        self.index = f"{index.kind} index {index.name}"
+        self.values = values
+        self.many = many
+        self.timestamp = timestamp
+
+    def details(self):
+        op = "IN" if self.many else "="
+        valid = f", valid at {self.timestamp}" if self.timestamp is not None else ""
+        return f"({self.var}) {self.index} {op} {self.values}{valid}"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            values = self.values.evaluate(row, ctx.params)
+            values = (values or []) if self.many else [values]
+            timestamp = self.timestamp.evaluate(row, ctx.params) if self.timestamp is not None else None
+            for node_id in self.property_index.equal(values, timestamp=timestamp):
+                node = ctx.graph.get_node(node_id)
+                self.scanned += 1
+                if node is not None:
+                    yield {**row, self.var: node}
+
+
+class NodeByIndexRange(Operator):
+    name = "NodeByIndexRange"
+
+    def __init__(self, child, var: str, index, low: Optional[Tuple[Expr, bool]],
+                 high: Optional[Tuple[Expr, bool]], timestamp: Optional[Expr]):
+        super().__init__(child)
+        self.var = var
+        self.property_index = index
+        self.index = f"sorted index {index.name}"
+        self.low = low
+        self.high = high
+        self.timestamp = timestamp
+
+    def details(self):
+        bounds = []
+        if self.low is not None:
+            bounds.append(f"{'>=' if self.low[1] else '>'} {self.low[0]}")
+        if self.high is not None:
+            bounds.append(f"{'<=' if self.high[1] else '<'} {self.high[0]}")
+        valid = f", valid at {self.timestamp}" if self.timestamp is not None else ""
+        return f"({self.var}) {self.index} {' AND '.join(bounds)}{valid}"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            low = self.low[0].evaluate(row, ctx.params) if self.low is not None else None
+            high = self.high[0].evaluate(row, ctx.params) if self.high is not None else None
+            timestamp = self.timestamp.evaluate(row, ctx.params) if self.timestamp is not None else None
+            node_ids = self.property_index.range(
+                low, self.low[1] if self.low is not None else True,
+                high, self.high[1] if self.high is not None else True,
+                timestamp=timestamp
+            )
+            for node_id in node_ids:
+                node = ctx.graph.get_node(node_id)
+                self.scanned += 1
+                if node is not None:
+                    yield {**row, self.var: node}
+
+
+class Expand(Operator):
+    """Follow the adjacency index from a bound node; into=True checks an already bound far end"""
+    name = "Expand"
+    index = "adjacency index"
+
+    def __init__(self, child, from_var: str, rel_var: str, to_var: str, types: List[str],
+                 direction: str, into: bool):
+        super().__init__(child)
+        self.from_var = from_var
+        self.rel_var = rel_var
+        self.to_var = to_var
+        self.types = set(types)
+        self.direction = direction
+        self.into = into
+        if into:
+            self.name = "ExpandInto"
+
+    def details(self):
+        types = ":" + "|".join(sorted(self.types)) if self.types else ""
+        left, right = ("<-", "-") if self.direction == "in" else ("-", "->" if self.direction == "out" else "-")
+        return f"({self.from_var}){left}[{self.rel_var}{types}]{right}({self.to_var})"
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            node = row[self.from_var]
+            rels = ctx.graph.get_relationships(node.id, self.direction)
+            self.scanned += len(rels)
+            for rel in rels:
+                if self.types and rel["type"] not in self.types:
+                    continue
+                if self.direction == "out":
+                    other_id = rel["target_id"]
+                elif self.direction == "in":
+                    other_id = rel["source_id"]
+                else:
+                    other_id = rel["target_id"] if rel["source_id"] == node.id else rel["source_id"]
+                if self.into:
+                    if row[self.to_var].id == other_id:
+                        yield {**row, self.rel_var: rel}
+                    continue
+                other = ctx.graph.get_node(other_id)
+                self.scanned += 1
+                if other is not None:
+                    yield {**row, self.rel_var: rel, self.to_var: other}
+
+
+class Filter(Operator):
+    name = "Filter"
+
+    def __init__(self, child, predicate: Expr):
+        super().__init__(child)
+        self.predicate = predicate
+
+    def details(self):
+        return str(self.predicate)
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            if self.predicate.evaluate(row, ctx.params) is True:
+                yield row
+
+
+class Projection(Operator):
+    name = "Projection"
+
+    def __init__(self, child, items):
+        super().__init__(child)
+        self.items = items
+
+    def details(self):
+        return ", ".join(item.alias for item in self.items)
+
+    def _process(self, rows, ctx):
+        for row in rows:
+            yield [item.expr.evaluate(row, ctx.params) for item in self.items]
+
+
+class Distinct(Operator):
+    name = "Distinct"
+
+    def _process(self, rows, ctx):
+        seen = set()
+        for row in rows:
+            key = json.dumps(row, default=encode_value, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+
+class Skip(Operator):
+    name = "Skip"
+
+    def __init__(self, child, count: Expr):
+        super().__init__(child)
+        self.count = count
+
+    def details(self):
+        return str(self.count)
+
+    def _process(self, rows, ctx):
+        return islice(rows, _non_negative(self.count, ctx.params, "SKIP"), None)
+
+
+class Limit(Operator):
+    name = "Limit"
+
+    def __init__(self, child, count: Expr):
+        super().__init__(child)
+        self.count = count
+
+    def details(self):
+        return str(self.count)
+
+    def _process(self, rows, ctx):
+        return islice(rows, _non_negative(self.count, ctx.params, "LIMIT"))
+
+
+def _non_negative(expr: Expr, params: Dict[str, Any], clause: str) -> int:
+    value = expr.evaluate({}, params)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise CypherError(f"{clause} must be a non-negative integer")
+    return value
+
+
+def encode_value(value: Any) -> Any:
+    """JSON encoding of nodes and timestamps in query results"""
+    if isinstance(value, MockNode):
+        return {
+            "id": value.id,
+            "label": value.labels[0] if value.labels else None,
+            "properties": value.properties,
+            "valid_from": value.valid_from,
+            "valid_to": value.valid_to,
+            "context": value.context
+        }
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Planning
+
+def _conjuncts(expr: Optional[Expr]) -> List[Expr]:
+    if expr is None:
+        return []
+    if isinstance(expr, And):
+        return [c for operand in expr.operands for c in _conjuncts(operand)]
+    return [expr]
+
+
+def _is_field(expr: Expr, var: str, key: str) -> bool:
+    if isinstance(expr, Property):
+        return expr.var == var and expr.path == (key,)
+    if isinstance(expr, Function) and key in ("id", "type") and expr.name == key:
+        return len(expr.args) == 1 and getattr(expr.args[0], "name", None) == var
+    return False
+
+
+def _field_equals(conjunct: Expr, var: str, key: str) -> Optional[Expr]:
+    """The constant side of `var.key = constant` (either way round), if conjunct is one"""
+    if not isinstance(conjunct, Compare) or conjunct.op != "=":
+        return None
+    for field_side, value_side in ((conjunct.left, conjunct.right), (conjunct.right, conjunct.left)):
+        if _is_field(field_side, var, key) and not value_side.variables():
+            return value_side
+    return None
+
+
+_FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+
+
+def _property_comparisons(conjuncts: List[Expr], var: str) -> Iterator[Tuple[Tuple[str, ...], str, Expr]]:
+    """(path, op, constant) for each conjunct comparing a property of var with a constant"""
+    for conjunct in conjuncts:
+        if isinstance(conjunct, Compare) and conjunct.op in _FLIPPED:
+            for prop, value, op in ((conjunct.left, conjunct.right, conjunct.op),
+                                    (conjunct.right, conjunct.left, _FLIPPED[conjunct.op])):
+                if isinstance(prop, Property) and prop.var == var and not value.variables():
+                    yield prop.path, op, value
+        elif isinstance(conjunct, In) and isinstance(conjunct.item, Property) \
+                and conjunct.item.var == var and not conjunct.collection.variables():
+            yield conjunct.item.path, "IN", conjunct.collection
+
+
+def _as_of(conjuncts: List[Expr], var: str) -> Optional[Expr]:
+    """T if conjuncts contain `var.valid_from <= T AND (var.valid_to IS NULL OR var.valid_to > T)`"""
+    starts, ends = {}, set()
+    for conjunct in conjuncts:
+        if isinstance(conjunct, Compare) and not conjunct.variables() - {var}:
+            if conjunct.op == "<=" and _is_field(conjunct.left, var, "valid_from") \
+                    and not conjunct.right.variables():
+                starts[str(conjunct.right)] = conjunct.right
+            elif conjunct.op == ">=" and _is_field(conjunct.right, var, "valid_from") \
+                    and not conjunct.left.variables():
+                starts[str(conjunct.left)] = conjunct.left
+        if isinstance(conjunct, Or) and len(conjunct.operands) == 2:
+            null = [o for o in conjunct.operands if isinstance(o, IsNull) and not o.negated
+                    and _is_field(o.operand, var, "valid_to")]
+            after = [o for o in conjunct.operands if isinstance(o, Compare)]
+            if null and after:
+                compare = after[0]
+                if compare.op == ">" and _is_field(compare.left, var, "valid_to"):
+                    ends.add(str(compare.right))
+                elif compare.op == "<" and _is_field(compare.right, var, "valid_to"):
+                    ends.add(str(compare.left))
+    for key, timestamp in starts.items():
+        if key in ends:
+            return timestamp
+    return None
+
+
+class Planner:
+    """Builds an operator pipeline for a parsed query.
+
+    Each pattern starts from its most selective node: an id seek, a context
+    seek through the shared-context references, a property index seek or
+    range scan, a validity-index scan (on stores that have one), a label
+    scan, or a full scan, in rough order of estimated rows. The rest of the pattern is reached through the adjacency
+    index, and each WHERE conjunct is applied as soon as its variables are bound.
+    """
+
+    def __init__(self, graph, vectors, indexes=None):
+        self.graph = graph
+        self.vectors = vectors
+        self.indexes = indexes
+
+    def _count(self, label: Optional[str] = None) -> Optional[int]:
+        count = getattr(self.graph, "count_nodes", None)
+        return count(label) if count else None
+
+    def _access_paths(self, node, conjuncts: List[Expr], params: Dict[str, Any]) -> List[Tuple]:
+        """(estimated rows, preference, operator factory, label handled) for each way to find node"""
+        var = node.var
+        paths = []
+        for conjunct in conjuncts:
+            value = _field_equals(conjunct, var, "id")
+            if value is not None:
+                paths.append((1, 0, lambda child, v=value: NodeByIdSeek(child, var, v, False), False))
+            if isinstance(conjunct, In) and _is_field(conjunct.item, var, "id") \
+                    and not conjunct.collection.variables():
+                size = len(conjunct.collection.items) if isinstance(conjunct.collection, ListLiteral) else 10
+                paths.append((size, 0, lambda child, v=conjunct.collection: NodeByIdSeek(child, var, v, True),
+                              False))
+            value = _field_equals(conjunct, var, "context")
+            refs = getattr(self.vectors, "refs", None)
+            if value is not None and refs is not None:
+                context = value.evaluate({}, params)
+                estimate = 0
+                if isinstance(context, dict):
+                    estimate = refs.refcount(context_id_for(canonicalize_context(context)))
+                paths.append((estimate, 1, lambda child, v=value: NodeByContextSeek(child, var, v), False))
+        total = self._count()
+        timestamp = _as_of(conjuncts, var)
+        if self.indexes is not None:
+            paths.extend(self._index_paths(node, conjuncts, params, timestamp))
+        if timestamp is not None and hasattr(self.graph, "nodes_valid_at"):
+            base = self._count(node.label) if node.label else total
+            paths.append(((base or 0) // 2, 2,
+                          lambda child: NodeByValidityScan(child, var, timestamp, node.label), True))
+        if node.label and hasattr(self.graph, "nodes_by_label"):
+            paths.append((self._count(node.label), 3,
+                          lambda child: NodeByLabelScan(child, var, node.label), True))
+        paths.append((total, 4, lambda child: AllNodesScan(child, var), False))
+        return paths
+
+    def _index_paths(self, node, conjuncts: List[Expr], params: Dict[str, Any],
+                     timestamp: Optional[Expr]) -> List[Tuple]:
+        """Access paths through declared property indexes; they also apply the as-of timestamp"""
+        var = node.var
+        paths = []
+        ranges: Dict[Tuple[str, ...], Dict[str, Tuple[Expr, bool]]] = {}
+        for path, op, value in _property_comparisons(conjuncts, var):
+            if path[0] in ("id", "label", "valid_from", "valid_to"):
+                continue
+            constant = value.evaluate({}, params)
+            if op in ("=", "IN"):
+                index = self.indexes.find(node.label, path)
+                if index is None:
+                    continue
+                values = constant if op == "IN" else [constant]
+                if not isinstance(values, list):
+                    continue
+                estimate = index.count_equal(values)
+                paths.append((estimate, 2, lambda child, i=index, v=value, m=op == "IN":
+                              NodeByIndexSeek(child, var, i, v, m, timestamp), False))
+            elif self.indexes.find(node.label, path, kinds=("sorted",)) is not None:
+                bounds = ranges.setdefault(path, {})
+                side = "low" if op in (">", ">=") else "high"
+                # Keep the first bound per side; any other stays a residual filter
+                bounds.setdefault(side, (value, op in (">=", "<="), constant))
+        for path, bounds in ranges.items():
+            index = self.indexes.find(node.label, path, kinds=("sorted",))
+            low, high = bounds.get("low"), bounds.get("high")
+            estimate = index.count_range(low[2] if low else None, low[1] if low else True,
+                                   high[2] if high else None, high[1] if high else True)
+            paths.append((estimate, 2, lambda child, i=index, lo=low, hi=high: NodeByIndexRange(
+                child, var, i, lo[:2] if lo else None, hi[:2] if hi else None, timestamp), False))
+        return paths
+
+    def plan(self, query: CypherQuery, params: Dict[str, Any]) -> Operator:
+        pattern_vars = set()
+        for pattern in query.patterns:
+            pattern_vars.update(node.var for node in pattern.nodes)
+            pattern_vars.update(rel.var for rel in pattern.rels)
+        used = set()
+        if query.where is not None:
+            used |= query.where.variables()
+        for item in query.returns:
+            used |= item.expr.variables()
+        unknown = used - pattern_vars
+        if unknown:
+            raise CypherError(f"Unknown variable(s): {', '.join(sorted(unknown))}")
+        missing = query.parameters - set(params)
+        if missing:
+            raise CypherError(f"Missing parameter(s): {', '.join('$' + name for name in sorted(missing))}")
+        for clause, count in (("SKIP", query.skip), ("LIMIT", query.limit)):
+            if count is not None:
+                _non_negative(count, params, clause)
+
+        conjuncts = _conjuncts(query.where)
+        labels: Dict[str, Expr] = {}
+        for pattern in query.patterns:
+            for node in pattern.nodes:
+                for key, value in node.properties.items():
+                    conjuncts.append(Compare("=", Property(node.var, (key,)), value))
+                if node.label:
+                    labels[node.var] = Compare("=", Property(node.var, ("label",)), Literal(node.label))
+            for rel in pattern.rels:
+                for key, value in rel.properties.items():
+                    conjuncts.append(Compare("=", Property(rel.var, (key,)), value))
+        pending = list(conjuncts) + list(labels.values())
+        bound: set = set()
+        op: Optional[Operator] = None
+
+        def apply_filters():
+            nonlocal op
+            ready = [c for c in pending if c.variables() <= bound]
+            for conjunct in ready:
+                pending.remove(conjunct)
+            if ready:
+                op = Filter(op, ready[0] if len(ready) == 1 else And(ready))
+
+        for pattern in self._ordered(query.patterns):
+            start = self._start(pattern, bound, conjuncts, params)
+            node = pattern.nodes[start]
+            if node.var not in bound:
+                estimate, _, factory, handles_label = min(
+                    self._access_paths(node, conjuncts, params),
+                    key=lambda path: (path[0] if path[0] is not None else float("inf"), path[1])
+                )
+                op = factory(op)
+                op.estimated_rows = estimate
+                if handles_label and node.var in labels:
+                    pending.remove(labels[node.var])
+                bound.add(node.var)
+                apply_filters()
+            steps = [(i, i + 1, pattern.rels[i].direction) for i in range(start, len(pattern.rels))]
+            flip = {"out": "in", "in": "out", "both": "both"}
+            steps += [(i + 1, i, flip[pattern.rels[i].direction]) for i in range(start - 1, -1, -1)]
+            for from_index, to_index, direction in steps:
+                rel = pattern.rels[min(from_index, to_index)]
+                from_var = pattern.nodes[from_index].var
+                to_var = pattern.nodes[to_index].var
+                into = to_var in bound
+                op = Expand(op, from_var, rel.var, to_var, rel.types, direction, into)
+                bound.update((rel.var, to_var))
+                apply_filters()
+        op = Projection(op, query.returns)
+        if query.distinct:
+            op = Distinct(op)
+        if query.skip is not None:
+            op = Skip(op, query.skip)
+        if query.limit is not None:
+            op = Limit(op, query.limit)
+        return op
+
+    @staticmethod
+    def _ordered(patterns: List[Pattern]) -> List[Pattern]:
+        """Patterns in order, but each one after some pattern it shares a variable with, where possible"""
+        remaining = list(patterns)
+        ordered = []
+        seen: set = set()
+        while remaining:
+            connected = [p for p in remaining if seen & {n.var for n in p.nodes}]
+            pattern = connected[0] if connected else remaining[0]
+            remaining.remove(pattern)
+            ordered.append(pattern)
+            seen.update(n.var for n in pattern.nodes)
+        return ordered
+
+    def _start(self, pattern: Pattern, bound: set, conjuncts: List[Expr], params: Dict[str, Any]) -> int:
+        """Index of the node a pattern is matched from: a bound one, else the most selective"""
+        for i, node in enumerate(pattern.nodes):
+            if node.var in bound:
+                return i
+        best, best_cost = 0, None
+        for i, node in enumerate(pattern.nodes):
+            estimate, preference, _, _ = min(
+                self._access_paths(node, conjuncts, params),
+                key=lambda path: (path[0] if path[0] is not None else float("inf"), path[1])
+            )
+            cost = (estimate if estimate is not None else float("inf"), preference)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = i, cost
+        return best
+
+
+class PreparedQuery:
+    def __init__(self, query: CypherQuery, plan: Operator, ctx: ExecutionContext):
+        self.query = query
+        self.plan = plan
+        self.ctx = ctx
+        self.mode = query.mode
+        self.columns = [item.alias for item in query.returns]
+
+    def rows(self) -> Iterator[List[Any]]:
+        return self.plan.execute(self.ctx)
+
+    def explain(self) -> Dict[str, Any]:
+        return {"columns": self.columns, "plan": self.plan.describe()}
+
+    def usage(self) -> Dict[str, Any]:
+        """Rows read from the stores so far and the indexes the plan reads through, leaf first"""
+        scanned, indexes = 0, []
+        op = self.plan
+        while op is not None:
+            scanned += op.scanned
+            if op.index is not None and op.index not in indexes:
+                indexes.insert(0, op.index)
+            op = op.child
+        return {"rows_scanned": scanned, "indexes": indexes}
+
+    def profile(self) -> Dict[str, Any]:
+        """Run the query to completion, recording rows and time per operator"""
+        self.ctx.profile = True
+        started = time.perf_counter()
+        rows = list(self.rows())
+        elapsed = time.perf_counter() - started
+        return json.loads(json.dumps({
+            "columns": self.columns,
+            "rows": rows,
+            "plan": self.plan.describe(profiled=True),
+            "time_ms": round(elapsed * 1000, 3)
+        }, default=encode_value))
+
+    def json_chunks(self, batch_rows: int = 500) -> Iterator[str]:
+        """The result as one JSON document, produced in chunks as rows are pulled from the plan"""
+        yield '{"columns": ' + json.dumps(self.columns) + ', "rows": ['
+        batch = []
+        first = True
+        try:
+            for row in self.rows():
+                batch.append(json.dumps(row, default=encode_value))
+                if len(batch) >= batch_rows:
+                    yield ("" if first else ", ") + ", ".join(batch)
+                    batch, first = [], False
+            if batch:
+                yield ("" if first else ", ") + ", ".join(batch)
+            yield "]}"
+        except Exception as e:
+            # Headers are already sent; report the failure inside the document
+            if batch:
+                yield ("" if first else ", ") + ", ".join(batch)
+            yield '], "error": ' + json.dumps(str(e)) + "}"
+
+
+class QueryEngine:
+    """Entry point for ad-hoc Cypher-subset queries against the in-process stores"""
+
+    def __init__(self, graph, vectors=None, indexes=None):
+        self.graph = graph
+        self.vectors = vectors
+        self.planner = Planner(graph, vectors, indexes)
+
+    def prepare(self, text: str, params: Optional[Dict[str, Any]] = None) -> PreparedQuery:
+        params = params or {}
+        query = parse(text)
+        plan = self.planner.plan(query, params)
+        return PreparedQuery(query, plan, ExecutionContext(self.graph, self.vectors, params))
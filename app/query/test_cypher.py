@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.mock_db import MockNeo4j
+from app.query.cypher import CypherError, parse
+from app.query.planner import QueryEngine
+
+
+@pytest.mark.parametrize("text", [
+    "MATCH (n) RETURN id()",
+    "MATCH (n) RETURN coalesce()",
+    "MATCH (n) RETURN toUpper(n.name, n.name)",
+])
+def test_wrong_arity_is_a_parse_error(text):
+    with pytest.raises(CypherError, match="Wrong number of arguments"):
+        parse(text)
+
+
+def test_aware_literals_compare_with_naive_values_in_utc():
+    store = MockNeo4j()
+    store.create_node("Event", {"at": datetime(2024, 1, 1, 12)}, datetime(2024, 1, 1, 12), None, {})
+    engine = QueryEngine(store)
+
+    def count(text):
+        return len(list(engine.prepare(text).rows()))
+
+    assert count("MATCH (e:Event) WHERE e.valid_from = datetime('2024-01-01T14:00:00+02:00') RETURN e") == 1
+    assert count("MATCH (e:Event) WHERE e.valid_from < datetime('2024-01-01T13:00:00+02:00') RETURN e") == 0
+    assert count("MATCH (e:Event) WHERE e.valid_from IN [datetime('2024-01-01T12:00:00Z')] RETURN e") == 1
+
+
+def test_datetime_without_argument_is_now_in_utc():
+    store = MockNeo4j()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    store.create_node("Event", {}, now - timedelta(minutes=5), now + timedelta(minutes=5), {})
+    store.create_node("Event", {}, now + timedelta(minutes=5), None, {})
+    engine = QueryEngine(store)
+    query = ("MATCH (e:Event) WHERE e.valid_from <= datetime() AND (e.valid_to IS NULL OR e.valid_to > datetime()) "
+             "RETURN e")
+    assert len(list(engine.prepare(query).rows())) == 1
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from app.db.mock_db import MockNeo4j
+from app.db.property_index import PropertyIndexes
+from app.query.planner import QueryEngine
+
+
+def _engine():
+    store = MockNeo4j()
+    for i in range(200):
+        store.create_node("Project", {"status": "active" if i % 10 == 0 else "done", "budget": i},
+                          datetime(2024, 1, 1), None, {})
+    indexes = PropertyIndexes(store)
+    return store, indexes, QueryEngine(store, None, indexes)
+
+
+def _leaf(engine, text):
+    return engine.prepare(text).explain()["plan"][-1]
+
+
+def test_label_scan_without_an_index():
+    _, _, engine = _engine()
+    assert _leaf(engine, "MATCH (p:Project) WHERE p.status = 'active' RETURN p.budget")["operator"] == "NodeByLabelScan"
+
+
+def test_equality_uses_a_hash_index():
+    _, indexes, engine = _engine()
+    indexes.create("Project", "status")
+    query = "MATCH (p:Project) WHERE p.status = 'active' RETURN p.budget"
+    leaf = _leaf(engine, query)
+    assert leaf["operator"] == "NodeByIndexSeek"
+    assert leaf["estimated_rows"] == 20
+    assert sorted(row[0] for row in engine.prepare(query).rows()) == list(range(0, 200, 10))
+
+
+def test_range_uses_a_sorted_index():
+    _, indexes, engine = _engine()
+    indexes.create("Project", "budget", kind="sorted")
+    query = "MATCH (p:Project) WHERE p.budget >= 10 AND p.budget < 15 RETURN p.budget"
+    leaf = _leaf(engine, query)
+    assert leaf["operator"] == "NodeByIndexRange"
+    assert sorted(row[0] for row in engine.prepare(query).rows()) == [10, 11, 12, 13, 14]
+
+
+def test_unselective_index_loses_to_a_cheaper_path():
+    store, indexes, engine = _engine()
+    indexes.create("Project", "status")
+    node_id = next(store.iter_nodes()).id
+    leaf = _leaf(engine, f"MATCH (p:Project) WHERE p.id = '{node_id}' AND p.status = 'done' RETURN p.budget")
+    assert leaf["operator"] == "NodeByIdSeek"
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+import subprocess
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.utils.startup import Startup
+
+
+def test_import_builds_no_stores():
+    check = ("import app.main as main; "
+             "assert main._services is None and main.graphql_app._schema is None")
+    subprocess.run([sys.executable, "-c", check], check=True)
+
+
+def test_ready_only_after_warm_up(monkeypatch):
+    release = threading.Event()
+    startup = Startup()
+    startup.add("services", main.services)
+    startup.add("slow_step", release.wait)
+    monkeypatch.setattr(main, "startup", startup)
+    monkeypatch.setattr(main, "_services", None)
+    # The executors are shared by every test in the process
+    monkeypatch.setattr(main, "shutdown_executors", lambda: None)
+    with TestClient(main.app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+        # Requests are still served, building what they need themselves
+        assert client.get("/changes/head").status_code == 200
+        assert client.get("/ready").status_code == 503
+        release.set()
+        assert startup.wait(10)
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert [step["status"] for step in response.json()["steps"]] == ["done", "done"]
+
+
+def test_retention_run_rejects_a_cutoff_in_the_future(monkeypatch, tmp_path):
+    monkeypatch.setenv("CGTDB_RETENTION_DAYS", "30")
+    monkeypatch.setenv("CGTDB_ARCHIVE_PATH", str(tmp_path / "archive"))
+    monkeypatch.setattr(main, "_services", None)
+    client = TestClient(main.app)
+    tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+    response = client.post("/retention/run", params={"cutoff": tomorrow.isoformat()})
+    assert response.status_code == 400
+    # An hour ago, in a zone whose wall clock reads hours later than UTC
+    earlier = (datetime.now(timezone.utc) - timedelta(hours=1)).astimezone(timezone(timedelta(hours=9)))
+    response = client.post("/retention/run", params={"cutoff": earlier.isoformat()})
+    assert response.status_code == 200
+    assert response.json()["batches"] == 0
+
+
+def test_stats_are_cached_until_the_next_write(monkeypatch):
+    monkeypatch.setattr(main, "_services", None)
+    client = TestClient(main.app)
+    first = client.get("/stats").json()
+    assert client.get("/stats").json()["computed_at"] == first["computed_at"]
+    node = {"label": "Person", "properties": {}, "valid_from": "2024-01-01T00:00:00",
+            "valid_to": None, "context": {}}
+    assert client.post("/nodes/", json=node).status_code == 200
+    second = client.get("/stats").json()
+    assert second["computed_at"] != first["computed_at"]
+    assert second["cardinalities"]["nodes"] == first["cardinalities"]["nodes"] + 1
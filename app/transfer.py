@@ -0,0 +1,109 @@
+"""Bulk transfer of a graph in the columnar binary format (see app/db/columnar.py).
+
+Against a running service:
+
+    python -m app.transfer export graph.cgtc --url http://localhost:8000
+    python -m app.transfer export graph-2024.cgtc --url http://localhost:8000 --timestamp 2024-01-01T00:00:00
+    python -m app.transfer import graph.cgtc --url http://localhost:8000
+
+Directly against a SQLite store that no service has open:
+
+    python -m app.transfer export graph.cgtc --sqlite cgtdb.sqlite3
+    python -m app.transfer import graph.cgtc --sqlite cgtdb.sqlite3
+
+And to look at a file:
+
+    python -m app.transfer inspect graph.cgtc
+
+Offline imports do not attach node contexts to the vector store; import
+through the service when contexts must be searchable straight away.
+"""
+from datetime import datetime
+import argparse
+import json
+import sys
+
+import httpx
+
+from app.db.columnar import ColumnarGraph, export_graph, import_graph
+from app.db.sqlite_store import SQLiteGraph
+
+CHUNK_SIZE = 1 << 20
+
+
+def _read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def export_command(args) -> dict:
+    if args.url:
+        params = {"timestamp": args.timestamp.isoformat()} if args.timestamp else {}
+        with httpx.stream("GET", args.url.rstrip("/") + "/export/columnar", params=params,
+                          timeout=None) as response:
+            response.raise_for_status()
+            with open(args.file, "wb") as out:
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    out.write(chunk)
+        with ColumnarGraph(args.file) as graph:
+            return graph.describe()
+    store = SQLiteGraph(args.sqlite)
+    try:
+        with open(args.file, "wb") as out:
+            return export_graph(store, out, args.timestamp)
+    finally:
+        store.close()
+
+
+def import_command(args) -> dict:
+    if args.url:
+        # Validate locally before anything is sent
+        ColumnarGraph(args.file).close()
+        response = httpx.post(args.url.rstrip("/") + "/import/columnar",
+                              content=_read_chunks(args.file), timeout=None,
+                              headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+        return response.json()
+    with ColumnarGraph(args.file) as graph:
+        store = SQLiteGraph(args.sqlite)
+        try:
+            return import_graph(store, graph, batch_size=args.batch_size)
+        finally:
+            store.close()
+
+
+def inspect_command(args) -> dict:
+    with ColumnarGraph(args.file) as graph:
+        return graph.describe()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "import"):
+        command = commands.add_parser(name)
+        command.add_argument("file")
+        target = command.add_mutually_exclusive_group(required=True)
+        target.add_argument("--url", help="base URL of a running service")
+        target.add_argument("--sqlite", metavar="PATH", help="SQLite store to read or write directly")
+    commands.choices["export"].add_argument("--timestamp", type=datetime.fromisoformat,
+                                            help="export only the versions valid at this instant")
+    commands.choices["import"].add_argument("--batch-size", type=int, default=10_000,
+                                            help="rows per SQLite transaction (with --sqlite)")
+    commands.add_parser("inspect").add_argument("file")
+    args = parser.parse_args()
+    handler = {"export": export_command, "import": import_command, "inspect": inspect_command}[args.command]
+    try:
+        result = handler(args)
+    except (OSError, ValueError, RuntimeError, httpx.HTTPError) as e:
+        raise SystemExit(f"{args.command} failed: {e}")
+    json.dump(result, sys.stdout, indent=2, default=str)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator
+import asyncio
+import contextvars
+import os
+import threading
+
+# Blocking storage calls (in-process store scans, Neo4j/Qdrant round trips)
+io_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CGTDB_IO_THREADS", min(32, (os.cpu_count() or 1) + 4))),
+    thread_name_prefix="cgtdb-io"
+)
+
+# Embedding model inference. Kept separate and small so that a burst of encodes
+# cannot starve storage calls; torch releases the GIL while it computes.
+model_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CGTDB_MODEL_THREADS", 1)),
+    thread_name_prefix="cgtdb-model"
+)
+
+
+# Calls run in a copy of the caller's context, so they see its context variables
+# (e.g. the request profile), as with asyncio.to_thread
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking storage call on the I/O pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        io_executor, contextvars.copy_context().run, partial(fn, *args, **kwargs))
+
+
+async def run_model(fn: Callable, *args, **kwargs) -> Any:
+    """Run a call that encodes text on the model pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        model_executor, contextvars.copy_context().run, partial(fn, *args, **kwargs))
+
+
+async def iterate_io(make_iterator: Callable[[], Iterator], buffer: int = 4) -> AsyncIterator:
+    """Drive a blocking iterator on one I/O thread, yielding its items to the event loop.
+
+    The iterator is created and advanced on the same thread, so it may hold
+    thread-bound resources such as a SQLite cursor. At most ``buffer`` items
+    are produced ahead of the consumer; if the consumer stops early (e.g. the
+    client disconnects) the producer stops at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in make_iterator():
+                if stopped.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except BaseException as e:
+            asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+            return
+        asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+    producer = loop.run_in_executor(io_executor, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        # Free queue space so a producer blocked on put can observe the stop
+        while not queue.empty():
+            queue.get_nowait()
+        if producer.done():
+            producer.result()
+
+
+def shutdown():
+    io_executor.shutdown(wait=False, cancel_futures=True)
+    model_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,68 @@
+from collections import deque
+from itertools import islice
+from typing import Any, Optional, Set
+import os
+import sys
+
+import numpy as np
+
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+# Referenced from more places than this (interned keys, small ints, labels): owned by no
+# single structure, so not charged to any
+_SHARED_REFS = 64
+
+
+def _sampled(items: list, total: int, sizes) -> float:
+    return sum(sizes) * total / len(items) if items else 0.0
+
+
+def estimate_size(obj: Any, depth: Optional[int] = None, sample: int = 256,
+                  _seen: Optional[Set[int]] = None) -> int:
+    """Approximate bytes held by obj and what it references, down to depth levels.
+
+    depth=0 counts obj itself only (e.g. a list of objects owned elsewhere);
+    None follows references all the way. Containers with more than sample
+    items are extrapolated from evenly spaced items, so the cost is bounded
+    by the sample size rather than the data. Objects reached twice are
+    counted once, and widely shared ones not at all.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen or (_seen is not None and sys.getrefcount(obj) > _SHARED_REFS):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        # Views share their base's buffer
+        return sys.getsizeof(obj) if obj.base is not None else int(obj.nbytes) + sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if depth == 0 or isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    child_depth = None if depth is None else depth - 1
+
+    def child(value: Any) -> int:
+        return estimate_size(value, child_depth, sample, seen)
+
+    if isinstance(obj, dict):
+        step = max(1, len(obj) // sample)
+        # One C-level pass, so concurrent writers cannot change the dict under it
+        items = list(islice(obj.items(), 0, None, step))
+        size += _sampled(items, len(obj), (child(key) + child(value) for key, value in items))
+    elif isinstance(obj, _CONTAINERS):
+        total = len(obj)
+        step = max(1, total // sample)
+        items = obj[::step] if isinstance(obj, (list, tuple)) else list(islice(obj, 0, None, step))
+        size += _sampled(items, total, (child(value) for value in items))
+    elif hasattr(obj, "__dict__"):
+        size += child(vars(obj))
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(child(getattr(obj, name, None)) for name in type(obj).__slots__)
+    return int(size)
+
+
+def process_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
@@ -0,0 +1,237 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Iterator
+import json
+import random
+import threading
+import time
+
+PROFILE_HEADER = "X-CGTDB-Profile"
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("cgtdb_profile", default=None)
+
+
+class Profile:
+    """What one request did: time per stage, rows scanned and the indexes it used.
+
+    Handlers record into the profile of the current request through the
+    module-level helpers, which do nothing when the request is not profiled.
+    ``requested`` is set when the client opted in with the profile header;
+    such requests get the profile back in response headers.
+    """
+
+    def __init__(self, requested: bool = False):
+        self.requested = requested
+        self.stages: Dict[str, float] = {}
+        self.rows_scanned = 0
+        self.indexes: List[str] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.details: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def scanned(self, rows: int):
+        with self._lock:
+            self.rows_scanned += rows
+
+    def used_index(self, name: str):
+        with self._lock:
+            if name not in self.indexes:
+                self.indexes.append(name)
+
+    def cache_lookup(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+                "rows_scanned": self.rows_scanned,
+                "indexes": list(self.indexes),
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                **self.details
+            }
+
+    def server_timing(self, total: float) -> str:
+        """The stages as a Server-Timing header value, shown by browser developer tools"""
+        with self._lock:
+            stages = list(self.stages.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in stages + [("total", total)])
+
+
+def current_profile() -> Optional[Profile]:
+    return _current.get()
+
+
+def stage(name: str):
+    """Time a block as a stage of the current request's profile, if it has one"""
+    profile = _current.get()
+    if profile is None:
+        return _NOT_PROFILED
+    return profile.stage(name)
+
+
+def scanned(rows: int):
+    profile = _current.get()
+    if profile is not None:
+        profile.scanned(rows)
+
+
+def used_index(name: str):
+    profile = _current.get()
+    if profile is not None:
+        profile.used_index(name)
+
+
+def cache_lookup(hit: bool):
+    profile = _current.get()
+    if profile is not None:
+        profile.cache_lookup(hit)
+
+
+class _NotProfiled:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOT_PROFILED = _NotProfiled()
+
+
+class SlowQueryLog:
+    """Bounded log of requests that took at least ``threshold`` seconds.
+
+    Every slow request is counted, but only ``sample_rate`` of requests are
+    profiled and only profiled ones are logged, so the log holds a sample
+    with the rows scanned, index usage and stage times of each entry.
+    """
+
+    def __init__(self, threshold: float = 0.5, sample_rate: float = 0.01, capacity: int = 1000):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self._entries: deque = deque(maxlen=capacity)
+        self.slow_requests = 0
+        self.logged = 0
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def record(self, method: str, path: str, query: str, status: Optional[int], seconds: float,
+               profile: Optional[Profile]):
+        if seconds < self.threshold:
+            return
+        with self._lock:
+            self.slow_requests += 1
+            if profile is None:
+                return
+            self.logged += 1
+            self._entries.append({
+                "at": datetime.now(timezone.utc),
+                "method": method,
+                "path": path,
+                "query_string": query,
+                "status": status,
+                "duration_ms": round(seconds * 1000, 3),
+                "profile": profile.to_dict()
+            })
+
+    def entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """The most recent entries, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold * 1000,
+                "sample_rate": self.sample_rate,
+                "capacity": self._entries.maxlen,
+                "slow_requests": self.slow_requests,
+                "logged": self.logged,
+                "entries": len(self._entries)
+            }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that times every HTTP request and feeds the slow-query log.
+
+    Requests carrying ``X-CGTDB-Profile: 1`` (and a sample of the others)
+    get a Profile for handlers to record into. Opted-in requests receive it
+    in the ``X-CGTDB-Profile`` (JSON) and ``Server-Timing`` response headers;
+    these are sent before a streamed body, so streaming handlers should
+    finish their work first when the client asked for a profile. Durations
+    in the log run until the last body chunk is sent; event streams
+    (``text/event-stream``), which stay open for as long as the client
+    listens, are not recorded.
+    """
+
+    def __init__(self, app, log: SlowQueryLog):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = PROFILE_HEADER.lower().encode()
+        requested = any(name == header and value.strip().lower() in (b"1", b"true", b"yes")
+                        for name, value in scope.get("headers", ()))
+        profile = Profile(requested) if requested or self.log.sampled() else None
+        token = _current.set(profile)
+        started = time.perf_counter()
+        status: Dict[str, Optional[int]] = {"code": None}
+        finished = False
+        event_stream = False
+
+        async def send_profiled(message):
+            nonlocal finished, event_stream
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                event_stream = any(name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                                   for name, value in message.get("headers", ()))
+                if requested:
+                    elapsed = time.perf_counter() - started
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"server-timing", profile.server_timing(elapsed).encode()))
+                    headers.append((header, json.dumps(profile.to_dict(), default=str).encode()))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+                if not event_stream:
+                    self._record(scope, status["code"], time.perf_counter() - started, profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            _current.reset(token)
+            if not finished and not event_stream:
+                # Failed or disconnected before the body completed
+                self._record(scope, status["code"], time.perf_counter() - started, profile)
+
+    def _record(self, scope, status: Optional[int], seconds: float, profile: Optional[Profile]):
+        self.log.record(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"),
+                        status, seconds, profile)
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+
+class Startup:
+    """Named warm-up steps run once, in order, before a worker reports ready.
+
+    ``start`` runs them on a background thread, so the server accepts
+    connections (and answers the readiness probe with "not ready") while
+    models load and indexes build. Every step must also happen lazily on
+    first use, since requests can arrive before it ran. A failed step keeps
+    the worker unready and is reported by ``status``.
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[], Any]]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.created = time.perf_counter()
+        self.started_at: Optional[datetime] = None
+        self.seconds_to_ready: Optional[float] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, name: str, step: Callable[[], Any]):
+        self.steps.append((name, step))
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def run(self):
+        """Run the steps on the calling thread, stopping at the first failure"""
+        self.started_at = datetime.now(timezone.utc)
+        for name, step in self.steps:
+            self.results[name] = {"status": "running"}
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.results[name] = {"status": "failed", "seconds": time.perf_counter() - started,
+                                      "error": str(e)}
+                return
+            self.results[name] = {"status": "done", "seconds": time.perf_counter() - started}
+        # Measured from construction, i.e. roughly from when the app was imported
+        self.seconds_to_ready = time.perf_counter() - self.created
+        self._ready.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="cgtdb-startup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "seconds_to_ready": self.seconds_to_ready,
+            "steps": [
+                {"name": name, **self.results.get(name, {"status": "pending"})}
+                for name, _ in self.steps
+            ]
+        }
@@ -0,0 +1,86 @@
+from datetime import timezone
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.utils.profiling import PROFILE_HEADER, Profile, ProfilingMiddleware, SlowQueryLog, scanned, stage
+
+
+def _client(log: SlowQueryLog) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        with stage("store"):
+            scanned(3)
+        return {"ok": True}
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"]), media_type="text/event-stream")
+
+    app.add_middleware(ProfilingMiddleware, log=log)
+    return TestClient(app)
+
+
+def test_profile_accumulates_stages():
+    profile = Profile()
+    for _ in range(2):
+        with profile.stage("store"):
+            pass
+    profile.scanned(5)
+    profile.used_index("node id")
+    profile.used_index("node id")
+    profile.cache_lookup(hit=True)
+    recorded = profile.to_dict()
+    assert list(recorded["stages_ms"]) == ["store"]
+    assert (recorded["rows_scanned"], recorded["indexes"]) == (5, ["node id"])
+    assert recorded["cache"] == {"hits": 1, "misses": 0}
+    assert profile.server_timing(0.002).endswith("total;dur=2.000")
+
+
+def test_opted_in_request_gets_its_profile_back():
+    log = SlowQueryLog(threshold=10.0, sample_rate=0.0)
+    client = _client(log)
+    response = client.get("/work", headers={PROFILE_HEADER: "1"})
+    profile = json.loads(response.headers[PROFILE_HEADER])
+    assert profile["rows_scanned"] == 3 and "store" in profile["stages_ms"]
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("store;dur=") and "total;dur=" in timing
+    assert PROFILE_HEADER not in client.get("/work").headers
+    # Fast requests are neither counted nor logged
+    assert (log.slow_requests, log.logged) == (0, 0)
+
+
+def test_unsampled_slow_requests_are_counted_but_not_logged():
+    log = SlowQueryLog(threshold=0.0, sample_rate=0.0)
+    client = _client(log)
+    client.get("/work")
+    client.get("/work?x=1")
+    assert (log.slow_requests, log.logged, log.entries()) == (2, 0, [])
+    client.get("/work?x=2", headers={PROFILE_HEADER: "1"})
+    entry, = log.entries()
+    assert (entry["path"], entry["query_string"], entry["status"]) == ("/work", "x=2", 200)
+    assert entry["profile"]["rows_scanned"] == 3
+    assert entry["at"].tzinfo is timezone.utc
+
+
+def test_event_streams_are_not_recorded():
+    log = SlowQueryLog(threshold=0.0, sample_rate=1.0)
+    client = _client(log)
+    assert client.get("/events").text == "data: 1\n\n"
+    assert (log.slow_requests, log.logged) == (0, 0)
+    client.get("/work")
+    assert (log.slow_requests, log.logged) == (1, 1)
+
+
+def test_log_keeps_the_newest_entries():
+    log = SlowQueryLog(threshold=0.0, sample_rate=1.0, capacity=2)
+    for i in range(3):
+        log.record("GET", f"/{i}", "", 200, 0.1, Profile())
+    assert [entry["path"] for entry in log.entries()] == ["/2", "/1"]
+    assert log.stats()["logged"] == 3
+    log.clear()
+    assert log.entries() == []
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_us(value: Optional[datetime]) -> Tuple[Optional[int], Optional[int]]:
+    """Encode a datetime as (microseconds since the epoch, UTC offset in seconds or None if naive).
+
+    Naive datetimes are treated as UTC so that both kinds order consistently.
+    """
+    if value is None:
+        return None, None
+    if value.tzinfo is None:
+        return (value - _EPOCH) // timedelta(microseconds=1), None
+    offset = int(value.utcoffset().total_seconds())
+    return (value.replace(tzinfo=None) - value.utcoffset() - _EPOCH) // timedelta(microseconds=1), offset
+
+
+def from_epoch_us(us: Optional[int], offset: Optional[int]) -> Optional[datetime]:
+    if us is None:
+        return None
+    value = _EPOCH + timedelta(microseconds=us)
+    if offset is None:
+        return value
+    tz = timezone(timedelta(seconds=offset))
+    return (value + timedelta(seconds=offset)).replace(tzinfo=tz)
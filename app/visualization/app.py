@@ -1,137 +1,117 @@
 import streamlit as st
-import networkx as nx
 import plotly.graph_objects as go
 import httpx
-from datetime import datetime
 import json
 import asyncio
-from typing import List, Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+API_URL = "http://localhost:8000"
+
+LABEL_COLORS = {
+    'Department': '#1f77b4',  # blue
+    'Project': '#2ca02c',  # green
+    'Employee': '#ff7f0e',  # orange
+}
 
 st.set_page_config(page_title="Graph DB Visualizer", layout="wide")
 
 # Initialize session state
-if 'graph' not in st.session_state:
-    st.session_state.graph = nx.Graph()
+if 'view' not in st.session_state:
+    st.session_state.view = None
+if 'stats' not in st.session_state:
+    st.session_state.stats = None
+if 'node_details' not in st.session_state:
+    st.session_state.node_details = {}
+if 'synced' not in st.session_state:
+    # (view request, change feed sequence number) the current view was fetched at
+    st.session_state.synced = None
+
+async def fetch_json(client: httpx.AsyncClient, path: str,
+                     params: Optional[Dict[str, Any]] = None) -> Any:
+    """GET a JSON document from the API, or None on failure"""
+    response = await client.get(f"{API_URL}{path}", params=params)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+async def fetch_view(mode: str, params: Dict[str, Any],
+                     node_id: Optional[str] = None) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Fetch a laid-out view and the graph statistics concurrently"""
+    async with httpx.AsyncClient(timeout=60) as client:
+        if mode == "neighbourhood":
+            view_request = fetch_json(client, f"/graph/neighbourhood/{node_id}", params)
+        else:
+            view_request = fetch_json(client, "/graph/overview", {"mode": mode, **params})
+        return await asyncio.gather(view_request, fetch_json(client, "/analytics/degrees"))
 
-async def fetch_all_nodes() -> List[Dict[str, Any]]:
-    """Fetch all nodes from the database"""
+async def fetch_head_seq() -> Optional[Tuple[str, int]]:
+    """Change feed epoch and latest sequence number, without downloading any events"""
     async with httpx.AsyncClient() as client:
-        response = await client.get("http://localhost:8000/nodes/all")
-        if response.status_code == 200:
-            return response.json()
-    return []
+        head = await fetch_json(client, "/changes/head")
+        return (head["epoch"], head["head_seq"]) if head else None
 
-async def fetch_all_relationships() -> List[Dict[str, Any]]:
-    """Fetch all relationships from the database"""
+async def fetch_node(node_id: str) -> Optional[Dict[str, Any]]:
     async with httpx.AsyncClient() as client:
-        response = await client.get("http://localhost:8000/relationships/all")
-        if response.status_code == 200:
-            return response.json()
-    return []
-
-async def fetch_data():
-    """Fetch both nodes and relationships"""
-    nodes = await fetch_all_nodes()
-    relationships = await fetch_all_relationships()
-    return nodes, relationships
-
-def create_network_graph(nodes: List[Dict[str, Any]], relationships: List[Dict[str, Any]]) -> nx.Graph:
-    """Create a NetworkX graph from nodes and relationships"""
-    G = nx.Graph()
-    
-    # Add nodes
-    for node in nodes:
-        G.add_node(
-            node['id'],
-            label=node['label'],
-            properties=node['properties'],
-            context=node['context']
-        )
-    
-    # Add edges
-    for rel in relationships:
-        G.add_edge(
-            rel['source_id'],
-            rel['target_id'],
-            type=rel['type'],
-            properties=rel['properties'],
-            context=rel['context']
-        )
-    
-    return G
-
-def visualize_graph(G: nx.Graph) -> go.Figure:
-    """Create an interactive Plotly visualization of the graph"""
-    if not G.nodes:
+        return await fetch_json(client, f"/nodes/{node_id}")
+
+def visualize_graph(view: Dict[str, Any]) -> go.Figure:
+    """Create an interactive Plotly visualization of a server-laid-out view"""
+    nodes = view.get('nodes', [])
+    if not nodes:
         return go.Figure()
 
-    pos = nx.spring_layout(G)
-    
-    # Create edge trace
+    pos = {node['id']: (node['x'], node['y']) for node in nodes}
+
+    # Edges are drawn as one line trace without hover; a midpoint trace carries hover info
     edge_x = []
     edge_y = []
-    edge_text = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
+    mid_x = []
+    mid_y = []
+    mid_data = []
+    for rel in view.get('relationships', []):
+        if rel['source_id'] not in pos or rel['target_id'] not in pos:
+            continue
+        x0, y0 = pos[rel['source_id']]
+        x1, y1 = pos[rel['target_id']]
         edge_x.extend([x0, x1, None])
         edge_y.extend([y0, y1, None])
-        edge_data = G.edges[edge]
-        edge_text.append(
-            f"Type: {edge_data.get('type', 'Unknown')}<br>"
-            f"Properties: {json.dumps(edge_data.get('properties', {}), indent=2)}<br>"
-            f"Context: {json.dumps(edge_data.get('context', {}), indent=2)}"
-        )
-
-    edge_trace = go.Scatter(
+        mid_x.append((x0 + x1) / 2)
+        mid_y.append((y0 + y1) / 2)
+        mid_data.append(rel.get('type') or f"{rel.get('count', 1)} relationships")
+
+    edge_trace = go.Scattergl(
         x=edge_x, y=edge_y,
         line=dict(width=1, color='#888'),
-        hoverinfo='text',
-        hovertext=edge_text,
+        hoverinfo='skip',
         mode='lines')
 
-    # Create node trace
-    node_x = []
-    node_y = []
-    node_text = []
-    node_colors = []
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_info = G.nodes[node]
-        node_text.append(
-            f"ID: {node}<br>"
-            f"Label: {node_info['label']}<br>"
-            f"Properties: {json.dumps(node_info['properties'], indent=2)}<br>"
-            f"Context: {json.dumps(node_info['context'], indent=2)}"
-        )
-        # Color nodes by label
-        if node_info['label'] == 'Department':
-            node_colors.append('#1f77b4')  # blue
-        elif node_info['label'] == 'Project':
-            node_colors.append('#2ca02c')  # green
-        elif node_info['label'] == 'Employee':
-            node_colors.append('#ff7f0e')  # orange
-        else:
-            node_colors.append('#7f7f7f')  # gray
+    edge_hover_trace = go.Scattergl(
+        x=mid_x, y=mid_y,
+        mode='markers',
+        marker=dict(size=4, color='#888', opacity=0),
+        customdata=mid_data,
+        hovertemplate="%{customdata}<extra></extra>")
 
-    node_trace = go.Scatter(
-        x=node_x, y=node_y,
-        mode='markers+text',
-        hoverinfo='text',
-        hovertext=node_text,
+    # Hover text is assembled by plotly from customdata only when hovered
+    aggregated = 'count' in nodes[0]
+    node_trace = go.Scattergl(
+        x=[node['x'] for node in nodes],
+        y=[node['y'] for node in nodes],
+        mode='markers' if len(nodes) > 200 else 'markers+text',
+        customdata=[[node['id'], node['label'], node['name']] for node in nodes],
+        hovertemplate="ID: %{customdata[0]}<br>Label: %{customdata[1]}<br>"
+                      "%{customdata[2]}<extra></extra>",
         marker=dict(
-            color=node_colors,
-            size=20,
+            color=[LABEL_COLORS.get(node['label'], '#7f7f7f') for node in nodes],
+            size=[min(10 + node['count'] ** 0.5, 60) for node in nodes] if aggregated else 20,
             line=dict(width=2)
         ),
-        text=[G.nodes[node]['properties'].get('name', '') for node in G.nodes()],
+        text=[node['name'] for node in nodes],
         textposition="bottom center"
     )
 
     # Create the figure
-    fig = go.Figure(data=[edge_trace, node_trace],
+    fig = go.Figure(data=[edge_trace, edge_hover_trace, node_trace],
                    layout=go.Layout(
                        title="Graph Database Visualization",
                        showlegend=False,
@@ -141,45 +121,86 @@ def visualize_graph(G: nx.Graph) -> go.Figure:
                        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
                        plot_bgcolor='white')
                    )
-    
+
     return fig
 
 def main():
     st.title("Graph Database Visualizer")
-    
+
     # Sidebar controls
     st.sidebar.title("Controls")
+    mode = st.sidebar.selectbox(
+        "View",
+        ["sample", "aggregate", "neighbourhood"],
+        format_func=lambda m: {
+            "sample": "Overview (highest-degree sample)",
+            "aggregate": "Overview (aggregated)",
+            "neighbourhood": "Neighbourhood of a node"
+        }[m]
+    )
+    params: Dict[str, Any] = {}
+    node_id = None
+    if mode == "sample":
+        params["max_nodes"] = st.sidebar.slider("Max nodes", 50, 5000, 500, step=50)
+    elif mode == "aggregate":
+        params["resolution"] = st.sidebar.slider("Grid resolution", 5, 100, 20)
+    else:
+        node_id = st.sidebar.text_input("Node ID")
+        params["depth"] = st.sidebar.slider("Depth", 1, 5, 1)
+        params["limit"] = st.sidebar.slider("Max nodes", 50, 5000, 500, step=50)
+
     if st.sidebar.button("Refresh Data"):
-        with st.spinner("Fetching data..."):
-            # Run async code using asyncio
-            nodes, relationships = asyncio.run(fetch_data())
-            st.session_state.graph = create_network_graph(nodes, relationships)
-    
+        if mode == "neighbourhood" and not node_id:
+            st.sidebar.warning("Enter a node ID")
+        else:
+            request = (mode, node_id, tuple(sorted(params.items())))
+            head_seq = asyncio.run(fetch_head_seq())
+            # Nothing has changed since this view was fetched: keep it
+            if head_seq is None or st.session_state.synced != (request, head_seq):
+                with st.spinner("Fetching data..."):
+                    # Run async code using asyncio
+                    view, stats = asyncio.run(fetch_view(mode, params, node_id))
+                    st.session_state.view = view
+                    st.session_state.stats = stats
+                    st.session_state.node_details = {}
+                    st.session_state.synced = (request, head_seq)
+
     # Main visualization
-    if st.session_state.graph and len(st.session_state.graph.nodes) > 0:
-        st.plotly_chart(visualize_graph(st.session_state.graph), use_container_width=True)
-        
+    view = st.session_state.view
+    if view and view.get('nodes'):
+        st.plotly_chart(visualize_graph(view), use_container_width=True)
+
         # Graph statistics
-        st.subheader("Graph Statistics")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Number of Nodes", len(st.session_state.graph.nodes))
-        with col2:
-            st.metric("Number of Relationships", len(st.session_state.graph.edges))
-        with col3:
-            st.metric("Average Degree", 
-                     round(sum(dict(st.session_state.graph.degree()).values()) / 
-                           len(st.session_state.graph.nodes), 2))
-        
+        stats = st.session_state.stats
+        if stats:
+            st.subheader("Graph Statistics")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Number of Nodes", stats['nodes'])
+            with col2:
+                st.metric("Number of Relationships", stats['edges'])
+            with col3:
+                st.metric("Average Degree", round(stats['degree']['total']['mean'], 2))
+
+        # Node details are only fetched for the node the user picks
+        if 'count' not in view['nodes'][0]:
+            st.subheader("Node Details")
+            names = {node['id']: f"{node['label']}: {node['name'] or node['id']}"
+                     for node in view['nodes']}
+            selected = st.selectbox("Node", list(names), format_func=names.get)
+            if selected:
+                if selected not in st.session_state.node_details:
+                    st.session_state.node_details[selected] = asyncio.run(fetch_node(selected))
+                details = st.session_state.node_details[selected]
+                if details:
+                    st.code(json.dumps(details, indent=2), language="json")
+
         # Node List
         st.subheader("Nodes by Type")
         node_types = {}
-        for node, data in st.session_state.graph.nodes(data=True):
-            label = data['label']
-            if label not in node_types:
-                node_types[label] = []
-            node_types[label].append(data['properties'].get('name', node))
-        
+        for node in view['nodes']:
+            node_types.setdefault(node['label'], []).append(node['name'] or node['id'])
+
         for label, nodes in node_types.items():
             with st.expander(f"{label}s ({len(nodes)})"):
                 st.write(", ".join(nodes))
@@ -187,4 +208,4 @@ def main():
         st.info("Click 'Refresh Data' to load the graph visualization")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()